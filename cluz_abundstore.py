@@ -0,0 +1,350 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from collections.abc import MutableMapping
+from csv import reader, writer
+from os import path, stat
+from struct import calcsize, error, pack, unpack_from
+
+import numpy
+
+from .cluz_costs import sum_values_by_key_in_order
+from .cluz_savefile import write_binary_file_by_replacing, write_file_by_replacing
+
+
+abund_store_magic = b'CLUZABND'
+abund_store_version = 1
+abund_store_header_format = '<8sIIqqqq'  # Magic text, format version, reserved, puvspr2.dat size, puvspr2.dat modification time, PU count, entry count
+abund_store_row_dtype = numpy.dtype([('feat_id', '<i8'), ('pu_id', '<i8'), ('amount', '<f8')])
+abund_store_chunk_byte_count = 16777216
+
+
+class AbundancePuKeyStore(MutableMapping):  # Returns the abundance data of each PU as a dictionary, eg {feat_id: amount}, from the CSR arrays in the sidecar file
+    def __init__(self, pu_id_array, indptr_array, feat_id_array, amount_array):
+        self.pu_id_array = pu_id_array
+        self.indptr_array = indptr_array
+        self.feat_id_array = feat_id_array
+        self.amount_array = amount_array
+        self.changed_pu_dict = dict()  # Changes made after loading are kept here rather than written to the memory-mapped arrays
+        self.removed_pu_id_set = set()
+
+    def return_pu_index(self, pu_id):
+        pu_index = -1
+        if type(pu_id) is int or isinstance(pu_id, numpy.integer):
+            pos = int(numpy.searchsorted(self.pu_id_array, pu_id))
+            if pos < len(self.pu_id_array) and self.pu_id_array[pos] == pu_id:
+                pu_index = pos
+
+        return pu_index
+
+    def __getitem__(self, pu_id):
+        if pu_id in self.changed_pu_dict:
+            return self.changed_pu_dict[pu_id]
+        pu_index = self.return_pu_index(pu_id)
+        if pu_index == -1 or pu_id in self.removed_pu_id_set:
+            raise KeyError(pu_id)
+        start_pos = int(self.indptr_array[pu_index])
+        end_pos = int(self.indptr_array[pu_index + 1])
+
+        return dict(zip(self.feat_id_array[start_pos:end_pos].tolist(), self.amount_array[start_pos:end_pos].tolist()))
+
+    def __setitem__(self, pu_id, pu_abund_dict):
+        self.changed_pu_dict[pu_id] = pu_abund_dict
+        self.removed_pu_id_set.discard(pu_id)
+
+    def __delitem__(self, pu_id):
+        if pu_id not in self:
+            raise KeyError(pu_id)
+        self.changed_pu_dict.pop(pu_id, None)
+        if self.return_pu_index(pu_id) != -1:
+            self.removed_pu_id_set.add(pu_id)
+
+    def __contains__(self, pu_id):
+        if pu_id in self.changed_pu_dict:
+            return True
+
+        return self.return_pu_index(pu_id) != -1 and pu_id not in self.removed_pu_id_set
+
+    def __iter__(self):
+        for pu_id in self.pu_id_array.tolist():
+            if pu_id not in self.removed_pu_id_set and pu_id not in self.changed_pu_dict:
+                yield pu_id
+        for pu_id in list(self.changed_pu_dict):
+            yield pu_id
+
+    def __len__(self):
+        stored_changed_count = len([pu_id for pu_id in self.changed_pu_dict if self.return_pu_index(pu_id) != -1])
+
+        return len(self.pu_id_array) - len(self.removed_pu_id_set) - stored_changed_count + len(self.changed_pu_dict)
+
+    def return_csr_array_list(self):
+        return [self.pu_id_array, self.indptr_array, self.feat_id_array, self.amount_array]
+
+    def set_csr_arrays(self, csr_array_list):
+        self.pu_id_array, self.indptr_array, self.feat_id_array, self.amount_array = csr_array_list
+        self.changed_pu_dict = dict()
+        self.removed_pu_id_set = set()
+
+    def return_amount(self, pu_id, feat_id, default_value=0):
+        # Single value lookup that doesn't make the dictionary of the whole PU
+        if pu_id in self.changed_pu_dict:
+            return self.changed_pu_dict[pu_id].get(feat_id, default_value)
+        pu_index = self.return_pu_index(pu_id)
+        if pu_index == -1 or pu_id in self.removed_pu_id_set:
+            return default_value
+        start_pos = int(self.indptr_array[pu_index])
+        end_pos = int(self.indptr_array[pu_index + 1])
+        match_pos_array = numpy.flatnonzero(self.feat_id_array[start_pos:end_pos] == feat_id)
+        if len(match_pos_array) == 0:
+            return default_value
+
+        return float(self.amount_array[start_pos + match_pos_array[0]])
+
+
+def return_abund_file_date(puvspr2_file_path):
+    file_stat = stat(puvspr2_file_path)
+
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+def return_abund_store_header_size():
+    return calcsize(abund_store_header_format)
+
+
+def abund_store_is_valid(store_path, abund_file_date):
+    store_is_valid = False
+    try:
+        with open(store_path, 'rb') as f:
+            header_bytes = f.read(return_abund_store_header_size())
+        magic_value, version_value, reserved_value, source_size, source_mtime_ns, pu_count, entry_count = unpack_from(abund_store_header_format, header_bytes)
+        store_size = return_abund_store_header_size() + (pu_count + pu_count + 1) * 8 + entry_count * (8 + 8)
+        if magic_value == abund_store_magic and version_value == abund_store_version and (source_size, source_mtime_ns) == abund_file_date:
+            store_is_valid = path.getsize(store_path) == store_size  # Rejects a store that was cut short
+    except (IOError, error):
+        store_is_valid = False
+
+    return store_is_valid
+
+
+def load_abund_store(store_path):
+    with open(store_path, 'rb') as f:
+        header_bytes = f.read(return_abund_store_header_size())
+    pu_count, entry_count = unpack_from(abund_store_header_format, header_bytes)[5:7]
+
+    offset_value = return_abund_store_header_size()
+    array_list = list()
+    for dtype_name, array_length in [('<i8', pu_count), ('<i8', pu_count + 1), ('<i8', entry_count), ('<f8', entry_count)]:
+        if array_length == 0:
+            array_list.append(numpy.zeros(0, dtype=dtype_name))  # numpy.memmap can't map an empty array
+        else:
+            array_list.append(numpy.memmap(store_path, dtype=dtype_name, mode='r', offset=offset_value, shape=(array_length,)))
+        offset_value += array_length * 8
+
+    return AbundancePuKeyStore(*array_list)
+
+
+def write_abund_store(store_path, abund_file_date, csr_array_list):
+    pu_id_array, indptr_array, feat_id_array, amount_array = csr_array_list
+    header_bytes = pack(abund_store_header_format, abund_store_magic, abund_store_version, 0, abund_file_date[0], abund_file_date[1], len(pu_id_array), len(feat_id_array))
+
+    write_binary_file_by_replacing(store_path, header_bytes, csr_array_list)
+
+
+def return_row_array_from_line_list(line_list):
+    try:
+        row_array = numpy.loadtxt(line_list, delimiter=',', dtype=abund_store_row_dtype, usecols=(0, 1, 2), ndmin=1)
+    except ValueError:
+        row_array = numpy.array([(int(a_row[0]), int(a_row[1]), float(a_row[2])) for a_row in reader(line_list) if len(a_row) > 0], dtype=abund_store_row_dtype)  # Slower, but copes with quoted values
+
+    return row_array
+
+
+def make_row_array_from_puvspr2_file(puvspr2_file_path, progress_bar_function):
+    # Raises ValueError or IndexError if a row is incorrectly formatted
+    file_byte_count = max(path.getsize(puvspr2_file_path), 1)
+    read_byte_count = 0
+    row_array_list = list()
+    with open(puvspr2_file_path, mode='rt', encoding='utf-8') as f:
+        read_byte_count += len(f.readline())
+        line_list = f.readlines(abund_store_chunk_byte_count)
+        while len(line_list) > 0:
+            read_byte_count += sum(len(a_line) for a_line in line_list)
+            line_list = [a_line for a_line in line_list if a_line.strip() != '']
+            if len(line_list) > 0:
+                row_array_list.append(return_row_array_from_line_list(line_list))
+            progress_bar_function(min(read_byte_count, file_byte_count), file_byte_count)
+            line_list = f.readlines(abund_store_chunk_byte_count)
+
+    if len(row_array_list) == 0:
+        return numpy.zeros(0, dtype=abund_store_row_dtype)
+
+    return numpy.concatenate(row_array_list)
+
+
+def make_csr_array_list_from_row_array(row_array, keep_file_order_bool):
+    # Matches reading the rows into a dict of dicts: a repeated PU and feature pair keeps its last amount and, if keep_file_order_bool, the position it first appeared
+    # Otherwise the features of each PU are sorted by ID, as when puvspr2.dat is written
+    pu_id_values = row_array['pu_id']
+    feat_id_values = row_array['feat_id']
+    sort_order = numpy.lexsort((numpy.arange(len(row_array)), feat_id_values, pu_id_values))
+    sorted_pu_id_values = pu_id_values[sort_order]
+    sorted_feat_id_values = feat_id_values[sort_order]
+
+    new_pair_bool_values = numpy.ones(len(row_array), dtype=bool)
+    new_pair_bool_values[1:] = (sorted_pu_id_values[1:] != sorted_pu_id_values[:-1]) | (sorted_feat_id_values[1:] != sorted_feat_id_values[:-1])
+    pair_first_pos_values = numpy.flatnonzero(new_pair_bool_values)
+    last_of_pair_bool_values = numpy.ones(len(row_array), dtype=bool)
+    last_of_pair_bool_values[:-1] = new_pair_bool_values[1:]
+    pair_last_pos_values = numpy.flatnonzero(last_of_pair_bool_values)
+
+    pair_pu_id_values = sorted_pu_id_values[pair_first_pos_values]
+    pair_first_row_values = sort_order[pair_first_pos_values]
+    if keep_file_order_bool:
+        pair_order = numpy.lexsort((pair_first_row_values, pair_pu_id_values))
+    else:
+        pair_order = numpy.arange(len(pair_first_pos_values))
+
+    feat_id_array = sorted_feat_id_values[pair_first_pos_values][pair_order].astype('<i8')
+    amount_array = row_array['amount'][sort_order[pair_last_pos_values]][pair_order].astype('<f8')
+    pu_id_array, pu_entry_count_array = numpy.unique(pair_pu_id_values, return_counts=True)
+    indptr_array = numpy.zeros(len(pu_id_array) + 1, dtype='<i8')
+    numpy.cumsum(pu_entry_count_array, out=indptr_array[1:])
+
+    return [pu_id_array.astype('<i8'), indptr_array, feat_id_array, amount_array]
+
+
+def make_abund_store(puvspr2_file_path, store_path, progress_bar_function):
+    # Returns 'blank' if puvspr2.dat is incorrectly formatted
+    abund_file_date = return_abund_file_date(puvspr2_file_path)
+    if abund_store_is_valid(store_path, abund_file_date):
+        try:
+            return load_abund_store(store_path), abund_file_date
+        except (IOError, ValueError):
+            pass
+
+    try:
+        row_array = make_row_array_from_puvspr2_file(puvspr2_file_path, progress_bar_function)
+    except (ValueError, IndexError):
+        return 'blank', abund_file_date
+    csr_array_list = make_csr_array_list_from_row_array(row_array, True)
+    del row_array
+
+    try:
+        write_abund_store(store_path, abund_file_date, csr_array_list)
+        abund_store = load_abund_store(store_path)
+    except (IOError, ValueError):
+        abund_store = AbundancePuKeyStore(*csr_array_list)  # The store is still usable from memory if the sidecar file can't be written
+
+    return abund_store, abund_file_date
+
+
+def make_row_array_from_abund_pu_key_dict(abund_pu_key_dict):
+    # Rows are in the order they appear in the store, with any PUs changed since it was loaded at the end
+    row_array_list = list()
+    if isinstance(abund_pu_key_dict, AbundancePuKeyStore):
+        stored_pu_id_values = numpy.repeat(abund_pu_key_dict.pu_id_array, numpy.diff(abund_pu_key_dict.indptr_array))
+        replaced_pu_id_set = abund_pu_key_dict.removed_pu_id_set | set(abund_pu_key_dict.changed_pu_dict)
+        stored_row_array = numpy.zeros(len(stored_pu_id_values), dtype=abund_store_row_dtype)
+        stored_row_array['feat_id'] = abund_pu_key_dict.feat_id_array
+        stored_row_array['pu_id'] = stored_pu_id_values
+        stored_row_array['amount'] = abund_pu_key_dict.amount_array
+        if len(replaced_pu_id_set) > 0:
+            stored_row_array = stored_row_array[numpy.isin(stored_pu_id_values, numpy.array(list(replaced_pu_id_set), dtype='<i8'), invert=True)]
+        row_array_list.append(stored_row_array)
+        abund_pu_key_dict = abund_pu_key_dict.changed_pu_dict
+
+    row_list = [(feat_id, pu_id, pu_abund_dict[feat_id]) for pu_id, pu_abund_dict in abund_pu_key_dict.items() for feat_id in pu_abund_dict]
+    row_array_list.append(numpy.array(row_list, dtype=abund_store_row_dtype))
+
+    return numpy.concatenate(row_array_list)
+
+
+def write_puvspr2_file_from_csr_array_list(puvspr2_file_path, csr_array_list, progress_bar_function):
+    # Written in one sequential pass
+    write_file_by_replacing(puvspr2_file_path, lambda temp_puvspr2_file_path: write_puvspr2_file(temp_puvspr2_file_path, csr_array_list, progress_bar_function))
+
+
+def write_puvspr2_file(puvspr2_file_path, csr_array_list, progress_bar_function):
+    pu_id_array, indptr_array, feat_id_array, amount_array = csr_array_list
+    pu_id_values = numpy.repeat(pu_id_array, numpy.diff(indptr_array))
+    entry_count = len(feat_id_array)
+    chunk_entry_count = 1000000
+
+    with open(puvspr2_file_path, 'w', newline='', encoding='utf-8') as f:
+        puvspr2_writer = writer(f)
+        puvspr2_writer.writerow(['species', 'pu', 'amount'])
+        for start_pos in range(0, entry_count, chunk_entry_count):
+            end_pos = min(start_pos + chunk_entry_count, entry_count)
+            puvspr2_writer.writerows(zip(feat_id_array[start_pos:end_pos].tolist(), pu_id_values[start_pos:end_pos].tolist(), amount_array[start_pos:end_pos].tolist()))
+            progress_bar_function(end_pos, entry_count)
+
+
+def save_abund_store(puvspr2_file_path, store_path, abund_store, csr_array_list, progress_bar_function):
+    # Writes puvspr2.dat and the matching sidecar file from the new arrays, so neither has to be read again
+    write_puvspr2_file_from_csr_array_list(puvspr2_file_path, csr_array_list, progress_bar_function)
+    abund_file_date = return_abund_file_date(puvspr2_file_path)
+    update_abund_store(store_path, abund_store, abund_file_date, csr_array_list)
+
+    return abund_file_date
+
+
+def update_abund_store(store_path, abund_store, abund_file_date, csr_array_list):
+    abund_store.set_csr_arrays(csr_array_list)  # Releases the memory map of the old sidecar file so it can be replaced
+    try:
+        write_abund_store(store_path, abund_file_date, csr_array_list)
+        abund_store.set_csr_arrays(load_abund_store(store_path).return_csr_array_list())
+    except (IOError, ValueError):
+        pass  # The store keeps the arrays in memory if the sidecar file can't be written
+
+
+def add_row_array_to_abund_store(puvspr2_file_path, store_path, abund_store, add_row_array, progress_bar_function):
+    # New amounts replace any existing amount for the same PU and feature
+    row_array = numpy.concatenate([make_row_array_from_abund_pu_key_dict(abund_store), add_row_array])
+    csr_array_list = make_csr_array_list_from_row_array(row_array, False)
+    del row_array
+
+    return save_abund_store(puvspr2_file_path, store_path, abund_store, csr_array_list, progress_bar_function)
+
+
+def make_summed_row_array(row_array):
+    # Adds together the amounts of rows with the same PU and feature in the order the rows are given, returning the rows sorted by PU and feature
+    sort_order = numpy.lexsort((row_array['feat_id'], row_array['pu_id']))
+    sorted_row_array = row_array[sort_order]
+    new_pair_bool_values = numpy.ones(len(sorted_row_array), dtype=bool)
+    new_pair_bool_values[1:] = (sorted_row_array['pu_id'][1:] != sorted_row_array['pu_id'][:-1]) | (sorted_row_array['feat_id'][1:] != sorted_row_array['feat_id'][:-1])
+    pair_first_pos_values = numpy.flatnonzero(new_pair_bool_values)
+
+    summed_row_array = sorted_row_array[pair_first_pos_values]
+    summed_row_array['amount'] = sum_values_by_key_in_order(numpy.cumsum(new_pair_bool_values) - 1, sorted_row_array['amount'], len(pair_first_pos_values))
+
+    return summed_row_array
+
+
+def rem_feat_id_set_from_abund_store(puvspr2_file_path, store_path, abund_store, rem_feat_id_set):
+    # The rows have already been removed from puvspr2.dat, so only the store and its sidecar file are updated to match it
+    row_array = make_row_array_from_abund_pu_key_dict(abund_store)
+    row_array = row_array[numpy.isin(row_array['feat_id'], numpy.array(list(rem_feat_id_set), dtype='<i8'), invert=True)]
+    csr_array_list = make_csr_array_list_from_row_array(row_array, True)
+    del row_array
+
+    abund_file_date = return_abund_file_date(puvspr2_file_path)
+    update_abund_store(store_path, abund_store, abund_file_date, csr_array_list)
+
+    return abund_file_date
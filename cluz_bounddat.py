@@ -0,0 +1,457 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from functools import partial
+from hashlib import sha256
+from os import path
+from struct import unpack_from
+from zipfile import BadZipFile
+
+import numpy
+
+from .cluz_costs import sum_values_by_key_in_order
+from .cluz_processes import return_process_pool_results
+from .cluz_savefile import save_npz_file_by_replacing
+
+
+bound_dat_chunk_pu_count = 20000  # Number of planning units in each block of polygons that is sent to a worker process
+wkb_polygon_type_value = 3
+wkb_multi_polygon_type_value = 6
+bound_segment_cache_version = 1
+bound_segment_key_name_list = ['x1_values', 'y1_values', 'x2_values', 'y2_values']
+
+
+def make_bound_results_dict_using_segment_cache(pu_id_wkb_dict, vertex_precision, cache_path, process_count, progress_bar_function):
+    # The cache holds the segments of every PU, keyed by a hash of its geometry, so after an edit only the changed PUs
+    # are read again and only the boundaries of the PUs that share segments with them are matched again
+    pu_id_list = sorted(pu_id_wkb_dict)
+    if all(isinstance(puID, int) for puID in pu_id_list):
+        pu_hash_values = make_pu_hash_values(pu_id_list, pu_id_wkb_dict)
+        cache_dict = load_bound_segment_cache(cache_path, vertex_precision)
+        if cache_dict == 'blank':
+            segment_dict = make_segment_dict_from_pu_wkb_dict(pu_id_wkb_dict, pu_id_list, list(range(len(pu_id_list))), vertex_precision, process_count, progress_bar_function)
+            bound_results_dict = make_bound_results_dict_from_segment_dict(segment_dict, pu_id_list)
+            store_dict = make_bound_segment_store_dict(segment_dict, pu_id_list, pu_hash_values, bound_results_dict)
+            write_bound_segment_cache(cache_path, vertex_precision, store_dict)
+        else:
+            store_dict, bound_results_dict = update_bound_segment_cache(cache_path, cache_dict, pu_id_wkb_dict, pu_id_list, pu_hash_values, vertex_precision, process_count, progress_bar_function)
+        pu_segment_count_values = numpy.diff(store_dict['indptr_values'])
+        empty_polygon_pu_id_set = set(pu_id_list[pu_index] for pu_index in numpy.flatnonzero(pu_segment_count_values == 0).tolist())
+    else:
+        # The cache stores the PU IDs as integers, so other IDs are always processed in full
+        bound_results_dict, empty_polygon_pu_id_set = make_bound_results_dict_from_pu_wkb_dict(pu_id_wkb_dict, vertex_precision, process_count, progress_bar_function)
+
+    return bound_results_dict, empty_polygon_pu_id_set
+
+
+def make_pu_hash_values(pu_id_list, pu_id_wkb_dict):
+    pu_hash_values = numpy.array([sha256(pu_id_wkb_dict[puID]).digest() for puID in pu_id_list], dtype='S32')
+
+    return pu_hash_values
+
+
+def make_bound_segment_store_dict(segment_dict, pu_id_list, pu_hash_values, bound_results_dict):
+    # Segments are held in PU order, with indptr_values showing where the segments of each PU start and end
+    sort_order_values = numpy.argsort(segment_dict['pu_index_values'], kind='stable')
+    store_dict = dict()
+    store_dict['pu_id_values'] = numpy.array(pu_id_list, dtype=numpy.int64)
+    store_dict['pu_hash_values'] = pu_hash_values
+    pu_segment_count_values = numpy.bincount(segment_dict['pu_index_values'], minlength=len(pu_id_list))
+    store_dict['indptr_values'] = numpy.concatenate([numpy.zeros(1, dtype=numpy.int64), numpy.cumsum(pu_segment_count_values, dtype=numpy.int64)])
+    for keyName in bound_segment_key_name_list:
+        store_dict[keyName] = segment_dict[keyName][sort_order_values].astype(numpy.int64)
+    store_dict['length_values'] = segment_dict['length_values'][sort_order_values].astype(numpy.float64)
+
+    bound_key_list = list(bound_results_dict.keys())
+    store_dict['id1_values'] = numpy.array([aKey[0] for aKey in bound_key_list], dtype=numpy.int64)
+    store_dict['id2_values'] = numpy.array([aKey[1] for aKey in bound_key_list], dtype=numpy.int64)
+    store_dict['bound_values'] = numpy.array([bound_results_dict[aKey] for aKey in bound_key_list], dtype=numpy.float64)
+
+    return store_dict
+
+
+def make_segment_dict_from_store_dict(store_dict):
+    segment_dict = dict()
+    segment_dict['pu_index_values'] = numpy.repeat(numpy.arange(len(store_dict['pu_id_values'])), numpy.diff(store_dict['indptr_values']))
+    for keyName in bound_segment_key_name_list + ['length_values']:
+        segment_dict[keyName] = store_dict[keyName]
+
+    return segment_dict
+
+
+def update_bound_segment_cache(cache_path, cache_dict, pu_id_wkb_dict, pu_id_list, pu_hash_values, vertex_precision, process_count, progress_bar_function):
+    new_pu_id_values = numpy.array(pu_id_list, dtype=numpy.int64)
+    cache_pu_id_values = cache_dict['pu_id_values']
+    cache_position_values = numpy.minimum(numpy.searchsorted(cache_pu_id_values, new_pu_id_values), max(len(cache_pu_id_values) - 1, 0))
+    if len(cache_pu_id_values) > 0:
+        unchanged_values = (cache_pu_id_values[cache_position_values] == new_pu_id_values) & (cache_dict['pu_hash_values'][cache_position_values] == pu_hash_values)
+    else:
+        unchanged_values = numpy.zeros(len(new_pu_id_values), dtype=bool)
+    cache_keep_values = numpy.zeros(len(cache_pu_id_values), dtype=bool)
+    cache_keep_values[cache_position_values[unchanged_values]] = True
+    changed_pu_index_list = numpy.flatnonzero(~unchanged_values).tolist()
+    if len(changed_pu_index_list) == 0 and numpy.all(cache_keep_values):
+        store_dict = cache_dict
+        bound_results_dict = make_bound_results_dict_from_store_dict(cache_dict, numpy.ones(len(cache_dict['id1_values']), dtype=bool))
+    else:
+        store_dict, bound_results_dict = rematch_bound_segment_store_dict(cache_dict, cache_keep_values, cache_position_values, unchanged_values, pu_id_wkb_dict, pu_id_list, pu_hash_values, vertex_precision, process_count, progress_bar_function)
+        write_bound_segment_cache(cache_path, vertex_precision, store_dict)
+
+    return store_dict, bound_results_dict
+
+
+def rematch_bound_segment_store_dict(cache_dict, cache_keep_values, cache_position_values, unchanged_values, pu_id_wkb_dict, pu_id_list, pu_hash_values, vertex_precision, process_count, progress_bar_function):
+    new_pu_id_values = numpy.array(pu_id_list, dtype=numpy.int64)
+    cache_pu_id_values = cache_dict['pu_id_values']
+    changed_pu_index_list = numpy.flatnonzero(~unchanged_values).tolist()
+
+    # Segments of the unchanged PUs are taken from the cache and the changed PUs are read again
+    cache_segment_dict = make_segment_dict_from_store_dict(cache_dict)
+    cache_segment_keep_values = cache_keep_values[cache_segment_dict['pu_index_values']]
+    cache_to_new_pu_index_values = numpy.full(len(cache_pu_id_values), -1, dtype=numpy.int64)
+    cache_to_new_pu_index_values[cache_position_values[unchanged_values]] = numpy.flatnonzero(unchanged_values)
+    kept_segment_dict = dict()
+    kept_segment_dict['pu_index_values'] = cache_to_new_pu_index_values[cache_segment_dict['pu_index_values'][cache_segment_keep_values]]
+    for keyName in bound_segment_key_name_list + ['length_values']:
+        kept_segment_dict[keyName] = cache_segment_dict[keyName][cache_segment_keep_values]
+    kept_segment_dict['empty_pu_index_list'] = list()
+    changed_segment_dict = make_segment_dict_from_pu_wkb_dict(pu_id_wkb_dict, pu_id_list, changed_pu_index_list, vertex_precision, process_count, progress_bar_function)
+    segment_dict = concatenate_segment_dict_list([kept_segment_dict, changed_segment_dict])
+    store_dict = make_bound_segment_store_dict(segment_dict, pu_id_list, pu_hash_values, dict())
+    segment_dict = make_segment_dict_from_store_dict(store_dict)
+
+    # Boundaries change for the PUs that own a segment matching an old or new segment of a changed PU. The last segment in
+    # the sorted list is also included before and after the edit, as the matching treats the last segment differently
+    affected_key_values_list = list()
+    for keyName in bound_segment_key_name_list:
+        affected_key_values_list.append(numpy.concatenate([cache_segment_dict[keyName][~cache_segment_keep_values], changed_segment_dict[keyName].astype(numpy.int64), return_last_segment_key_values(cache_segment_dict)[keyName], return_last_segment_key_values(segment_dict)[keyName]]))
+    affected_segment_values = return_segment_key_in_values(segment_dict, affected_key_values_list)
+    affected_pu_index_values = numpy.unique(segment_dict['pu_index_values'][affected_segment_values])
+
+    # Every segment that matches a segment of an affected PU is matched again, so their boundaries are complete
+    affected_pu_values = numpy.zeros(len(pu_id_list), dtype=bool)
+    affected_pu_values[affected_pu_index_values] = True
+    affected_pu_segment_values = affected_pu_values[segment_dict['pu_index_values']]
+    rematch_segment_values = return_segment_key_in_values(segment_dict, [segment_dict[keyName][affected_pu_segment_values] for keyName in bound_segment_key_name_list])
+    rematch_segment_dict = dict()
+    for keyName in ['pu_index_values'] + bound_segment_key_name_list + ['length_values']:
+        rematch_segment_dict[keyName] = segment_dict[keyName][rematch_segment_values]
+    rematch_bound_results_dict = make_bound_results_dict_from_segment_dict(rematch_segment_dict, pu_id_list)
+
+    affected_pu_id_set = set(new_pu_id_values[affected_pu_index_values].tolist())
+    retract_pu_id_values = numpy.concatenate([new_pu_id_values[affected_pu_index_values], cache_pu_id_values[~cache_keep_values]])
+    cache_bound_keep_values = ~(numpy.isin(cache_dict['id1_values'], retract_pu_id_values) | numpy.isin(cache_dict['id2_values'], retract_pu_id_values))
+    bound_results_dict = make_bound_results_dict_from_store_dict(cache_dict, cache_bound_keep_values)
+    for aKey, aValue in rematch_bound_results_dict.items():
+        if aKey[0] in affected_pu_id_set or aKey[1] in affected_pu_id_set:
+            bound_results_dict[aKey] = aValue
+    store_dict = make_bound_segment_store_dict(segment_dict, pu_id_list, pu_hash_values, bound_results_dict)
+
+    return store_dict, bound_results_dict
+
+
+def make_bound_results_dict_from_store_dict(store_dict, bound_keep_values):
+    id1_list = store_dict['id1_values'][bound_keep_values].tolist()
+    id2_list = store_dict['id2_values'][bound_keep_values].tolist()
+    bound_list = store_dict['bound_values'][bound_keep_values].tolist()
+    bound_results_dict = dict(zip(zip(id1_list, id2_list), bound_list))
+
+    return bound_results_dict
+
+
+def return_last_segment_key_values(segment_dict):
+    # Returns the key of the segment that comes last when the segments are sorted, or no key if there are no segments
+    candidate_values = numpy.arange(len(segment_dict['x1_values']))
+    for keyName in bound_segment_key_name_list:
+        if len(candidate_values) > 0:
+            key_values = segment_dict[keyName][candidate_values]
+            candidate_values = candidate_values[key_values == key_values.max()]
+    last_segment_key_values = dict()
+    for keyName in bound_segment_key_name_list:
+        last_segment_key_values[keyName] = segment_dict[keyName][candidate_values[:1]].astype(numpy.int64)
+
+    return last_segment_key_values
+
+
+def return_segment_key_in_values(segment_dict, lookup_key_values_list):
+    # Segment keys are combined into a single hash value so NumPy can find the possible matches, which are then checked
+    segment_key_values_list = [segment_dict[keyName] for keyName in bound_segment_key_name_list]
+    segment_hash_values = make_segment_hash_values(segment_key_values_list)
+    lookup_hash_values = make_segment_hash_values(lookup_key_values_list)
+    in_values = numpy.isin(segment_hash_values, lookup_hash_values)
+    lookup_key_set = set(zip(*[lookupKeyValues.tolist() for lookupKeyValues in lookup_key_values_list]))
+    candidate_position_values = numpy.flatnonzero(in_values)
+    candidate_key_list = zip(*[segmentKeyValues[candidate_position_values].tolist() for segmentKeyValues in segment_key_values_list])
+    for candidatePosition, candidateKey in zip(candidate_position_values.tolist(), candidate_key_list):
+        if candidateKey not in lookup_key_set:
+            in_values[candidatePosition] = False
+
+    return in_values
+
+
+def make_segment_hash_values(segment_key_values_list):
+    hash_values = numpy.zeros(len(segment_key_values_list[0]), dtype=numpy.uint64)
+    with numpy.errstate(over='ignore'):
+        for segmentKeyValues in segment_key_values_list:
+            hash_values = (hash_values ^ segmentKeyValues.astype(numpy.uint64)) * numpy.uint64(0x100000001B3)
+
+    return hash_values
+
+
+def load_bound_segment_cache(cache_path, vertex_precision):
+    # Returns 'blank' if there is no cache or it was made with a different vertex precision or cannot be read
+    cache_dict = 'blank'
+    if path.exists(cache_path):
+        try:
+            with numpy.load(cache_path, allow_pickle=False) as cache_file:
+                cache_dict = dict((keyName, cache_file[keyName]) for keyName in cache_file.files)
+            if int(cache_dict['version_value']) != bound_segment_cache_version or int(cache_dict['vertex_precision']) != vertex_precision:
+                cache_dict = 'blank'
+            elif cache_dict['indptr_values'][-1] != len(cache_dict['length_values']) or len(cache_dict['indptr_values']) != len(cache_dict['pu_id_values']) + 1:
+                cache_dict = 'blank'
+        except (IOError, ValueError, KeyError, IndexError, EOFError, BadZipFile):
+            cache_dict = 'blank'
+
+    return cache_dict
+
+
+def write_bound_segment_cache(cache_path, vertex_precision, store_dict):
+    save_dict = dict((keyName, store_dict[keyName]) for keyName in store_dict if keyName not in ['version_value', 'vertex_precision'])
+    save_dict['version_value'] = numpy.int64(bound_segment_cache_version)
+    save_dict['vertex_precision'] = numpy.int64(vertex_precision)
+    try:
+        save_npz_file_by_replacing(cache_path, save_dict)
+    except IOError:
+        pass  # The cache only saves time, so bound.dat is still made if it can't be written
+
+
+def make_bound_results_dict_from_pu_wkb_dict(pu_id_wkb_dict, vertex_precision, process_count, progress_bar_function):
+    # Polygons are passed to the worker processes as WKB, so the workers only need NumPy rather than QGIS
+    pu_id_list = sorted(pu_id_wkb_dict)
+    segment_dict = make_segment_dict_from_pu_wkb_dict(pu_id_wkb_dict, pu_id_list, list(range(len(pu_id_list))), vertex_precision, process_count, progress_bar_function)
+    bound_results_dict = make_bound_results_dict_from_segment_dict(segment_dict, pu_id_list)
+    empty_polygon_pu_id_set = set(pu_id_list[pu_index] for pu_index in segment_dict['empty_pu_index_list'])
+
+    return bound_results_dict, empty_polygon_pu_id_set
+
+
+def make_segment_dict_from_pu_wkb_dict(pu_id_wkb_dict, pu_id_list, pu_index_list, vertex_precision, process_count, progress_bar_function):
+    # Extracts the segments of the PUs in pu_index_list, which are positions in pu_id_list
+    pu_wkb_chunk_list = make_pu_wkb_chunk_list(pu_id_list, pu_index_list, pu_id_wkb_dict)
+    chunk_worker_function = partial(make_segment_dict_from_pu_wkb_chunk, vertex_precision=vertex_precision)
+    segment_dict_list = return_process_pool_results(process_count, None, (), chunk_worker_function, pu_wkb_chunk_list, lambda segment_dict_iterator: make_segment_dict_list(segment_dict_iterator, len(pu_wkb_chunk_list), progress_bar_function))
+    segment_dict = concatenate_segment_dict_list(segment_dict_list)
+
+    return segment_dict
+
+
+def make_pu_wkb_chunk_list(pu_id_list, pu_index_list, pu_id_wkb_dict):
+    pu_wkb_chunk_list = list()
+    for start_position in range(0, len(pu_index_list), bound_dat_chunk_pu_count):
+        chunk_pu_index_list = pu_index_list[start_position:start_position + bound_dat_chunk_pu_count]
+        pu_wkb_chunk_list.append([(pu_index, pu_id_wkb_dict[pu_id_list[pu_index]]) for pu_index in chunk_pu_index_list])
+
+    return pu_wkb_chunk_list
+
+
+def make_segment_dict_list(segment_dict_iterator, chunk_count, progress_bar_function):
+    segment_dict_list = list()
+    for segmentDict in segment_dict_iterator:
+        segment_dict_list.append(segmentDict)
+        progress_bar_function(len(segment_dict_list), chunk_count)
+
+    return segment_dict_list
+
+
+def make_segment_dict_from_pu_wkb_chunk(pu_wkb_chunk, vertex_precision):
+    # Each segment is held as the rounded corners of its bounding box, as in the earlier vertex tuples, with the coordinates
+    # quantised to integers at the vertex precision so that matching segments can be found by comparing integers
+    point_array_list = list()
+    ring_pu_index_list = list()
+    empty_pu_index_list = list()
+    for pu_index, wkb_bytes in pu_wkb_chunk:
+        ring_point_array_list = make_ring_point_array_list_from_wkb(wkb_bytes)
+        pu_segment_count = 0
+        for ringPointArray in ring_point_array_list:
+            point_array_list.append(ringPointArray)
+            ring_pu_index_list.append(pu_index)
+            pu_segment_count += max(len(ringPointArray) - 1, 0)
+        if pu_segment_count == 0:
+            empty_pu_index_list.append(pu_index)
+
+    if len(point_array_list) > 0:
+        point_values = numpy.concatenate(point_array_list)
+        ring_length_values = numpy.array([len(ringPointArray) for ringPointArray in point_array_list], dtype=numpy.int64)
+    else:
+        point_values = numpy.zeros((0, 2), dtype=numpy.float64)
+        ring_length_values = numpy.zeros(0, dtype=numpy.int64)
+    point_ring_values = numpy.repeat(numpy.arange(len(ring_length_values)), ring_length_values)
+
+    quant_x_values, round_x_values = round_coord_values(point_values[:, 0], vertex_precision)
+    quant_y_values, round_y_values = round_coord_values(point_values[:, 1], vertex_precision)
+
+    # A segment joins each point to the next one in the same ring
+    start_point_values = numpy.flatnonzero(point_ring_values[:-1] == point_ring_values[1:])
+    end_point_values = start_point_values + 1
+    segment_dict = dict()
+    segment_dict['pu_index_values'] = numpy.array(ring_pu_index_list, dtype=numpy.int64)[point_ring_values[start_point_values]]
+    segment_dict['x1_values'] = numpy.minimum(quant_x_values[start_point_values], quant_x_values[end_point_values])
+    segment_dict['y1_values'] = numpy.minimum(quant_y_values[start_point_values], quant_y_values[end_point_values])
+    segment_dict['x2_values'] = numpy.maximum(quant_x_values[start_point_values], quant_x_values[end_point_values])
+    segment_dict['y2_values'] = numpy.maximum(quant_y_values[start_point_values], quant_y_values[end_point_values])
+    x_length_values = numpy.maximum(round_x_values[start_point_values], round_x_values[end_point_values]) - numpy.minimum(round_x_values[start_point_values], round_x_values[end_point_values])
+    y_length_values = numpy.maximum(round_y_values[start_point_values], round_y_values[end_point_values]) - numpy.minimum(round_y_values[start_point_values], round_y_values[end_point_values])
+    segment_dict['length_values'] = numpy.sqrt(x_length_values ** 2 + y_length_values ** 2)
+    segment_dict['empty_pu_index_list'] = empty_pu_index_list
+
+    return segment_dict
+
+
+def make_ring_point_array_list_from_wkb(wkb_bytes):
+    ring_point_array_list = list()
+    if len(wkb_bytes) > 0:
+        add_wkb_geometry_rings_to_list(wkb_bytes, 0, ring_point_array_list)
+
+    return ring_point_array_list
+
+
+def add_wkb_geometry_rings_to_list(wkb_bytes, offset_value, ring_point_array_list):
+    # Reads polygons and multipolygons, with or without Z and M values, and returns the offset of the end of the geometry
+    byte_order_text, coord_count, geom_type_value = return_wkb_geometry_header(wkb_bytes, offset_value)
+    offset_value += 5
+    if geom_type_value == wkb_polygon_type_value:
+        offset_value = add_wkb_polygon_rings_to_list(wkb_bytes, offset_value, byte_order_text, coord_count, ring_point_array_list)
+    elif geom_type_value == wkb_multi_polygon_type_value:
+        (polygon_count,) = unpack_from(byte_order_text + 'I', wkb_bytes, offset_value)
+        offset_value += 4
+        for polygonNumber in range(polygon_count):
+            offset_value = add_wkb_geometry_rings_to_list(wkb_bytes, offset_value, ring_point_array_list)
+
+    return offset_value
+
+
+def return_wkb_geometry_header(wkb_bytes, offset_value):
+    if wkb_bytes[offset_value] == 1:
+        byte_order_text = '<'
+    else:
+        byte_order_text = '>'
+    (raw_type_value,) = unpack_from(byte_order_text + 'I', wkb_bytes, offset_value + 1)
+    # QGIS writes ISO WKB, where Z and M are shown by adding 1000, 2000 or 3000 to the type, but EWKB flags are also read
+    iso_type_value = raw_type_value & 0x0FFFFFFF
+    has_z_bool = (iso_type_value // 1000) in (1, 3) or (raw_type_value & 0x80000000) != 0
+    has_m_bool = (iso_type_value // 1000) in (2, 3) or (raw_type_value & 0x40000000) != 0
+    coord_count = 2 + int(has_z_bool) + int(has_m_bool)
+    geom_type_value = iso_type_value % 1000
+
+    return byte_order_text, coord_count, geom_type_value
+
+
+def add_wkb_polygon_rings_to_list(wkb_bytes, offset_value, byte_order_text, coord_count, ring_point_array_list):
+    (ring_count,) = unpack_from(byte_order_text + 'I', wkb_bytes, offset_value)
+    offset_value += 4
+    for ringNumber in range(ring_count):
+        (point_count,) = unpack_from(byte_order_text + 'I', wkb_bytes, offset_value)
+        offset_value += 4
+        coord_values = numpy.frombuffer(wkb_bytes, dtype=numpy.dtype(numpy.float64).newbyteorder(byte_order_text), count=point_count * coord_count, offset=offset_value)
+        ring_point_array_list.append(coord_values.reshape(point_count, coord_count)[:, :2].astype(numpy.float64))
+        offset_value += point_count * coord_count * 8
+
+    return offset_value
+
+
+def round_coord_values(coord_values, vertex_precision):
+    # Returns the coordinates quantised to integers and the same values as round(value, vertex_precision). NumPy rounding
+    # can differ from round when the scaled value is within a rounding error of halfway, so those values use round itself
+    scale_value = 10.0 ** vertex_precision
+    scaled_values = coord_values * scale_value
+    quant_values = numpy.rint(scaled_values)
+    round_values = quant_values / scale_value
+    with numpy.errstate(invalid='ignore'):
+        check_values = numpy.abs(numpy.abs(scaled_values - numpy.floor(scaled_values)) - 0.5) <= 2 * numpy.spacing(numpy.abs(scaled_values))
+        check_values |= ~(numpy.abs(scaled_values) < 2.0 ** 52)
+    for coord_index in numpy.flatnonzero(check_values).tolist():
+        round_values[coord_index] = round(float(coord_values[coord_index]), vertex_precision)
+        quant_values[coord_index] = numpy.rint(round_values[coord_index] * scale_value)
+
+    return quant_values.astype(numpy.int64), round_values
+
+
+def concatenate_segment_dict_list(segment_dict_list):
+    segment_dict = dict()
+    for keyName in ['pu_index_values', 'x1_values', 'y1_values', 'x2_values', 'y2_values', 'length_values']:
+        if len(segment_dict_list) > 0:
+            segment_dict[keyName] = numpy.concatenate([aSegmentDict[keyName] for aSegmentDict in segment_dict_list])
+        else:
+            segment_dict[keyName] = numpy.zeros(0, dtype=numpy.int64)
+    segment_dict['empty_pu_index_list'] = [puIndex for aSegmentDict in segment_dict_list for puIndex in aSegmentDict['empty_pu_index_list']]
+
+    return segment_dict
+
+
+def make_bound_results_dict_from_segment_dict(segment_dict, pu_id_list):
+    # Matches the earlier method, which sorted the (segment, PU ID) pairs and walked through them, pairing each segment
+    # with the next one if they were the same and otherwise counting it as an external edge of its PU
+    sort_order_values = numpy.lexsort((segment_dict['pu_index_values'], segment_dict['y2_values'], segment_dict['x2_values'], segment_dict['y1_values'], segment_dict['x1_values']))
+    pu_index_values = segment_dict['pu_index_values'][sort_order_values]
+    segment_key_values_list = [segment_dict[keyName][sort_order_values] for keyName in ['x1_values', 'y1_values', 'x2_values', 'y2_values']]
+    length_values = segment_dict['length_values'][sort_order_values]
+
+    # Each PU only counts each of its segments once
+    same_segment_values = return_same_segment_values(segment_key_values_list)
+    keep_values = numpy.ones(len(pu_index_values), dtype=bool)
+    keep_values[1:] = ~(same_segment_values & (pu_index_values[1:] == pu_index_values[:-1]))
+    pu_index_values = pu_index_values[keep_values]
+    length_values = length_values[keep_values]
+    same_segment_values = return_same_segment_values([segmentKeyValues[keep_values] for segmentKeyValues in segment_key_values_list])
+
+    segment_count = len(pu_index_values)
+    group_start_values = numpy.ones(segment_count, dtype=bool)
+    group_start_values[1:] = ~same_segment_values
+    group_start_position_values = numpy.flatnonzero(group_start_values)
+    group_position_values = numpy.arange(segment_count) - group_start_position_values[numpy.cumsum(group_start_values) - 1]
+    has_next_values = numpy.zeros(segment_count, dtype=bool)
+    has_next_values[:-1] = same_segment_values
+    pair_first_values = (group_position_values % 2 == 0) & has_next_values
+    single_values = (group_position_values % 2 == 0) & ~has_next_values
+    if segment_count > 0:
+        single_values[-1] = False  # The earlier walk stopped before the last segment when it was not part of a pair
+
+    event_position_values = numpy.flatnonzero(pair_first_values | single_values)
+    id1_index_values = pu_index_values[event_position_values]
+    id2_index_values = numpy.where(pair_first_values[event_position_values], pu_index_values[numpy.minimum(event_position_values + 1, max(segment_count - 1, 0))], id1_index_values)
+    # The lengths are added in segment order, as the earlier walk did
+    pair_key_values = id1_index_values * len(pu_id_list) + id2_index_values
+    unique_pair_key_values, pair_position_values = numpy.unique(pair_key_values, return_inverse=True)
+    pair_length_values = sum_values_by_key_in_order(pair_position_values, length_values[event_position_values], len(unique_pair_key_values))
+
+    bound_results_dict = dict()
+    for pair_key, pair_length in zip(unique_pair_key_values.tolist(), pair_length_values.tolist()):
+        bound_results_dict[(pu_id_list[pair_key // len(pu_id_list)], pu_id_list[pair_key % len(pu_id_list)])] = pair_length
+
+    return bound_results_dict
+
+
+def return_same_segment_values(segment_key_values_list):
+    # Shows whether each segment in the sorted list is the same as the next one
+    same_segment_values = numpy.ones(max(len(segment_key_values_list[0]) - 1, 0), dtype=bool)
+    for segmentKeyValues in segment_key_values_list:
+        same_segment_values &= segmentKeyValues[1:] == segmentKeyValues[:-1]
+
+    return same_segment_values
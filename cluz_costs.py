@@ -0,0 +1,139 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import numpy
+
+
+cost_chunk_value_count = 4000000  # Largest number of run x entry values held in memory at once when costing a batch of portfolios
+
+
+def make_cost_data_dict(pu_id_array, pu_cost_array, bound_matrix, abund_matrix, feat_id_array, feat_target_array, feat_penalty_array):
+    # Edge and abundance entries are kept in the same order as the loops they replace, so the sums match them exactly
+    cost_data_dict = dict()
+    pu_id_values = numpy.asarray(pu_id_array, dtype=numpy.int64)
+    cost_data_dict['pu_cost_values'] = numpy.asarray(pu_cost_array, dtype=numpy.float64)
+
+    edge_id1_index_values, edge_id2_index_values, edge_length_values = make_csr_entry_arrays(bound_matrix)
+    # Each boundary is held in both rows of the boundary matrix, so only the copy with the lower ID first is used
+    single_edge_values = pu_id_values[edge_id2_index_values] >= pu_id_values[edge_id1_index_values]
+    cost_data_dict['edge_id1_index_values'] = edge_id1_index_values[single_edge_values]
+    cost_data_dict['edge_id2_index_values'] = edge_id2_index_values[single_edge_values]
+    cost_data_dict['edge_length_values'] = edge_length_values[single_edge_values]
+    cost_data_dict['edge_is_external_values'] = cost_data_dict['edge_id1_index_values'] == cost_data_dict['edge_id2_index_values']
+
+    if abund_matrix is None:
+        abund_pu_index_values, abund_feat_index_values, abund_amount_values = numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.float64)
+    else:
+        abund_pu_index_values, abund_feat_index_values, abund_amount_values = make_csr_entry_arrays(abund_matrix)
+    cost_data_dict['abund_pu_index_values'] = abund_pu_index_values
+    cost_data_dict['abund_feat_index_values'] = abund_feat_index_values
+    cost_data_dict['abund_amount_values'] = abund_amount_values
+
+    # Target penalties are added in feature ID order
+    feat_order_values = numpy.argsort(numpy.asarray(feat_id_array, dtype=numpy.int64), kind='stable')
+    cost_data_dict['feat_order_values'] = feat_order_values
+    cost_data_dict['feat_target_values'] = numpy.asarray(feat_target_array, dtype=numpy.float64)
+    cost_data_dict['feat_penalty_values'] = numpy.asarray(feat_penalty_array, dtype=numpy.float64)
+
+    return cost_data_dict
+
+
+def make_csr_entry_arrays(csr_matrix):
+    indptr_values = numpy.asarray(csr_matrix.indptr_array, dtype=numpy.int64)
+    row_index_values = numpy.repeat(numpy.arange(len(indptr_values) - 1, dtype=numpy.int64), numpy.diff(indptr_values))
+    column_index_values = numpy.asarray(csr_matrix.index_array, dtype=numpy.int64)
+    entry_value_values = numpy.asarray(csr_matrix.value_array, dtype=numpy.float64)
+
+    return row_index_values, column_index_values, entry_value_values
+
+
+def calc_portfolio_costs(cost_data_dict, status_arrays):
+    # status_arrays holds one status array per portfolio, eg one for each Marxan run, and the results hold one value per portfolio
+    status_values = numpy.atleast_2d(numpy.asarray(status_arrays, dtype=numpy.int8))
+    portfolio_count = status_values.shape[0]
+    feat_count = len(cost_data_dict['feat_target_values'])
+
+    portfolio_costs_dict = dict()
+    portfolio_costs_dict['total_unit_cost'] = numpy.zeros(portfolio_count)
+    portfolio_costs_dict['con_unit_count'] = numpy.zeros(portfolio_count, dtype=numpy.int64)
+    portfolio_costs_dict['number_active_pus'] = numpy.zeros(portfolio_count, dtype=numpy.int64)
+    portfolio_costs_dict['total_boundary_length'] = numpy.zeros(portfolio_count)
+    portfolio_costs_dict['abundance_values'] = numpy.zeros((portfolio_count, feat_count, 4))
+    portfolio_costs_dict['amount_conserved'] = numpy.zeros((portfolio_count, feat_count))
+    portfolio_costs_dict['total_target_cost'] = numpy.zeros(portfolio_count)
+
+    entry_count = max(len(status_values[0]), len(cost_data_dict['edge_length_values']), len(cost_data_dict['abund_amount_values']), 1)
+    chunk_size = max(1, cost_chunk_value_count // entry_count)
+    for chunk_start in range(0, portfolio_count, chunk_size):
+        chunk_slice = slice(chunk_start, min(chunk_start + chunk_size, portfolio_count))
+        add_chunk_portfolio_costs(cost_data_dict, status_values[chunk_slice], portfolio_costs_dict, chunk_slice)
+
+    return portfolio_costs_dict
+
+
+def add_chunk_portfolio_costs(cost_data_dict, status_values, portfolio_costs_dict, chunk_slice):
+    selected_values = (status_values == 1) | (status_values == 2)
+    active_values = (status_values == 0) | (status_values == 1)
+    portfolio_costs_dict['con_unit_count'][chunk_slice] = selected_values.sum(axis=1)
+    portfolio_costs_dict['number_active_pus'][chunk_slice] = active_values.sum(axis=1)
+    portfolio_costs_dict['total_unit_cost'][chunk_slice] = sum_rows_in_order(selected_values * cost_data_dict['pu_cost_values'])
+
+    edge_id1_selected_values = selected_values[:, cost_data_dict['edge_id1_index_values']]
+    edge_id2_selected_values = selected_values[:, cost_data_dict['edge_id2_index_values']]
+    # Boundaries count when only one side is selected, and external edges count when their PU is selected
+    counted_edge_values = (edge_id1_selected_values != edge_id2_selected_values) | (edge_id1_selected_values & cost_data_dict['edge_is_external_values'])
+    portfolio_costs_dict['total_boundary_length'][chunk_slice] = sum_rows_in_order(counted_edge_values * cost_data_dict['edge_length_values'])
+
+    feat_count = len(cost_data_dict['feat_target_values'])
+    abund_feat_index_values = cost_data_dict['abund_feat_index_values']
+    abund_status_values = status_values[:, cost_data_dict['abund_pu_index_values']].astype(numpy.int64)
+    abund_amount_values = numpy.broadcast_to(cost_data_dict['abund_amount_values'], abund_status_values.shape)
+    portfolio_costs_dict['abundance_values'][chunk_slice] = sum_grouped_rows_in_order(abund_feat_index_values * 4 + abund_status_values, abund_amount_values, feat_count * 4).reshape(len(status_values), feat_count, 4)
+    abund_selected_values = (abund_status_values == 1) | (abund_status_values == 2)
+    amount_conserved_values = sum_grouped_rows_in_order(numpy.broadcast_to(abund_feat_index_values, abund_status_values.shape), abund_selected_values * abund_amount_values, feat_count)
+    portfolio_costs_dict['amount_conserved'][chunk_slice] = amount_conserved_values
+
+    feat_order_values = cost_data_dict['feat_order_values']
+    unmet_penalty_values = (amount_conserved_values < cost_data_dict['feat_target_values']) * cost_data_dict['feat_penalty_values']
+    portfolio_costs_dict['total_target_cost'][chunk_slice] = sum_rows_in_order(unmet_penalty_values[:, feat_order_values])
+
+
+def sum_rows_in_order(value_rows):
+    row_count, column_count = value_rows.shape
+    row_key_values = numpy.repeat(numpy.arange(row_count), column_count)
+    row_sum_values = sum_values_by_key_in_order(row_key_values, value_rows.ravel(), row_count)
+
+    return row_sum_values
+
+
+def sum_grouped_rows_in_order(group_rows, value_rows, group_count):
+    row_count = group_rows.shape[0]
+    group_key_values = (group_rows + numpy.arange(row_count)[:, None] * group_count).ravel()
+    group_sum_values = sum_values_by_key_in_order(group_key_values, value_rows.ravel(), row_count * group_count)
+
+    return group_sum_values.reshape(row_count, group_count)
+
+
+def sum_values_by_key_in_order(key_values, weight_values, key_count):
+    # bincount adds the values with each key one after another, in the order they are given, so each total is the same
+    # to the last bit as one added up in a Python loop over the same values
+    key_sum_values = numpy.bincount(key_values, weights=weight_values, minlength=key_count)
+
+    return key_sum_values
@@ -151,8 +151,8 @@ class ConvertCsvDialog(QDialog, Ui_convertCsvDialog):
         conv_factor_check = check_conv_factor(self)
 
         if layer_factor_check and conv_factor_check:
-            add_abund_dict, feat_id_list, continue_bool = make_csv_add_abund_dict(self, setup_object)
+            add_abund_row_array, feat_id_list, continue_bool = make_csv_add_abund_dict(self, setup_object)
             if continue_bool:
-                add_csv_dict_to_abund_dict_update_puvspr2_target_files(setup_object, add_abund_dict, feat_id_list)
+                add_csv_dict_to_abund_dict_update_puvspr2_target_files(setup_object, add_abund_row_array, feat_id_list)
 
         self.close()
@@ -24,8 +24,8 @@ from csv import reader
 from os import access, path, W_OK
 
 from .cluz_messages import warning_message, success_message, critical_message
-from .cluz_make_file_dicts import make_puvspr2_dat_file, add_features_to_target_csv_file, make_target_dict
-from .cluz_functions2 import add_abund_dict_to_abund_pu_key_dict, create_target_puvspr2_files, create_pu_layer, make_vec_add_abund_dict, make_raster_add_abund_dict
+from .cluz_make_file_dicts import add_row_array_features_to_target_csv_file, add_row_array_to_puvspr2_dat_file, make_target_dict
+from .cluz_functions2 import create_target_puvspr2_files, create_pu_layer, make_vec_add_abund_dict, make_raster_add_abund_dict
 from .cluz_functions2 import update_abund_data
 
 from .zcluz_make_file_dicts import zones_add_features_to_target_csv_file, make_zones_target_dict, make_zones_prop_dict, make_zones_target_zones_dict
@@ -387,12 +387,11 @@ def check_layer_factor(convert_csv_dialog):
 #     return conv_factor_check
 
 
-def add_csv_dict_to_abund_dict_update_puvspr2_target_files(setup_object, add_abund_dict, feat_id_list):
-    setup_object.abund_pu_key_dict = add_abund_dict_to_abund_pu_key_dict(setup_object, add_abund_dict)
-    make_puvspr2_dat_file(setup_object)
+def add_csv_dict_to_abund_dict_update_puvspr2_target_files(setup_object, add_abund_row_array, feat_id_list):
+    add_row_array_to_puvspr2_dat_file(setup_object, add_abund_row_array)
 
     if setup_object.analysis_type != 'MarxanWithZones':
-        add_features_to_target_csv_file(setup_object, add_abund_dict, feat_id_list)
+        add_row_array_features_to_target_csv_file(setup_object, add_abund_row_array, feat_id_list)
         setup_object.target_dict = make_target_dict(setup_object)
     else:
         zones_add_features_to_target_csv_file(setup_object, feat_id_list)
@@ -22,7 +22,7 @@ from qgis.core import QgsVectorLayer
 
 from .cluz_checkup import return_feat_id_set_from_abund_pu_key_dict
 from .cluz_functions3 import rem_features_from_puvspr2, rem_features_from_target_csv_dict
-from .cluz_make_file_dicts import make_target_dict, make_abundance_pu_key_dict
+from .cluz_make_file_dicts import make_target_dict
 from .cluz_messages import critical_message, success_message
 from .zcluz_make_file_dicts import make_zones_target_dict, return_pc_target_value_for_target_table
 
@@ -64,7 +64,6 @@ def remove_selected_features_from_target_abund_files(remove_dialog, setup_object
     selected_feat_id_list_length = len(selected_feat_id_list)
     if selected_feat_id_list_length > 0:
         rem_features_from_puvspr2(setup_object, selected_feat_id_set)
-        setup_object.abund_pu_key_dict = make_abundance_pu_key_dict(setup_object)
 
         rem_features_from_target_csv_dict(setup_object, selected_feat_id_set)
         if setup_object.analysis_type != 'MarxanWithZones':
@@ -464,8 +464,8 @@ def make_spatial_table_item_dict(setup_object, spatial_data_dict):
 
 
 def add_patch_feat_details_to_portfolio_dict(setup_object, portfolio_pu_details_dict):
-    pu_dict, patch_dict, dummy_zone_dict = make_patch_dict_based_on_dummy_zone_file(setup_object)  # Only need patch_dict
-    patch_feat_data_dict = make_patch_feat_data_dict(setup_object, patch_dict)
+    portfolio_data_dict, patch_dict = make_patch_dict_based_on_dummy_zone_file(setup_object)
+    patch_feat_data_dict = make_patch_feat_data_dict(setup_object, portfolio_data_dict, patch_dict)
 
     portfolio_pu_details_dict['patch_feat_details_bool'] = True
     portfolio_pu_details_dict['patch_feat_data_dict'] = patch_feat_data_dict
@@ -111,17 +111,17 @@ class MarxanDialog(QDialog, Ui_marxanDialog):
 
             best_layer_name = 'Best (' + marxan_parameter_dict['output_name'] + ')'
             summed_layer_name = 'SF_Score (' + marxan_parameter_dict['output_name'] + ')'
-            best_output_file, summed_output_file = launch_marxan_analysis(setup_object, marxan_parameter_dict)
+            best_output_file, summed_output_file, marxan_finished_bool = launch_marxan_analysis(setup_object, marxan_parameter_dict)
+            if marxan_finished_bool:
+                add_best_marxan_output_to_pu_shapefile(setup_object, best_output_file, 'Best')
+                add_summed_marxan_output_to_pu_shapefile(setup_object, summed_output_file, 'SF_Score')
 
-            add_best_marxan_output_to_pu_shapefile(setup_object, best_output_file, 'Best')
-            add_summed_marxan_output_to_pu_shapefile(setup_object, summed_output_file, 'SF_Score')
+                remove_previous_marxan_layers()
+                reload_pu_layer(setup_object)
+                display_graduated_layer(setup_object, 'SF_Score', summed_layer_name, 1)  # 1 is SF legend code
+                display_best_output(setup_object, 'Best', best_layer_name)  # Added second to be on top
 
-            remove_previous_marxan_layers()
-            reload_pu_layer(setup_object)
-            display_graduated_layer(setup_object, 'SF_Score', summed_layer_name, 1)  # 1 is SF legend code
-            display_best_output(setup_object, 'Best', best_layer_name)  # Added second to be on top
-
-            setup_object.TargetsMetAction.setEnabled(True)
+                setup_object.TargetsMetAction.setEnabled(True)
 
 
 class LoadDialog(QDialog, Ui_loadDialog):
@@ -20,20 +20,23 @@
 
 from qgis.core import QgsVectorLayer
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from csv import reader
 from os import listdir, path, remove, sep
-from subprocess import Popen
-from time import sleep
+from shutil import rmtree
 
-from .cluz_functions5 import check_num_runs_para_dict, make_calibrate_parameter_value_list, add_best_marxan_output_to_pu_shapefile, make_marxan_bat_file
-from .cluz_functions5 import check_initial_prop_value_para_dict, check_missing_prop_value_para_dict, make_calibrate_results_dict, add_summed_marxan_output_to_pu_shapefile, waiting_for_marxan
+from .cluz_functions5 import check_num_runs_para_dict, make_calibrate_parameter_value_list, add_best_marxan_output_to_pu_shapefile
+from .cluz_functions5 import check_initial_prop_value_para_dict, check_missing_prop_value_para_dict, make_calibrate_results_dict, add_summed_marxan_output_to_pu_shapefile
 from .cluz_functions5 import return_output_name, make_marxan_input_file, check_num_iter_para_dict, check_permission_to_use_marxan_folder_para_dict, check_blm_value_para_dict
-from .cluz_functions5 import make_calibrate_spec_dat_file
+from .cluz_functions5 import make_calibrate_spec_dat_file, make_marxan_working_folder, run_marxan_process
 
 from .zcluz_functions5 import make_zones_marxan_input_file, check_if_add_zone_target_dat_needed_bool, make_zones_calibrate_results_dict
 
+from .cluz_marxansplit import run_split_marxan_analysis
+
 from .cluz_display import display_graduated_layer, display_best_output
-from .cluz_messages import warning_message
+from .cluz_messages import clear_progress_bar, make_progress_bar, set_progress_bar_value, solver_status_error_message, warning_message
+from .cluz_processes import return_max_process_count
 
 
 # Marxan Dialog###########################################
@@ -57,6 +60,7 @@ def set_marxan_dialog_parameters(marxan_dialog, setup_object):
 
     marxan_dialog.missingLineEdit.setText(str(setup_object.target_prop))
     marxan_dialog.propLineEdit.setText(str(setup_object.start_prop))
+    marxan_dialog.processesSpinBox.setMaximum(return_max_process_count())
 
 def make_marxan_raw_parameter_dict(marxan_dialog, setup_object):
     num_iter_string = marxan_dialog.iterLineEdit.text()
@@ -81,6 +85,10 @@ def make_marxan_raw_parameter_dict(marxan_dialog, setup_object):
     marxan_raw_parameter_dict['spec_name'] = 'spec.dat'
     marxan_raw_parameter_dict['output_name'] = output_name
     marxan_raw_parameter_dict['marxan_path'] = setup_object.marxan_path
+    if hasattr(marxan_dialog, 'processesSpinBox'):
+        marxan_raw_parameter_dict['process_count'] = marxan_dialog.processesSpinBox.value()
+    else:
+        marxan_raw_parameter_dict['process_count'] = 1  # The Marxan with Zones dialog shares this function but always uses one process
 
     return marxan_raw_parameter_dict
 
@@ -96,12 +104,17 @@ def make_marxan_parameter_dict(setup_object, marxan_raw_parameter_dict):
     marxan_parameter_dict['extra_outputs_bool'] = marxan_raw_parameter_dict['extra_outputs_bool']
     marxan_parameter_dict['spec_name'] = marxan_raw_parameter_dict['spec_name']
     marxan_parameter_dict['output_name'] = marxan_raw_parameter_dict['output_name']
+    marxan_parameter_dict['rand_seed'] = -1  # Marxan uses the time to set the seed
+    marxan_parameter_dict['process_count'] = min(marxan_raw_parameter_dict['process_count'], marxan_parameter_dict['num_run'])
 
     marxan_path = setup_object.marxan_path
     marxan_folder_name = path.dirname(marxan_path)
     marxan_setup_path = str(marxan_folder_name) + sep + 'input.dat'
     marxan_parameter_dict["marxan_path"] = marxan_path
+    marxan_parameter_dict["marxan_working_path"] = marxan_folder_name
     marxan_parameter_dict["marxan_setup_path"] = marxan_setup_path
+    marxan_parameter_dict["marxan_output_path"] = setup_object.output_path
+    marxan_parameter_dict["timeout_seconds"] = 'blank'  # Marxan can run for as long as it needs unless a number of seconds is set
 
     return marxan_parameter_dict
 
@@ -137,14 +150,20 @@ def check_marxan_files_exist_bool(setup_object):
 
 
 def launch_marxan_analysis(setup_object, marxan_parameter_dict):
-    make_marxan_input_file(setup_object, marxan_parameter_dict)
-    marxan_bat_file_name = make_marxan_bat_file(setup_object)
-    Popen([marxan_bat_file_name])
-    waiting_for_marxan(setup_object, marxan_parameter_dict['output_name'])
+    progress_bar = make_progress_bar('Running Marxan')
+    progress_function = lambda run_count, run_total_count: set_progress_bar_value(progress_bar, run_count, run_total_count)
+    if marxan_parameter_dict['process_count'] > 1:
+        marxan_status_text = run_split_marxan_analysis(setup_object, marxan_parameter_dict, progress_function)
+    else:
+        make_marxan_input_file(setup_object, marxan_parameter_dict)
+        marxan_status_text = run_marxan_process(marxan_parameter_dict, progress_function)
+    clear_progress_bar()
+    if marxan_status_text != 'finished':
+        solver_status_error_message('Marxan', marxan_status_text)
     best_output_file = setup_object.output_path + sep + marxan_parameter_dict['output_name'] + '_best.txt'
     summed_output_file = setup_object.output_path + sep + marxan_parameter_dict['output_name'] + '_ssoln.txt'
 
-    return best_output_file, summed_output_file
+    return best_output_file, summed_output_file, marxan_status_text == 'finished'
 
 
 # Load previous results ########################################################
@@ -405,6 +424,7 @@ def check_calibrate_spf_value(calibrate_dialog, calibrate_raw_parameter_dict, pa
 
 def run_calibrate_marxan(setup_object, calibrate_raw_parameter_dict, num_run_list, num_iter_list, blm_value_list, spf_value_list):
     calibrate_results_dict = dict()
+    marxan_parameter_dict_list = list()
     for analysis_number in range(0, int(calibrate_raw_parameter_dict['num_analyses_text'])):
         marxan_parameter_dict = make_calibrate_marxan_parameter_dict(setup_object, calibrate_raw_parameter_dict, num_iter_list, num_run_list, blm_value_list, spf_value_list, analysis_number)
         if len(set(spf_value_list)) != 1:
@@ -412,22 +432,43 @@ def run_calibrate_marxan(setup_object, calibrate_raw_parameter_dict, num_run_lis
             calibrate_spec_dat_file_name = 'calib_del_later_spec' + str(analysis_number) + '.dat'
             marxan_parameter_dict['spec_name'] = calibrate_spec_dat_file_name
             make_calibrate_spec_dat_file(setup_object, calibrate_spec_dat_file_name, spf_value)
+        make_marxan_working_folder(marxan_parameter_dict)
         if setup_object.analysis_type != 'MarxanWithZones':
             make_marxan_input_file(setup_object, marxan_parameter_dict)
         else:
             add_zone_target_dat_bool = check_if_add_zone_target_dat_needed_bool(setup_object)
             make_zones_marxan_input_file(setup_object, marxan_parameter_dict, add_zone_target_dat_bool)
-        marxan_bat_file_name = make_marxan_bat_file(setup_object)
-        Popen([marxan_bat_file_name])
-        sleep(2)
-        waiting_for_marxan(setup_object, calibrate_raw_parameter_dict['output_name_base'] + str(analysis_number + 1))
+        marxan_parameter_dict_list.append(marxan_parameter_dict)
 
-        if setup_object.analysis_type != 'MarxanWithZones':
-            calibrate_results_dict[analysis_number] = make_calibrate_results_dict(setup_object, marxan_parameter_dict)
-        else:
-            calibrate_results_dict[analysis_number] = make_zones_calibrate_results_dict(setup_object, marxan_parameter_dict)
+    # Each analysis has its own working folder and input.dat file, so several copies of Marxan can run at the same time
+    worker_count = max(min(return_max_process_count(), len(marxan_parameter_dict_list)), 1)
+    executor = ThreadPoolExecutor(max_workers=worker_count)
+    progress_bar = make_progress_bar('Running Marxan calibration analyses')
+    failed_analysis_number_list = list()
+    try:
+        future_dict = dict()
+        for analysis_number in range(0, len(marxan_parameter_dict_list)):
+            future_dict[executor.submit(run_marxan_process, marxan_parameter_dict_list[analysis_number], 'blank')] = analysis_number
+        for aFuture in as_completed(future_dict):
+            analysis_number = future_dict[aFuture]
+            marxan_parameter_dict = marxan_parameter_dict_list[analysis_number]
+            if aFuture.result() != 'finished':
+                failed_analysis_number_list.append(analysis_number)  # Results are only read from copies of Marxan that finished without an error
+            elif setup_object.analysis_type != 'MarxanWithZones':
+                calibrate_results_dict[analysis_number] = make_calibrate_results_dict(setup_object, marxan_parameter_dict)
+            else:
+                calibrate_results_dict[analysis_number] = make_zones_calibrate_results_dict(setup_object, marxan_parameter_dict)
+            set_progress_bar_value(progress_bar, len(calibrate_results_dict) + len(failed_analysis_number_list), len(marxan_parameter_dict_list))
+    finally:
+        executor.shutdown(wait=True)
+        clear_progress_bar()
         if len(set(spf_value_list)) != 1:
             remove_calibrate_spec_dat_file(setup_object)
+        for marxanParameterDict in marxan_parameter_dict_list:
+            rmtree(marxanParameterDict['marxan_working_path'], ignore_errors=True)
+    if len(failed_analysis_number_list) > 0:
+        failed_analysis_string = ', '.join([str(analysis_number + 1) for analysis_number in sorted(failed_analysis_number_list)])
+        warning_message('Marxan error', 'Marxan stopped with an error in the following calibration analyses, so they have not been included in the results: ' + failed_analysis_string)
 
     return calibrate_results_dict
 
@@ -445,13 +486,18 @@ def make_calibrate_marxan_parameter_dict(setup_object, calibrate_raw_parameter_d
 
     calibrate_marxan_parameter_dict['output_name'] = calibrate_raw_parameter_dict['output_name_base'] + str(analysis_number + 1)
     calibrate_marxan_parameter_dict['extra_outputs_bool'] = True
+    calibrate_marxan_parameter_dict['rand_seed'] = -1  # Marxan uses the time to set the seed
     calibrate_marxan_parameter_dict['spec_name'] = 'spec.dat'
 
     marxan_path = setup_object.marxan_path
     marxan_folder_name = path.dirname(marxan_path)
-    marxan_setup_path = str(marxan_folder_name) + sep + 'input.dat'
+    marxan_working_path = str(marxan_folder_name) + sep + 'calib_del_later_analysis' + str(analysis_number + 1)
+    marxan_setup_path = marxan_working_path + sep + 'input.dat'
     calibrate_marxan_parameter_dict['marxan_path'] = marxan_path
+    calibrate_marxan_parameter_dict['marxan_working_path'] = marxan_working_path
     calibrate_marxan_parameter_dict['marxan_setup_path'] = marxan_setup_path
+    calibrate_marxan_parameter_dict['marxan_output_path'] = setup_object.output_path
+    calibrate_marxan_parameter_dict['timeout_seconds'] = 'blank'
 
     return calibrate_marxan_parameter_dict
 
@@ -53,11 +53,11 @@ class PrioritizrDialog(QDialog, Ui_prioritizrDialog):
 
             best_layer_name = 'Best (' + prioritizr_parameter_dict['output_name'] + ')'
 
-            best_output_file = launch_prioritizr_analysis(setup_object, prioritizr_parameter_dict, prioritizr_pathways_dict)
+            best_output_file, prioritizr_finished_bool = launch_prioritizr_analysis(setup_object, prioritizr_parameter_dict, prioritizr_pathways_dict)
+            if prioritizr_finished_bool:
+                add_best_marxan_output_to_pu_shapefile(setup_object, best_output_file, 'Best')
 
-            add_best_marxan_output_to_pu_shapefile(setup_object, best_output_file, 'Best')
-
-            remove_previous_marxan_layers()
-            reload_pu_layer(setup_object)
-            display_best_output(setup_object, 'Best', best_layer_name)  # Added second to be on top
+                remove_previous_marxan_layers()
+                reload_pu_layer(setup_object)
+                display_best_output(setup_object, 'Best', best_layer_name)  # Added second to be on top
 
@@ -22,10 +22,10 @@ from qgis.core import QgsApplication, QgsProcessingFeedback
 
 from os import path, pathsep, environ
 from re import findall
-import subprocess
 
 from .cluz_functions5 import return_output_name
-from .cluz_functions6 import waiting_for_prioritizr
+from .cluz_messages import clear_progress_bar, make_progress_bar, solver_status_error_message
+from .cluz_processes import run_solver_process
 
 
 # Prioritizr Dialog###########################################
@@ -67,6 +67,7 @@ def make_prioritizr_parameter_dict(marxan_raw_parameter_dict):
     prioritizr_parameter_dict['blm_value'] = float(marxan_raw_parameter_dict['blm_value_string'])
     prioritizr_parameter_dict['extra_outputs_bool'] = marxan_raw_parameter_dict['extra_outputs_bool']
     prioritizr_parameter_dict['output_name'] = marxan_raw_parameter_dict['output_name']
+    prioritizr_parameter_dict['timeout_seconds'] = 'blank'  # R can run for as long as it needs unless a number of seconds is set
 
     return prioritizr_parameter_dict
 
@@ -115,12 +116,17 @@ def launch_prioritizr_analysis(setup_object, prioritizr_parameter_dict, prioriti
 
     make_prioritizr_r_script(setup_object, 'best', r_script_path_name, blm_value, prioritizr_output_name)
 
-    subprocess.run([r_path, r_script_path_name])
-    waiting_for_prioritizr(setup_object, prioritizr_output_name)
+    # R only reports a single solution, so the progress bar shows that prioritizr is running rather than how far it has got
+    progress_bar = make_progress_bar('Running prioritizr')
+    progress_bar.setMaximum(0)
+    prioritizr_status_text = run_solver_process([r_path, r_script_path_name], None, 1, prioritizr_parameter_dict['timeout_seconds'], 'blank')
+    clear_progress_bar()
+    if prioritizr_status_text != 'finished':
+        solver_status_error_message('prioritizr', prioritizr_status_text)
 
     best_output_file = path.join(setup_object.output_path, f"{prioritizr_output_name}_best.txt")
 
-    return best_output_file
+    return best_output_file, prioritizr_status_text == 'finished'
 
 
 def make_prioritizr_environ_dict(prioritizr_pathways_dict):
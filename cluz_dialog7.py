@@ -21,10 +21,10 @@
 from qgis.PyQt.QtWidgets import QDialog, QFileDialog
 from cluz_form_minpatch import Ui_minpatchDialog
 
-from .cluz_setup import MinPatchObject
+from .cluz_processes import return_max_process_count
 
 from .cluz_mpmain import run_min_patch
-from .cluz_mpsetup import make_minpatch_data_dict
+from .cluz_mpsetup import make_minpatch_data_dict, MinPatchObject
 from .cluz_messages import warning_message
 from .cluz_dialog7_code import make_marxan_file_list, check_min_patch_file, check_min_patch_blm_value, check_minpatch_selected_items_list
 
@@ -41,6 +41,7 @@ class MinpatchDialog(QDialog, Ui_minpatchDialog):
         self.outputLabel.setText(output_text)
 
         self.blmLineEdit.setText('0')
+        self.processesSpinBox.setMaximum(return_max_process_count())
 
         marxan_file_list = make_marxan_file_list(setup_object)
         if len(marxan_file_list) > 0:
@@ -65,6 +66,10 @@ class MinpatchDialog(QDialog, Ui_minpatchDialog):
         minpatch_object.removeBool = self.removeCheckBox.isChecked()
         minpatch_object.addBool = self.addCheckBox.isChecked()
         minpatch_object.whittleBool = self.whittleCheckBox.isChecked()
+        minpatch_object.usePatchPuIdCacheBool = self.patchCacheCheckBox.isChecked()
+        minpatch_object.exportPatchPuIdTextBool = self.patchTextCheckBox.isChecked()
+        minpatch_object.resumeBool = self.resumeCheckBox.isChecked()
+        minpatch_object.processCount = self.processesSpinBox.value()
 
         if run_min_patch_bool:
             minpatch_data_dict, setup_ok_bool = make_minpatch_data_dict(setup_object, minpatch_object)
@@ -20,18 +20,22 @@
 
 from qgis.core import QgsVectorLayer
 from qgis.PyQt.QtCore import QVariant
-from qgis.core import QgsField, QgsApplication, QgsProcessingFeedback, QgsProcessingException
+from qgis.core import QgsField, QgsApplication
 
 from os import sep
-from csv import DictReader, reader, writer
+from csv import reader, writer
+import numpy
 
-import processing
 from processing.core.Processing import Processing
 Processing.initialize()
 
-from .cluz_messages import info_message, warning_message, make_progress_bar, clear_progress_bar, set_progress_bar_value
-from .cluz_make_file_dicts import remove_prefix_make_id_value, make_puvspr2_dat_file
-from .cluz_make_file_dicts import add_features_to_target_csv_file, make_target_dict, make_abundance_pu_key_dict
+from .cluz_messages import warning_message, make_progress_bar, clear_progress_bar, set_progress_bar_value
+from .cluz_abundstore import abund_store_chunk_byte_count, abund_store_row_dtype, make_summed_row_array
+from .cluz_make_file_dicts import remove_prefix_make_id_value, add_abund_dict_to_puvspr2_dat_file
+from .cluz_make_file_dicts import add_features_to_target_csv_file, make_target_dict
+from .cluz_processes import return_max_process_count
+from .cluz_rasterabund import make_pu_grid_using_cache, make_raster_class_count_dict, return_pu_grid_cache_path, return_pu_grid_fingerprint, return_raster_grid_dict
+from .cluz_vecabund import make_pu_tile_list, make_vec_layer_add_abund_dict
 
 
 def check_conv_factor(convert_dialog):
@@ -53,10 +57,7 @@ def check_conv_factor(convert_dialog):
 
 
 def update_abund_data(setup_object, add_abund_dict, add_feat_id_list):
-    if setup_object.abund_pu_key_dict == 'blank':
-        setup_object.abund_pu_key_dict = make_abundance_pu_key_dict(setup_object)
     add_features_from_add_abund_dict_to_puvspr2_file(setup_object, add_abund_dict)
-    setup_object.abund_pu_key_dict = make_abundance_pu_key_dict(setup_object)
 
     add_features_to_target_csv_file(setup_object, add_abund_dict, add_feat_id_list)
     setup_object.target_dict = make_target_dict(setup_object)
@@ -68,20 +69,23 @@ def make_vec_add_abund_dict(setup_object, layer_list, id_field_name, conv_factor
     error_layer_list = list()
 
     pu_layer = QgsVectorLayer(setup_object.pu_path, 'Planning units', 'ogr')
+    pu_tile_list = make_pu_tile_list(pu_layer, pu_layer.fields().indexFromName('Unit_ID'))
 
     for aLayer in layer_list:
         layer_geom_type = aLayer.geometryType()
         layer_name = aLayer.name()
-        info_message('Processing files:', 'intersecting layer ' + layer_name + '...')
-        try:
-            output_layer = make_intersection_output_layer(pu_layer, aLayer)
+        if layer_geom_type in [1, 2]:
+            progress_bar = make_progress_bar('Intersecting layer ' + layer_name + ' with the planning units')
+            layer_add_abund_dict, layer_feat_id_set, attribute_feature_error, invalid_geom_bool = make_vec_layer_add_abund_dict(pu_tile_list, aLayer, aLayer.fields().indexFromName(id_field_name), conv_factor, setup_object.decimal_places, return_max_process_count(), lambda row_count, row_total_count: set_progress_bar_value(progress_bar, row_count, row_total_count))
+            clear_progress_bar()
 
-            if layer_geom_type == 1:
-                add_abund_dict, add_feat_id_set = make_add_abund_dict_from_line_vec_file(setup_object, aLayer, output_layer, id_field_name, conv_factor, add_abund_dict, add_feat_id_set)
-            elif layer_geom_type == 2:
-                add_abund_dict, add_feat_id_set = make_add_abund_dict_from_poly_vec_file(setup_object, aLayer, output_layer, id_field_name, conv_factor, add_abund_dict, add_feat_id_set)
-        except QgsProcessingException:
-            error_layer_list.append(layer_name)
+            if invalid_geom_bool:
+                error_layer_list.append(layer_name)
+            else:
+                add_abund_dict = add_layer_add_abund_dict_to_add_abund_dict(add_abund_dict, layer_add_abund_dict)
+                add_feat_id_set = add_feat_id_set.union(layer_feat_id_set)
+                if attribute_feature_error:
+                    warning_message('Layer warning: ', 'layer ' + str(layer_name) + ' contains at least one feature that produces fragments with no spatial characteristics when intersected with the planning units.')
 
     add_feat_id_list = list(add_feat_id_set)
     add_feat_id_list.sort()
@@ -89,110 +93,22 @@ def make_vec_add_abund_dict(setup_object, layer_list, id_field_name, conv_factor
     return add_abund_dict, add_feat_id_list, error_layer_list
 
 
-def make_intersection_output_layer(pu_layer, a_layer):
-    feedback = QgsProcessingFeedback()
-    intersect_params_dict = {'INPUT': a_layer, 'INPUT_FIELDS': [], 'OUTPUT': 'memory:', 'OVERLAY': pu_layer, 'OVERLAY_FIELDS': []}
-    intersect_results = processing.run('native:intersection', intersect_params_dict, feedback=feedback)
-    output_layer = intersect_results['OUTPUT']
-
-    return output_layer
-
-
-def make_add_abund_dict_from_line_vec_file(setup_object, a_layer, output_layer, id_field_name, conv_factor, add_abund_dict, add_feat_id_set):
-    decimal_places = setup_object.decimal_places
-
-    output_id_field = output_layer.fields().indexFromName('Unit_ID')
-    output_feat_id_field = output_layer.fields().indexFromName(id_field_name)
-    output_features = output_layer.getFeatures()
-
-    attribute_feature_error = False
-    for outputFeature in output_features:
-        output_attributes = outputFeature.attributes()
-        pu_id = output_attributes[output_id_field]
-        feat_id = output_attributes[output_feat_id_field]
-        add_feat_id_set.add(feat_id)
-
+def add_layer_add_abund_dict_to_add_abund_dict(add_abund_dict, layer_add_abund_dict):
+    for pu_id in layer_add_abund_dict:
+        layer_pu_add_abund_dict = layer_add_abund_dict[pu_id]
         try:
-            final_shape_amount = calc_feat_line_length_in_pu(outputFeature, conv_factor, decimal_places)
-        except AttributeError:
-            final_shape_amount = -1
-
-        if final_shape_amount > 0:
-            pu_add_abund_dict, add_amount = check_add_dict_amount_values(add_abund_dict, pu_id, feat_id)
-            add_amount += final_shape_amount
-            pu_add_abund_dict[feat_id] = add_amount
-            add_abund_dict[pu_id] = pu_add_abund_dict
-        else:
-            attribute_feature_error = True
-
-    if attribute_feature_error:
-        warning_message('Layer warning: ', 'layer ' + str(a_layer.name()) + ' contains at least one feature that produces fragments with no spatial characteristics when intersected with the planning units.')
-
-    return add_abund_dict, add_feat_id_set
-
-
-def make_add_abund_dict_from_poly_vec_file(setup_object, a_layer, output_layer, id_field_name, conv_factor, add_abund_dict, add_feat_id_set):
-    decimal_places = setup_object.decimal_places
-
-    output_id_field = output_layer.fields().indexFromName('Unit_ID')
-    output_feat_id_field = output_layer.fields().indexFromName(id_field_name)
-    output_features = output_layer.getFeatures()
-
-    attribute_feature_error = False
-    for outputFeature in output_features:
-        output_attributes = outputFeature.attributes()
-        pu_id = output_attributes[output_id_field]
-        feat_id = output_attributes[output_feat_id_field]
-        add_feat_id_set.add(feat_id)
-
-        try:
-            final_shape_amount = calc_feat_polygon_area_in_pu(outputFeature, conv_factor, decimal_places)
-        except AttributeError:
-            final_shape_amount = -1
-      
-        if final_shape_amount > 0:
-            pu_add_abund_dict, add_amount = check_add_dict_amount_values(add_abund_dict, pu_id, feat_id)
-            add_amount += final_shape_amount
-            pu_add_abund_dict[feat_id] = add_amount
-            add_abund_dict[pu_id] = pu_add_abund_dict
-        else:
-            attribute_feature_error = True
-
-    if attribute_feature_error:
-        warning_message('Layer warning: ', 'layer ' + str(a_layer.name()) + ' contains at least one feature that produces fragments with no spatial characteristics when intersected with the planning units.')
-
-    return add_abund_dict, add_feat_id_set
-
-
-def check_add_dict_amount_values(add_abund_dict, pu_id, feat_id):
-    try:
-        pu_add_abund_dict = add_abund_dict[pu_id]
-    except KeyError:
-        pu_add_abund_dict = dict()
-    try:
-        add_amount = pu_add_abund_dict[feat_id]
-    except KeyError:
-        add_amount = 0
-
-    return pu_add_abund_dict, add_amount
-
-
-def calc_feat_line_length_in_pu(output_feature, conv_factor, decimal_places):
-    output_geom = output_feature.geometry()
-    intersect_shape_amount = output_geom.length()
-    shape_amount = intersect_shape_amount / conv_factor
-    final_shape_amount = round(shape_amount, decimal_places)
-
-    return final_shape_amount
-
-
-def calc_feat_polygon_area_in_pu(output_feature, conv_factor, decimal_places):
-    output_geom = output_feature.geometry()
-    intersect_shape_amount = output_geom.area()
-    shape_amount = intersect_shape_amount / conv_factor
-    final_shape_amount = round(shape_amount, decimal_places)
+            pu_add_abund_dict = add_abund_dict[pu_id]
+        except KeyError:
+            pu_add_abund_dict = dict()
+        for feat_id in layer_pu_add_abund_dict:
+            try:
+                add_amount = pu_add_abund_dict[feat_id]
+            except KeyError:
+                add_amount = 0
+            pu_add_abund_dict[feat_id] = add_amount + layer_pu_add_abund_dict[feat_id]
+        add_abund_dict[pu_id] = pu_add_abund_dict
 
-    return final_shape_amount
+    return add_abund_dict
 
 # Import raster file ########################################################################################
 
@@ -201,24 +117,31 @@ def make_raster_add_abund_dict(setup_object, layer_list, conv_factor):
     add_abund_dict = dict()
     add_feat_id_set = set()
     error_layer_list = list()
+
     pu_layer = QgsVectorLayer(setup_object.pu_path, 'Planning units', 'ogr')
+    pu_id_field_index = pu_layer.fields().indexFromName('Unit_ID')
+    pu_grid_fingerprint = return_pu_grid_fingerprint(setup_object.pu_path)
 
     for aLayer in layer_list:
         layer_name = aLayer.name()
         layer_pixel_width = aLayer.rasterUnitsPerPixelX()
         layer_pixel_height = aLayer.rasterUnitsPerPixelY()
         layer_pixel_area = layer_pixel_width * layer_pixel_height
-        info_message('Processing files:', 'calculating Zonal Histogram with ' + layer_name + '...')
-        try:
-            output_layer = make_zonal_histogram_output_layer(pu_layer, aLayer)
-            output_zonal_histogram_feat_id_field_list = make_zonal_histogram_output_feat_id_field_list(output_layer)
-            raster_values_are_valid_bool = check_raster_values_are_valid_bool(output_zonal_histogram_feat_id_field_list)
-            if raster_values_are_valid_bool:
-                add_abund_dict, add_feat_id_set = make_add_abund_dict_from_raster_file(setup_object, output_layer, add_abund_dict, add_feat_id_set, conv_factor, layer_pixel_area, output_zonal_histogram_feat_id_field_list)
-            else:
-                error_layer_list.append(layer_name)
-        except QgsProcessingException:
-            error_layer_list.append('ZonalHistogram failed')
+
+        # The planning units are rasterised once for each raster grid and the result is kept in the input folder
+        pu_grid_cache_path = return_pu_grid_cache_path(setup_object.input_path, return_raster_grid_dict(aLayer))
+        progress_bar = make_progress_bar('Matching the planning units to the ' + layer_name + ' raster grid')
+        pu_grid_tuple = make_pu_grid_using_cache(pu_layer, pu_id_field_index, aLayer, pu_grid_cache_path, pu_grid_fingerprint, lambda row_count, row_total_count: set_progress_bar_value(progress_bar, row_count, row_total_count))
+        clear_progress_bar()
+
+        progress_bar = make_progress_bar('Counting the ' + layer_name + ' raster values in each planning unit')
+        class_count_dict = make_raster_class_count_dict(aLayer, pu_grid_tuple, lambda row_count, row_total_count: set_progress_bar_value(progress_bar, row_count, row_total_count))
+        clear_progress_bar()
+        if class_count_dict != 'blank':
+            add_abund_dict, add_feat_id_set = make_add_abund_dict_from_class_count_dict(setup_object, class_count_dict, pu_grid_tuple[2], add_abund_dict, add_feat_id_set, conv_factor, layer_pixel_area)
+        else:
+            warning_message('Invalid values in raster layer', 'The raster layer values must all be positive integers (Zero values are ignored) so data has been ignored.')
+            error_layer_list.append(layer_name)
 
     add_feat_id_list = list(add_feat_id_set)
     add_feat_id_list.sort()
@@ -226,64 +149,18 @@ def make_raster_add_abund_dict(setup_object, layer_list, conv_factor):
     return add_abund_dict, add_feat_id_list, error_layer_list
 
 
-def make_zonal_histogram_output_layer(pu_layer, a_layer):
-    feedback = QgsProcessingFeedback()
-    zonal_histogram_params_dict = {'INPUT_RASTER': a_layer,
-                                'RASTER_BAND': 1,
-                                'INPUT_VECTOR': pu_layer,
-                                'COLUMN_PREFIX': 'ClZHi_',
-                                'OUTPUT': 'TEMPORARY_OUTPUT'}
-    zonal_histogram_results = processing.run('native:zonalhistogram', zonal_histogram_params_dict, feedback=feedback)
-    output_layer = zonal_histogram_results['OUTPUT']
-
-    return output_layer
-
-
-def make_zonal_histogram_output_feat_id_field_list(output_layer):
-    output_zonal_histogram_feat_id_field_list = list()
-    provider = output_layer.dataProvider()
-    field_list = provider.fields()
-    for aField in field_list:
-        field_name = aField.name()
-        if field_name[0:6] == 'ClZHi_':
-            if field_name != 'ClZHi_0' and field_name != 'ClZHi_NODATA':
-                output_zonal_histogram_feat_id_field_list.append(field_name)
-
-    return output_zonal_histogram_feat_id_field_list
-
-
-def check_raster_values_are_valid_bool(output_zonal_histogram_feat_id_field_list):
-    raster_values_are_valid_bool = True
-
-    for feat_id_field_name in output_zonal_histogram_feat_id_field_list:
-        feat_id_string = feat_id_field_name.replace('ClZHi_', '')
-        try:
-            feat_id = int(feat_id_string)
-            if feat_id < 0:
-                raster_values_are_valid_bool = False
-        except ValueError:
-            raster_values_are_valid_bool = False
-    if raster_values_are_valid_bool is False:
-        warning_message('Invalid values in raster layer', 'The raster layer values must all be positive integers (Zero values are ignored) so data has been ignored.')
-
-    return raster_values_are_valid_bool
-
-
-def make_add_abund_dict_from_raster_file(setup_object, output_layer, add_abund_dict, add_feat_id_set, conv_factor, layer_pixel_area, output_zonal_histogram_feat_id_field_list):
+def make_add_abund_dict_from_class_count_dict(setup_object, class_count_dict, pu_id_values, add_abund_dict, add_feat_id_set, conv_factor, layer_pixel_area):
     decimal_places = setup_object.decimal_places
-    output_id_field = output_layer.fields().indexFromName('Unit_ID')
-    output_features = output_layer.getFeatures()
-
-    for outputFeature in output_features:
-        output_attributes = outputFeature.attributes()
-        unit_id = output_attributes[output_id_field]
-        for featIDFieldName in output_zonal_histogram_feat_id_field_list:
-            output_feat_field = output_layer.fields().indexFromName(featIDFieldName)
-            feat_id = int(featIDFieldName.replace('ClZHi_', ''))
-            add_feat_id_set.add(feat_id)
-            raw_feat_amount = output_attributes[output_feat_field] * layer_pixel_area
+    pu_id_list = pu_id_values.tolist()
+
+    for feat_id in sorted(class_count_dict):
+        add_feat_id_set.add(feat_id)
+        pu_index_values, pixel_count_values = class_count_dict[feat_id]
+        for pu_index, pixel_count in zip(pu_index_values.tolist(), pixel_count_values.tolist()):
+            raw_feat_amount = pixel_count * layer_pixel_area
             final_feat_amount = round(raw_feat_amount / conv_factor, decimal_places)
             if final_feat_amount > 0:
+                unit_id = pu_id_list[pu_index]
                 try:
                     pu_add_abund_dict = add_abund_dict[unit_id]
                 except KeyError:
@@ -300,14 +177,14 @@ def make_csv_add_abund_dict(convert_csv_dialog, setup_object):
     csv_file_path = convert_csv_dialog.csvFileLineEdit.text()
     conv_factor = float(convert_csv_dialog.convLineEdit.text())
     raw_unit_id_field_name = convert_csv_dialog.idfieldComboBox.currentText()
-    add_abund_dict = dict()
+    add_abund_row_array = 'blank'
     feat_id_list = list()
     continue_bool = True
     unit_id_field_name = str(raw_unit_id_field_name)  # Removes u from beginning of string
 
-    csv_file = open(csv_file_path, 'rt')
-    abund_data_reader = reader(csv_file)
-    file_header_list = next(abund_data_reader)
+    with open(csv_file_path, 'rt') as csv_file:
+        abund_data_reader = reader(csv_file)
+        file_header_list = next(abund_data_reader)
     file_header_list.remove(unit_id_field_name)
     feat_header_dict = dict()
     for aFeatHeader in file_header_list:
@@ -323,66 +200,63 @@ def make_csv_add_abund_dict(convert_csv_dialog, setup_object):
         continue_bool = False
 
     if continue_bool:
-        add_abund_dict = make_add_abund_dict_from_csv_file(csv_file_path, feat_header_dict, file_header_list, unit_id_field_name, conv_factor)
+        add_abund_row_array = make_add_abund_row_array_from_csv_file(csv_file_path, feat_header_dict, unit_id_field_name, conv_factor)
 
-    return add_abund_dict, feat_id_list, continue_bool
+    return add_abund_row_array, feat_id_list, continue_bool
 
 
-def make_add_abund_dict_from_csv_file(csv_file_path, feat_header_dict, file_header_list, unit_id_field_name, conv_factor):
-    add_abund_dict = dict()
+def make_add_abund_row_array_from_csv_file(csv_file_path, feat_header_dict, unit_id_field_name, conv_factor):
+    # Reads the table in blocks of rows and keeps only the positive (feature, PU, amount) values, adding together repeated PU rows and fields with the same feature ID
+    row_array_list = list()
     with open(csv_file_path, 'rt') as f:
-        data_dict = DictReader(f)
-        for aDict in data_dict:
-            pu_id = int(aDict[unit_id_field_name])
-            for aHeader in file_header_list:
-                orig_abund_value = float(aDict[aHeader])
-                abund_value = orig_abund_value / conv_factor
-                feat_id = feat_header_dict[aHeader]
-                if abund_value > 0:
-                    try:
-                        pu_add_abund_dict = add_abund_dict[pu_id]
-                    except KeyError:
-                        pu_add_abund_dict = dict()
-                    try:
-                        add_amount = pu_add_abund_dict[feat_id]
-                    except KeyError:
-                        add_amount = 0
-                    add_amount += abund_value
-                    pu_add_abund_dict[feat_id] = add_amount
-                    add_abund_dict[pu_id] = pu_add_abund_dict
+        csv_header_list = next(reader(f))
+        unit_id_col = csv_header_list.index(unit_id_field_name)
+        feat_col_list = [aCol for aCol in range(len(csv_header_list)) if aCol != unit_id_col]
+        feat_id_values = numpy.array([feat_header_dict[csv_header_list[aCol]] for aCol in feat_col_list], dtype=numpy.int64)
+        line_list = f.readlines(abund_store_chunk_byte_count)
+        while len(line_list) > 0:
+            line_list = [a_line for a_line in line_list if a_line.strip() != '']
+            if len(line_list) > 0:
+                value_array = return_csv_value_array_from_line_list(line_list, len(csv_header_list))
+                row_array_list.append(make_add_abund_row_array_from_csv_value_array(value_array, unit_id_col, feat_col_list, feat_id_values, conv_factor))
+            line_list = f.readlines(abund_store_chunk_byte_count)
 
-    return add_abund_dict
+    if len(row_array_list) == 0:
+        return numpy.zeros(0, dtype=abund_store_row_dtype)
 
+    return make_summed_row_array(numpy.concatenate(row_array_list))
 
-def add_abund_dict_to_abund_pu_key_dict(setup_object, add_abund_dict):
-    abund_pu_key_dict = setup_object.abund_pu_key_dict
-    for pu_id in add_abund_dict:
-        pu_add_abund_dict = add_abund_dict[pu_id]
-        try:
-            pu_abund_dict = setup_object.abund_pu_key_dict[pu_id]
-        except KeyError:
-            pu_abund_dict = dict()
-        for a_feat in pu_add_abund_dict:
-            a_amount = pu_add_abund_dict[a_feat]
-            pu_abund_dict[a_feat] = a_amount
 
-        abund_pu_key_dict[pu_id] = pu_abund_dict
+def return_csv_value_array_from_line_list(line_list, col_count):
+    try:
+        value_array = numpy.loadtxt(line_list, delimiter=',', dtype=numpy.float64, ndmin=2)
+    except ValueError:
+        # Quoted values and other formatting that loadtxt cannot parse are read with the csv module instead
+        value_array = numpy.array([[float(aValue) for aValue in aRow] for aRow in reader(line_list)], dtype=numpy.float64).reshape(-1, col_count)
+    if value_array.shape[1] != col_count:
+        raise ValueError('Row length does not match the header')
 
-    return abund_pu_key_dict
+    return value_array
 
 
-def add_features_from_add_abund_dict_to_puvspr2_file(setup_object, add_abund_dict):
-    for pu_id in add_abund_dict:
-        pu_add_abund_dict = add_abund_dict[pu_id]
-        try:
-            pu_abund_dict = setup_object.abund_pu_key_dict[pu_id]
-        except KeyError:
-            pu_abund_dict = dict()
-        for feat_id in pu_add_abund_dict:
-            pu_abund_dict[feat_id] = pu_add_abund_dict[feat_id]
-        setup_object.abund_pu_key_dict[pu_id] = pu_abund_dict
+def make_add_abund_row_array_from_csv_value_array(value_array, unit_id_col, feat_col_list, feat_id_values, conv_factor):
+    pu_value_array = value_array[:, unit_id_col]
+    non_integer_pos_values = numpy.flatnonzero(~numpy.isfinite(pu_value_array) | (pu_value_array != numpy.floor(pu_value_array)))
+    if len(non_integer_pos_values) > 0:  # Rejected with the same error as when each ID value was converted with int()
+        raise ValueError("invalid literal for int() with base 10: '" + str(pu_value_array[non_integer_pos_values[0]]) + "'")
+    pu_id_values = pu_value_array.astype(numpy.int64)
+    amount_values = value_array[:, feat_col_list] / conv_factor
+    row_pos_values, col_pos_values = numpy.nonzero(amount_values > 0)
+    add_row_array = numpy.zeros(len(row_pos_values), dtype=abund_store_row_dtype)
+    add_row_array['feat_id'] = feat_id_values[col_pos_values]
+    add_row_array['pu_id'] = pu_id_values[row_pos_values]
+    add_row_array['amount'] = amount_values[row_pos_values, col_pos_values]
+
+    return add_row_array
 
-    make_puvspr2_dat_file(setup_object)
+
+def add_features_from_add_abund_dict_to_puvspr2_file(setup_object, add_abund_dict):
+    add_abund_dict_to_puvspr2_dat_file(setup_object, add_abund_dict)
 
 
 def create_target_puvspr2_files(create_dialog):
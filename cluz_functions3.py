@@ -23,6 +23,7 @@ from qgis.core import QgsVectorLayer, NULL
 from csv import reader, writer
 from os import remove, rename, sep
 
+from .cluz_abundstore import rem_feat_id_set_from_abund_store
 from .cluz_messages import clear_progress_bar, info_message, make_progress_bar, warning_message, set_progress_bar_value
 from .cluz_make_file_dicts import make_target_dict, return_temp_path_name
 from .cluz_setup import check_status_object_values, create_and_check_cluz_files
@@ -36,6 +37,13 @@ from .zcluz_make_file_dicts import make_zones_target_dict
 
 def rem_features_from_puvspr2(setup_object, selected_feat_id_set):
     puvspr2_path = setup_object.input_path + sep + 'puvspr2.dat'
+    rem_features_from_puvspr2_text_file(puvspr2_path, selected_feat_id_set)  # Keeps the remaining rows in their original order
+
+    if setup_object.abund_pu_key_dict != 'blank':  # The loaded abundance data is updated to match, so puvspr2.dat doesn't have to be read again
+        setup_object.abund_file_date = rem_feat_id_set_from_abund_store(puvspr2_path, setup_object.input_path + sep + 'puvspr2_store.bin', setup_object.abund_pu_key_dict, selected_feat_id_set)
+
+
+def rem_features_from_puvspr2_text_file(puvspr2_path, selected_feat_id_set):
     temp_puvspr2_path = return_temp_path_name(puvspr2_path, 'dat')
     with open(temp_puvspr2_path, 'w', newline='', encoding='utf-8') as out_file:
         puvspr2_writer = writer(out_file)
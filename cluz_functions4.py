@@ -21,11 +21,13 @@
 from qgis.PyQt.QtCore import QVariant
 from qgis.core import QgsFields, QgsVectorLayer, QgsVectorLayer, QgsVectorFileWriter, QgsWkbTypes, QgsFeature, QgsField, QgsSpatialIndex
 
+from array import array
 from os import path, sep
 from statistics import median
 
+from .cluz_costs import calc_portfolio_costs, make_cost_data_dict
 from .cluz_functions5 import create_bound_dat_file
-from .cluz_mpsetup import make_bound_matrix_dict
+from .cluz_mpsetup import make_mp_bound_matrix
 from .cluz_make_file_dicts import make_abundance_pu_key_dict
 from .cluz_mpfunctions import make_mp_patch_dict
 from .cluz_messages import clear_progress_bar, make_progress_bar, info_message, set_progress_bar_value_complicated, set_progress_bar_value
@@ -360,8 +362,8 @@ def make_status_data_dict(running_status_dict):
 
 
 def add_spatial_details_to_portfolio_dict(setup_object, portfolio_pu_details_dict):
-    pu_dict, patch_dict, dummy_zone_dict = make_patch_dict_based_on_dummy_zone_file(setup_object)
-    spatial_data_dict = make_spatial_data_dict(setup_object, pu_dict, patch_dict, dummy_zone_dict)
+    portfolio_data_dict, patch_dict = make_patch_dict_based_on_dummy_zone_file(setup_object)
+    spatial_data_dict = make_spatial_data_dict(portfolio_data_dict, patch_dict)
     portfolio_pu_details_dict['spatial_details_bool'] = True
     portfolio_pu_details_dict['spatial_data_dict'] = spatial_data_dict
 
@@ -370,27 +372,41 @@ def add_spatial_details_to_portfolio_dict(setup_object, portfolio_pu_details_dic
 
 def make_patch_dict_based_on_dummy_zone_file(setup_object):
     pu_dict, area_dict = make_pu_dict_from_cluz_portfolio(setup_object)
-    minpatch_data_dict = {'area_dict': area_dict}
-    bound_matrix_dict = check_make_bound_dat_file(setup_object, pu_dict)
-    minpatch_data_dict['boundary_matrix_dict'] = bound_matrix_dict
-    dummy_zone_dict = make_dummy_zone_dict(pu_dict)
-    minpatch_data_dict['zone_dict'] = dummy_zone_dict
-    patch_dict = make_mp_patch_dict(pu_dict, minpatch_data_dict)
+    portfolio_data_dict = make_portfolio_data_dict(pu_dict, area_dict)
+    portfolio_data_dict['bound_matrix'] = check_make_bound_dat_file(setup_object, portfolio_data_dict)
+    patch_dict = make_mp_patch_dict(portfolio_data_dict['pu_status_array'], portfolio_data_dict)
 
-    return pu_dict, patch_dict, dummy_zone_dict
+    return portfolio_data_dict, patch_dict
 
 
-def make_dummy_zone_dict(pu_dict):
-    dummy_zone_dict = dict()
+def make_portfolio_data_dict(pu_dict, area_dict):
+    # Uses the same planning unit indexed arrays as MinPatch, with a dummy zone that has no minimum patch size
+    portfolio_data_dict = dict()
+    pu_id_array = array('q')
+    pu_cost_array = array('d')
+    pu_status_array = array('b')
+    pu_area_array = array('d')
+    pu_index_dict = dict()
     for pu_id in pu_dict:
-        dummy_zone_dict[pu_id] = [1, 0, 0]
+        pu_index_dict[pu_id] = len(pu_id_array)
+        pu_id_array.append(pu_id)
+        pu_cost_array.append(pu_dict[pu_id][0])
+        pu_status_array.append(pu_dict[pu_id][1])
+        pu_area_array.append(area_dict[pu_id])
 
-    return dummy_zone_dict
+    portfolio_data_dict['pu_id_array'] = pu_id_array
+    portfolio_data_dict['pu_index_dict'] = pu_index_dict
+    portfolio_data_dict['pu_cost_array'] = pu_cost_array
+    portfolio_data_dict['pu_status_array'] = pu_status_array
+    portfolio_data_dict['pu_area_array'] = pu_area_array
+    portfolio_data_dict['pu_patch_area_array'] = array('d', [0]) * len(pu_id_array)
 
+    return portfolio_data_dict
 
-def make_spatial_data_dict(setup_object, pu_dict, patch_dict, dummy_zone_dict):
+
+def make_spatial_data_dict(portfolio_data_dict, patch_dict):
     spatial_data_dict = dict()
-    all_area_list, valid_area_list = make_patch_area_lists(patch_dict, dummy_zone_dict)  # valid_area_list is irrelevant
+    all_area_list, valid_area_list = make_patch_area_lists(patch_dict, portfolio_data_dict['pu_patch_area_array'])  # valid_area_list is irrelevant
     all_area_list.sort()
     if len(all_area_list) > 0:
         spatial_data_dict['patchCount'] = len(all_area_list)
@@ -403,23 +419,20 @@ def make_spatial_data_dict(setup_object, pu_dict, patch_dict, dummy_zone_dict):
         spatial_data_dict['patchSmallest'] = 0
         spatial_data_dict['patchLargest'] = 0
 
-    bound_matrix_dict = check_make_bound_dat_file(setup_object, pu_dict)
-    spatial_data_dict['totalBoundLength'] = calc_total_bound_length(bound_matrix_dict, pu_dict)
+    spatial_data_dict['totalBoundLength'] = calc_total_bound_length(portfolio_data_dict)
 
     return spatial_data_dict
 
 
-def check_make_bound_dat_file(setup_object, pu_dict):
+def check_make_bound_dat_file(setup_object, portfolio_data_dict):
     bound_dat_file_path = setup_object.input_path + sep + 'bound.dat'
-    if path.exists(bound_dat_file_path):
-        bound_matrix_dict = make_bound_matrix_dict(bound_dat_file_path, pu_dict)
-    else:
+    if not path.exists(bound_dat_file_path):
         info_message('Creating Bound.dat file', 'CLUZ uses the Marxan bound.dat file to calculate the patch statistics. This did not exist and so has been created.')
         ext_edge_bool = False
         create_bound_dat_file(setup_object, ext_edge_bool)
-        bound_matrix_dict = make_bound_matrix_dict(bound_dat_file_path, pu_dict)
+    bound_matrix = make_mp_bound_matrix(bound_dat_file_path, portfolio_data_dict)
 
-    return bound_matrix_dict
+    return bound_matrix
 
 
 def make_spatial_index_spatial_dicts(pu_layer):
@@ -435,32 +448,16 @@ def make_spatial_index_spatial_dicts(pu_layer):
     return spatial_index, pu_polygon_dict, pu_id_geom_dict
 
 
-def calc_total_bound_length(boundary_matrix_dict, pu_dict):
-    total_bound_length = 0
-
-    for id1Value in boundary_matrix_dict:
-        pu_bound_dict = boundary_matrix_dict[id1Value]
-        for id2Value in pu_bound_dict:
-            if id2Value >= id1Value:
-                bound_value = pu_bound_dict[id2Value]
-                con_count = 0
-                id1_status_value = pu_dict[id1Value][1]
-                id2_status_value = pu_dict[id2Value][1]
-
-                if id1_status_value == 1 or id1_status_value == 2:
-                    con_count += 1
-                if id2_status_value == 1 or id2_status_value == 2:
-                    con_count += 1
-                if con_count == 1:
-                    total_bound_length += bound_value
-                # Allow for external edges
-                if con_count == 2 and id1Value == id2Value:
-                    total_bound_length += bound_value
+def calc_total_bound_length(portfolio_data_dict):
+    cost_data_dict = make_cost_data_dict(portfolio_data_dict['pu_id_array'], portfolio_data_dict['pu_cost_array'], portfolio_data_dict['bound_matrix'], None, [], [], [])
+    portfolio_costs_dict = calc_portfolio_costs(cost_data_dict, [portfolio_data_dict['pu_status_array']])
+    total_bound_length = float(portfolio_costs_dict['total_boundary_length'][0])
 
     return total_bound_length
 
 
-def make_patch_feat_data_dict(setup_object, patch_dict):
+def make_patch_feat_data_dict(setup_object, portfolio_data_dict, patch_dict):
+    pu_id_array = portfolio_data_dict['pu_id_array']
     if setup_object.setup_status == 'files_checked':
         if setup_object.abund_pu_key_dict == 'blank':
             setup_object.abund_pu_key_dict = make_abundance_pu_key_dict(setup_object)
@@ -468,7 +465,7 @@ def make_patch_feat_data_dict(setup_object, patch_dict):
     patch_feat_data_dict = dict()
     for patch_id in patch_dict:
         patch_feat_presence_set = set()
-        patch_pu_id_list = patch_dict[patch_id][2]
+        patch_pu_id_list = [pu_id_array[pu_index] for pu_index in patch_dict[patch_id][2]]
         for pu_id in patch_pu_id_list:
             try:
                 pu_id_feat_set = set(setup_object.abund_pu_key_dict[pu_id].keys())
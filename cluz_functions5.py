@@ -23,14 +23,16 @@ from qgis.PyQt.QtCore import QVariant
 
 from copy import deepcopy
 from csv import reader, writer
-from math import exp, log, sqrt
-from os import path, sep
+from math import exp, log
+from os import mkdir, path, sep
+from shutil import rmtree
 from statistics import median
-from time import sleep
 
 from .cluz_messages import clear_progress_bar, empty_polygon_pu_id_set_error_message, make_progress_bar
 from .cluz_messages import set_progress_bar_value, warning_message, critical_message,success_message
 from .cluz_make_file_dicts import write_bound_dat_file
+from .cluz_bounddat import make_bound_results_dict_using_segment_cache
+from .cluz_processes import return_max_process_count, run_solver_process
 
 # Produce Marxan input files ##########################################################################################
 
@@ -127,10 +129,13 @@ def create_bound_dat_file(setup_object, ext_edge_bool):
 
     pu_layer = QgsVectorLayer(setup_object.pu_path, 'Planning units', 'ogr')
     pu_id_field_index = pu_layer.fields().indexFromName('Unit_ID')
-    pu_id_geom_dict = make_pu_id_geom_dict(pu_layer, pu_id_field_index)
-    vertex_list, empty_polygon_pu_id_set = make_vertex_list(pu_id_geom_dict, vertex_precision)
-    vertex_list.sort()
-    bound_results_dict = make_bound_result_dict(vertex_list)
+    pu_id_wkb_dict = make_pu_id_wkb_dict(pu_layer, pu_id_field_index)
+
+    # Segments are stored in the cache, so only planning units whose polygons have changed since the last run are processed
+    bound_cache_file_path = setup_object.input_path + sep + 'bound_cache.npz'
+    progress_bar = make_progress_bar('Extracting the vertex data from the planning unit shapefile')
+    bound_results_dict, empty_polygon_pu_id_set = make_bound_results_dict_using_segment_cache(pu_id_wkb_dict, vertex_precision, bound_cache_file_path, return_max_process_count(), lambda row_count, row_total_count: set_progress_bar_value(progress_bar, row_count, row_total_count))
+    clear_progress_bar()
     if len(empty_polygon_pu_id_set) > 0:
         empty_polygon_pu_id_set_error_message(empty_polygon_pu_id_set)
 
@@ -153,8 +158,9 @@ def determine_vertex_precision(setup_object):
     return vertex_precision
 
 
-def make_pu_id_geom_dict(pu_layer, pu_id_field_index):
-    pu_id_geom_dict = dict()
+def make_pu_id_wkb_dict(pu_layer, pu_id_field_index):
+    # Polygons are held as WKB, which is much smaller than lists of points and can be read by the worker processes without QGIS
+    pu_id_wkb_dict = dict()
 
     progress_bar = make_progress_bar('Processing planning unit shapefile spatial data')
     poly_count = 1
@@ -163,133 +169,10 @@ def make_pu_id_geom_dict(pu_layer, pu_id_field_index):
     for aPolygon in pu_layer.getFeatures():
         set_progress_bar_value(progress_bar, poly_count, poly_total_count)
         poly_count += 1
-        pu_id_geom_dict[aPolygon.attributes()[pu_id_field_index]] = aPolygon.geometry()
-    clear_progress_bar()
-
-    return pu_id_geom_dict
-
-
-def make_vertex_list(pu_id_geom_dict, vertex_precision):
-    vertex_list = list()
-
-    progress_bar = make_progress_bar('Extracting the vertex data from the planning unit shapefile')
-    pu_running_count = 1
-    num_pus = len(pu_id_geom_dict)
-
-    empty_polygon_pu_id_set = set()
-    for pu_id in pu_id_geom_dict:
-        set_progress_bar_value(progress_bar, pu_running_count, num_pus)
-
-        pu_geom = pu_id_geom_dict[pu_id]
-        pu_vertex_set = make_new_pu_vertex_set(pu_geom, vertex_precision)
-        if len(pu_vertex_set) == 0:
-            empty_polygon_pu_id_set.add(pu_id)
-        else:
-            for aVertex in pu_vertex_set:
-                vertex_list.append((aVertex, pu_id))
-
-        pu_running_count += 1
-
-    clear_progress_bar()
-
-    return vertex_list, empty_polygon_pu_id_set
-
-
-def make_bound_result_dict(vertex_list):
-    bound_results_dict = dict()
-    row_num = 0
-    list_length = len(vertex_list) - 1
-
-    progress_bar = make_progress_bar('Extracting the vertex data from the planning unit shapefile')
-    tot_row_num = len(vertex_list)
-
-    while row_num < list_length:
-        set_progress_bar_value(progress_bar, row_num, tot_row_num)
-
-        (vertex_a, pu_id_a) = vertex_list[row_num]
-        (vertex_b, pu_id_b) = vertex_list[row_num + 1]
-
-        if vertex_a == vertex_b:
-            pu_dict_key = (pu_id_a, pu_id_b)
-            bound_results_dict[pu_dict_key] = return_running_length_value(bound_results_dict, vertex_a, pu_dict_key)
-            row_num += 2
-        else:
-            pu_dict_key = (pu_id_a, pu_id_a)
-            bound_results_dict[pu_dict_key] = return_running_length_value(bound_results_dict, vertex_a, pu_dict_key)
-            row_num += 1
+        pu_id_wkb_dict[aPolygon.attributes()[pu_id_field_index]] = bytes(aPolygon.geometry().asWkb())
     clear_progress_bar()
 
-    return bound_results_dict
-
-
-def return_running_length_value(bound_results_dict, a_vertex, pu_dict_key):
-    vertex_length = calc_vertex_length(a_vertex)
-    try:
-        running_length_value = bound_results_dict[pu_dict_key]
-        running_length_value += vertex_length
-    except KeyError:
-        running_length_value = vertex_length
-
-    return running_length_value
-
-
-def make_new_pu_vertex_set(pu_geom, vertex_precision):
-    a_poly_point_list = list()
-
-    if pu_geom.isMultipart():
-        polygon_list = pu_geom.asMultiPolygon()
-    else:
-        polygon_list = [pu_geom.asPolygon()]
-
-    for a_polygon in polygon_list:
-        for a_ring in a_polygon:
-            poly_xy_list = list()
-            for aQgsPointXY in a_ring:
-                x_value = round(aQgsPointXY.x(), vertex_precision)
-                y_value = round(aQgsPointXY.y(), vertex_precision)
-                poly_xy_list.append((x_value, y_value))
-
-            a_poly_point_list.append(poly_xy_list)
-
-    pu_vertex_set = convert_polygon_point_list2_vertex_set(a_poly_point_list)
-
-    return pu_vertex_set
-
-
-def calc_vertex_length(a_vertex):
-    (x1, y1, x2, y2) = a_vertex
-    x_length = x2 - x1
-    y_length = y2 - y1
-    vertex_length = sqrt(x_length**2 + y_length**2)
-
-    return vertex_length
-
-
-def convert_polygon_point_list2_vertex_set(poly_point_list):  # This deals with multi polygon planning units
-    vertex_set = set()
-    for aPolygonPointList in poly_point_list:
-        list_length = len(aPolygonPointList)
-        for aNumber in range(0, list_length - 1):
-            x1 = aPolygonPointList[aNumber][0]
-            y1 = aPolygonPointList[aNumber][1]
-            x2 = aPolygonPointList[aNumber + 1][0]
-            y2 = aPolygonPointList[aNumber + 1][1]
-            if x1 > x2:
-                final_x1 = x2
-                final_x2 = x1
-            else:
-                final_x1 = x1
-                final_x2 = x2
-            if y1 > y2:
-                final_y1 = y2
-                final_y2 = y1
-            else:
-                final_y1 = y1
-                final_y2 = y2
-            vec_tuple = (final_x1, final_y1, final_x2, final_y2)
-            vertex_set.add(vec_tuple)
-
-    return vertex_set
+    return pu_id_wkb_dict
 
 
 def report_output_success_message(message_string_list):
@@ -438,7 +321,7 @@ def write_marxan_input_file(setup_object, marxan_parameter_dict, extra_output_va
         marxan_writer.writerow(['VERSION 0.1'])
         marxan_writer.writerow(['BLM ' + str(marxan_parameter_dict['blm_value'])])
         marxan_writer.writerow(['PROP  ' + str(marxan_parameter_dict['initial_prop'])])
-        marxan_writer.writerow(['RANDSEED -1'])
+        marxan_writer.writerow(['RANDSEED ' + str(marxan_parameter_dict['rand_seed'])])
         marxan_writer.writerow(['BESTSCORE  10'])
         marxan_writer.writerow(['NUMREPS ' + str(marxan_parameter_dict['num_run'])])
         marxan_writer.writerow([])
@@ -473,7 +356,7 @@ def write_marxan_input_file(setup_object, marxan_parameter_dict, extra_output_va
         marxan_writer.writerow(['SAVETARGMET 2'])
         marxan_writer.writerow(['SAVESUMSOLN 2'])
         marxan_writer.writerow(['SAVELOG ' + extra_output_value])
-        marxan_writer.writerow(['OUTPUTDIR ' + setup_object.output_path])
+        marxan_writer.writerow(['OUTPUTDIR ' + marxan_parameter_dict['marxan_output_path']])
         marxan_writer.writerow([])
 
         marxan_writer.writerow(['Program control.'])
@@ -499,33 +382,18 @@ def marxan_update_setup_object(marxan_dialog, setup_object, marxan_parameter_dic
     return setup_object
 
 
-def make_marxan_bat_file(setup_object):
-    marxan_full_name = setup_object.marxan_path
-    marxan_bat_file_name = marxan_full_name.replace('.exe', '.bat')
-    if setup_object.analysis_type != 'MarxanWithZones':
-        with open(marxan_bat_file_name, 'w', newline='', encoding='utf-8') as batFile:
-            bat_writer = writer(batFile)
-            bat_writer.writerow(['cd ' + path.dirname(marxan_full_name)])
-            bat_writer.writerow([marxan_full_name])
-    else:
-        with open(marxan_bat_file_name, 'w', newline='', encoding='utf-8') as batFile:
-            bat_writer = writer(batFile)
-            bat_writer.writerow(['cd ' + path.dirname(marxan_full_name)])
-            bat_writer.writerow(['\"' + marxan_full_name + '\"'])
+def make_marxan_working_folder(marxan_parameter_dict):
+    if path.isdir(marxan_parameter_dict['marxan_working_path']):
+        rmtree(marxan_parameter_dict['marxan_working_path'])
+    mkdir(marxan_parameter_dict['marxan_working_path'])
 
-    return marxan_bat_file_name
 
+def run_marxan_process(marxan_parameter_dict, progress_function):
+    # Marxan reads the input file named on its command line and this waits until that copy of Marxan has exited
+    command_list = [marxan_parameter_dict['marxan_path'], marxan_parameter_dict['marxan_setup_path']]
+    marxan_status_text = run_solver_process(command_list, marxan_parameter_dict['marxan_working_path'], marxan_parameter_dict['num_run'], marxan_parameter_dict['timeout_seconds'], progress_function)
 
-def waiting_for_marxan(setup_object, output_name):
-    if setup_object.analysis_type != 'MarxanWithZones':
-        marxan_best_output_file_name = setup_object.output_path + sep + output_name + '_best.txt'
-    else:
-        marxan_best_output_file_name = setup_object.output_path + sep + output_name + '_best.csv'
-    try:
-        while path.isfile(marxan_best_output_file_name) is False:
-            sleep(2)
-    except KeyboardInterrupt:
-        pass
+    return marxan_status_text
 
 
 def add_best_marxan_output_to_pu_shapefile(setup_object, best_output_file_path, best_field_name):
@@ -24,9 +24,7 @@ from qgis.PyQt.QtCore import QVariant
 from copy import deepcopy
 from csv import reader, writer
 from math import exp, log, sqrt
-from os import path, sep
 from statistics import median
-from time import sleep
 
 from .cluz_messages import clear_progress_bar, empty_polygon_pu_id_set_error_message, make_progress_bar
 from .cluz_messages import set_progress_bar_value, warning_message, critical_message,success_message
@@ -70,13 +68,3 @@ def prioritizr_update_setup_object(prioritizr_dialog, setup_object, prioritizr_d
     setup_object.extra_outputs_flag = prioritizr_dialog.extraCheckBox.isChecked()
 
     return setup_object
-
-
-def waiting_for_prioritizr(setup_object, output_name):
-    prioritizr_best_output_file_name = setup_object.output_path + sep + output_name + '_best.txt'
-    try:
-        while path.isfile(prioritizr_best_output_file_name) is False:
-            sleep(2)
-    except KeyboardInterrupt:
-        pass
-
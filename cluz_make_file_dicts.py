@@ -24,6 +24,10 @@ from os import path, remove, rename, sep
 from csv import reader, writer
 from re import findall
 
+import numpy
+
+from .cluz_abundstore import add_row_array_to_abund_store, make_abund_store, make_row_array_from_abund_pu_key_dict
+from .cluz_costs import sum_values_by_key_in_order
 from .cluz_messages import clear_progress_bar, make_progress_bar, set_progress_bar_value, warning_message, critical_message
 
 
@@ -206,71 +210,36 @@ def format_raw_value_list_identify_numerical_cols(setup_object, raw_value_list):
 
 
 def make_abundance_pu_key_dict(setup_object):
-    abund_pu_key_dict = {}
-    abund_pu_key_dict_correct = True
+    # Reads puvspr2.dat through a memory-mapped sidecar file, which is only rebuilt when puvspr2.dat has changed
     puvspr2_file_path = setup_object.input_path + sep + 'puvspr2.dat'
+    abund_store_path = setup_object.input_path + sep + 'puvspr2_store.bin'
+    setup_object.abund_pu_key_dict = 'blank'  # Releases the previous store so its sidecar file can be replaced
 
     progress_bar = make_progress_bar('Processing target file')
-    row_count = 1
-
-    with open(puvspr2_file_path, encoding="utf-8") as f:
-        row_total_count = sum(1 for _ in f)
-
-    with open(puvspr2_file_path, mode='rt', encoding='utf-8') as f:
-        abund_reader = reader(f)
-        next(abund_reader)
-        for a_row in abund_reader:
-            set_progress_bar_value(progress_bar, row_count, row_total_count)
-            row_count += 1
-            try:
-                feat_id = int(a_row[0])
-                pu_id = int(a_row[1])
-                abund_value = float(a_row[2])
-                try:
-                    pu_abund_dict = abund_pu_key_dict[pu_id]
-                except KeyError:
-                    pu_abund_dict = {}
-                pu_abund_dict[feat_id] = abund_value
-                abund_pu_key_dict[pu_id] = pu_abund_dict
-            except ValueError:
-                abund_pu_key_dict_correct = False
-
+    abund_pu_key_dict, setup_object.abund_file_date = make_abund_store(puvspr2_file_path, abund_store_path, lambda row_count, row_total_count: set_progress_bar_value(progress_bar, row_count, row_total_count))
     clear_progress_bar()
 
-
-    if abund_pu_key_dict_correct is False:
+    if abund_pu_key_dict == 'blank':
         warning_message('Target table error', 'The Target table is incorrectly formatted. Please use the Troubleshoot all CLUZ files function to identify the problem.')
-        abund_pu_key_dict = 'blank'
 
     return abund_pu_key_dict
 
 
-def make_puvspr2_dat_file(setup_object):
-    input_path_name = setup_object.input_path
-    puvspr2_dat_path_name = input_path_name + sep + 'puvspr2.dat'
-
-    abund_pu_key_dict = setup_object.abund_pu_key_dict
-    pu_list = list(abund_pu_key_dict.keys())
-    pu_list.sort()
+def add_abund_dict_to_puvspr2_dat_file(setup_object, add_abund_dict):
+    add_row_array_to_puvspr2_dat_file(setup_object, make_row_array_from_abund_pu_key_dict(add_abund_dict))
 
-    progress_bar = make_progress_bar('Making a new puvspr2.dat file')
-    row_total_count = len(pu_list)
-    row_count = 1
 
-    with open(puvspr2_dat_path_name, 'w', newline='', encoding='utf-8') as puvspr2DatFile:
-        puvspr2_dat_writer = writer(puvspr2DatFile)
-        puvspr2_dat_writer.writerow(['species', 'pu', 'amount'])
-        for pu_id in pu_list:
-            set_progress_bar_value(progress_bar, row_count, row_total_count)
-            row_count += 1
+def add_row_array_to_puvspr2_dat_file(setup_object, add_row_array):
+    # Merges the new (feature, PU, amount) rows into the existing abundance data, then writes puvspr2.dat and its sidecar file once and keeps the updated store
+    puvspr2_dat_path_name = setup_object.input_path + sep + 'puvspr2.dat'
+    abund_store_path = setup_object.input_path + sep + 'puvspr2_store.bin'
+    if setup_object.abund_pu_key_dict == 'blank':
+        setup_object.abund_pu_key_dict = make_abundance_pu_key_dict(setup_object)
 
-            a_pu_abund_dict = abund_pu_key_dict[pu_id]
-            a_feat_list = list(a_pu_abund_dict.keys())
-            a_feat_list.sort()
-            for featID in a_feat_list:
-                feat_amount = a_pu_abund_dict[featID]
-                puvspr2_dat_writer.writerow([featID, pu_id, feat_amount])
-    clear_progress_bar()
+    if setup_object.abund_pu_key_dict != 'blank':
+        progress_bar = make_progress_bar('Making a new puvspr2.dat file')
+        setup_object.abund_file_date = add_row_array_to_abund_store(puvspr2_dat_path_name, abund_store_path, setup_object.abund_pu_key_dict, add_row_array, lambda row_count, row_total_count: set_progress_bar_value(progress_bar, row_count, row_total_count))
+        clear_progress_bar()
 
 
 def update_target_csv_from_target_dict(setup_object, target_dict):
@@ -385,13 +354,22 @@ def return_lowest_unused_file_name_number(dir_path, file_name_base, ext_type_tex
 # Add data to target table from Add data from Vec, raster, csv files #######################################################################################
 
 def add_features_to_target_csv_file(setup_object, add_abund_dict, feat_id_list):
+    pu_layer = QgsVectorLayer(setup_object.pu_path, 'Planning units', 'ogr')
+    add_target_dict = make_add_target_dict(pu_layer, add_abund_dict, feat_id_list)
+    add_target_dict_to_target_csv_file(setup_object, add_target_dict)
+
+
+def add_row_array_features_to_target_csv_file(setup_object, add_row_array, feat_id_list):
+    pu_layer = QgsVectorLayer(setup_object.pu_path, 'Planning units', 'ogr')
+    add_target_dict = make_add_target_dict_from_row_array(pu_layer, add_row_array, feat_id_list)
+    add_target_dict_to_target_csv_file(setup_object, add_target_dict)
+
+
+def add_target_dict_to_target_csv_file(setup_object, add_target_dict):
     temp_target_path = return_temp_path_name(setup_object.target_path, 'csv')
     with open(temp_target_path, 'w', newline='', encoding='utf-8') as tempTargetFile:
         temp_target_writer = writer(tempTargetFile)
 
-        pu_layer = QgsVectorLayer(setup_object.pu_path, 'Planning units', 'ogr')
-        add_target_dict = make_add_target_dict(pu_layer, add_abund_dict, feat_id_list)
-
         with open(setup_object.target_path, 'rt') as f:
             target_reader = reader(f)
             target_file_header_list = next(target_reader)
@@ -458,3 +436,41 @@ def make_add_target_dict(pu_layer, add_abund_dict, feat_id_list):
                 pass
 
     return add_target_dict
+
+
+def make_add_target_dict_from_row_array(pu_layer, add_row_array, feat_id_list):
+    # Same totals as make_add_target_dict, from (feature, PU, amount) rows rather than a dictionary of each PU. The rows
+    # are put in PU layer order, so each amount is added in the same order as in that loop
+    unit_id_field = pu_layer.fields().indexFromName('Unit_ID')
+    unit_status_field = pu_layer.fields().indexFromName('Status')
+    pu_id_list = list()
+    con_bool_list = list()
+    for pu_feature in pu_layer.getFeatures():
+        pu_attributes = pu_feature.attributes()
+        pu_id_list.append(pu_attributes[unit_id_field])
+        con_bool_list.append(pu_attributes[unit_status_field] == 'Conserved' or pu_attributes[unit_status_field] == 'Earmarked')
+
+    add_target_dict = dict()
+    for feat_id in feat_id_list:
+        add_target_dict[feat_id] = (0, 0)  # [Con amount, total amount]
+
+    row_order = numpy.argsort(add_row_array['pu_id'], kind='stable')
+    sorted_pu_id_values = add_row_array['pu_id'][row_order]
+    layer_pu_id_values = numpy.array(pu_id_list, dtype=numpy.int64)
+    pu_start_pos_values = numpy.searchsorted(sorted_pu_id_values, layer_pu_id_values, side='left')
+    pu_row_count_values = numpy.searchsorted(sorted_pu_id_values, layer_pu_id_values, side='right') - pu_start_pos_values
+    layer_row_pos_values = numpy.repeat(pu_start_pos_values - numpy.cumsum(pu_row_count_values) + pu_row_count_values, pu_row_count_values) + numpy.arange(pu_row_count_values.sum())
+    layer_row_array = add_row_array[row_order[layer_row_pos_values]]
+    con_bool_values = numpy.repeat(numpy.array(con_bool_list, dtype=bool), pu_row_count_values)
+
+    row_feat_id_values, row_feat_index_values = numpy.unique(layer_row_array['feat_id'], return_inverse=True)
+    total_values = sum_values_by_key_in_order(row_feat_index_values, layer_row_array['amount'], len(row_feat_id_values))
+    con_values = sum_values_by_key_in_order(row_feat_index_values[con_bool_values], layer_row_array['amount'][con_bool_values], len(row_feat_id_values))
+    con_count_values = numpy.bincount(row_feat_index_values[con_bool_values], minlength=len(row_feat_id_values))
+    for feat_id, feat_con, con_count, feat_total in zip(row_feat_id_values.tolist(), con_values.tolist(), con_count_values.tolist(), total_values.tolist()):
+        if feat_id in add_target_dict:
+            if con_count == 0:
+                feat_con = 0  # Matches make_add_target_dict, where the conserved amount stays as the integer 0
+            add_target_dict[feat_id] = (feat_con, feat_total)
+
+    return add_target_dict
@@ -0,0 +1,196 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from csv import reader
+from os import listdir, path, replace, sep
+from random import sample
+from re import compile as compile_regex
+from shutil import rmtree
+
+from .cluz_functions5 import make_marxan_input_file, make_marxan_working_folder, run_marxan_process
+
+
+marxan_run_file_regex = compile_regex(r'^_(r|mv)(\d+)(\.\w+)$')  # Matches the run number part of names such as output_r00001.txt
+marxan_run_number_width = 5  # Marxan writes the run numbers with five digits
+
+
+def run_split_marxan_analysis(setup_object, marxan_parameter_dict, progress_function):
+    # The runs are shared between several copies of Marxan, each with its own seed, working folder and output folder, and
+    # their outputs are then merged into the files that a single copy of Marxan would have made
+    part_parameter_dict_list = make_split_marxan_parameter_dict_list(marxan_parameter_dict)
+    marxan_status_text = 'finished'
+    try:
+        for partParameterDict in part_parameter_dict_list:
+            make_marxan_working_folder(partParameterDict)
+            make_marxan_input_file(setup_object, partParameterDict)
+        executor = ThreadPoolExecutor(max_workers=len(part_parameter_dict_list))
+        try:
+            future_dict = dict()
+            for partParameterDict in part_parameter_dict_list:
+                future_dict[executor.submit(run_marxan_process, partParameterDict, 'blank')] = partParameterDict
+            finished_run_count = 0
+            for aFuture in as_completed(future_dict):
+                if aFuture.result() != 'finished' and marxan_status_text == 'finished':
+                    marxan_status_text = aFuture.result()
+                finished_run_count += future_dict[aFuture]['num_run']
+                progress_function(finished_run_count, marxan_parameter_dict['num_run'])
+        finally:
+            executor.shutdown(wait=True)
+        if marxan_status_text == 'finished':
+            merge_split_marxan_outputs(marxan_parameter_dict, part_parameter_dict_list)
+    finally:
+        for partParameterDict in part_parameter_dict_list:
+            rmtree(partParameterDict['marxan_working_path'], ignore_errors=True)
+
+    return marxan_status_text
+
+
+def make_split_marxan_parameter_dict_list(marxan_parameter_dict):
+    part_count = marxan_parameter_dict['process_count']
+    rand_seed_list = sample(range(1, 2147483647), part_count)  # Different seeds, as copies started together could get the same seed from the time
+    marxan_folder_name = path.dirname(marxan_parameter_dict['marxan_path'])
+
+    part_parameter_dict_list = list()
+    for part_number in range(0, part_count):
+        part_parameter_dict = dict(marxan_parameter_dict)
+        part_parameter_dict['num_run'] = marxan_parameter_dict['num_run'] // part_count + int(part_number < marxan_parameter_dict['num_run'] % part_count)
+        part_parameter_dict['rand_seed'] = rand_seed_list[part_number]
+        part_parameter_dict['output_name'] = marxan_parameter_dict['output_name'] + '_part' + str(part_number + 1)
+        part_parameter_dict['marxan_working_path'] = str(marxan_folder_name) + sep + 'split_del_later_part' + str(part_number + 1)
+        part_parameter_dict['marxan_setup_path'] = part_parameter_dict['marxan_working_path'] + sep + 'input.dat'
+        part_parameter_dict['marxan_output_path'] = part_parameter_dict['marxan_working_path']
+        part_parameter_dict_list.append(part_parameter_dict)
+
+    return part_parameter_dict_list
+
+
+def merge_split_marxan_outputs(marxan_parameter_dict, part_parameter_dict_list):
+    output_path_base = marxan_parameter_dict['marxan_output_path'] + sep + marxan_parameter_dict['output_name']
+    part_file_suffix_dict_list = [make_part_file_suffix_dict(partParameterDict) for partParameterDict in part_parameter_dict_list]
+    part_score_list_list = [make_part_score_list(partFileSuffixDict) for partFileSuffixDict in part_file_suffix_dict_list]
+    best_part_number = return_best_part_number(part_score_list_list)
+
+    run_number_offset = 0
+    for part_number in range(0, len(part_parameter_dict_list)):
+        part_file_suffix_dict = part_file_suffix_dict_list[part_number]
+        for fileSuffix in part_file_suffix_dict:
+            run_file_match = marxan_run_file_regex.match(fileSuffix)
+            if run_file_match is not None:
+                run_number = int(run_file_match.group(2)) + run_number_offset
+                new_file_suffix = '_' + run_file_match.group(1) + str(run_number).zfill(marxan_run_number_width) + run_file_match.group(3)
+                replace(part_file_suffix_dict[fileSuffix], output_path_base + new_file_suffix)
+        run_number_offset += len(part_score_list_list[part_number])
+
+    for fileSuffix in part_file_suffix_dict_list[0]:
+        if marxan_run_file_regex.match(fileSuffix) is None:
+            part_file_path_list = [partFileSuffixDict[fileSuffix] for partFileSuffixDict in part_file_suffix_dict_list if fileSuffix in partFileSuffixDict]
+            if fileSuffix.startswith('_sum.'):
+                write_merged_summary_file(output_path_base + fileSuffix, part_file_path_list)
+            elif fileSuffix.startswith('_ssoln.'):
+                write_merged_summed_solution_file(output_path_base + fileSuffix, part_file_path_list)
+            elif fileSuffix.startswith('_log.'):
+                write_joined_text_file(output_path_base + fileSuffix, part_file_path_list)
+            elif fileSuffix in part_file_suffix_dict_list[best_part_number]:
+                # The best solution, its missing values file and the scenario details come from the part with the best run
+                replace(part_file_suffix_dict_list[best_part_number][fileSuffix], output_path_base + fileSuffix)
+
+
+def make_part_file_suffix_dict(part_parameter_dict):
+    part_file_suffix_dict = dict()
+    for aFileName in sorted(listdir(part_parameter_dict['marxan_output_path'])):
+        if aFileName.startswith(part_parameter_dict['output_name'] + '_'):
+            file_suffix = aFileName[len(part_parameter_dict['output_name']):]
+            part_file_suffix_dict[file_suffix] = part_parameter_dict['marxan_output_path'] + sep + aFileName
+
+    return part_file_suffix_dict
+
+
+def make_part_score_list(part_file_suffix_dict):
+    part_score_list = list()
+    for fileSuffix in part_file_suffix_dict:
+        if fileSuffix.startswith('_sum.'):
+            with open(part_file_suffix_dict[fileSuffix], 'rt') as f:
+                summary_reader = reader(f)
+                header_list = next(summary_reader)
+                for aRow in summary_reader:
+                    if len(aRow) > 0:
+                        part_score_list.append(float(aRow[header_list.index('Score')]))
+
+    return part_score_list
+
+
+def return_best_part_number(part_score_list_list):
+    # Marxan keeps the first run with the lowest score, so ties go to the earlier part
+    best_part_number = 0
+    best_score = 'blank'
+    for part_number in range(0, len(part_score_list_list)):
+        for aScore in part_score_list_list[part_number]:
+            if best_score == 'blank' or aScore < best_score:
+                best_part_number = part_number
+                best_score = aScore
+
+    return best_part_number
+
+
+def write_merged_summary_file(summary_file_path, part_file_path_list):
+    run_number = 1
+    with open(summary_file_path, 'w', newline='', encoding='utf-8') as out_file:
+        for part_number in range(0, len(part_file_path_list)):
+            with open(part_file_path_list[part_number], 'rt') as f:
+                header_line = f.readline()
+                if part_number == 0:
+                    out_file.write(header_line)
+                for aLine in f:
+                    if aLine.strip() != '':
+                        out_file.write(str(run_number) + aLine[aLine.index(','):])  # The run number is the first column
+                        run_number += 1
+
+
+def write_merged_summed_solution_file(summed_file_path, part_file_path_list):
+    # Adds up the selection frequencies in each column, keeping the planning unit order of the first part
+    pu_id_list = list()
+    summed_value_dict = dict()
+    for aFilePath in part_file_path_list:
+        with open(aFilePath, 'rt') as f:
+            summed_reader = reader(f)
+            next(summed_reader)
+            for aRow in summed_reader:
+                if len(aRow) > 0:
+                    if aRow[0] not in summed_value_dict:
+                        pu_id_list.append(aRow[0])
+                        summed_value_dict[aRow[0]] = [0] * (len(aRow) - 1)
+                    summed_value_list = summed_value_dict[aRow[0]]
+                    for column_number in range(1, len(aRow)):
+                        summed_value_list[column_number - 1] += int(aRow[column_number])
+
+    with open(part_file_path_list[0], 'rt') as f:
+        header_line = f.readline()
+    with open(summed_file_path, 'w', newline='', encoding='utf-8') as out_file:
+        out_file.write(header_line)
+        for puID in pu_id_list:
+            out_file.write(','.join([puID] + [str(aValue) for aValue in summed_value_dict[puID]]) + '\n')
+
+
+def write_joined_text_file(out_file_path, part_file_path_list):
+    with open(out_file_path, 'w', newline='', encoding='utf-8') as out_file:
+        for aFilePath in part_file_path_list:
+            with open(aFilePath, 'rt', newline='') as f:
+                out_file.write(f.read())
@@ -18,12 +18,15 @@
  ***************************************************************************/
 """
 
-from PyQt5.QtWidgets import QMessageBox
-from PyQt5.QtWidgets import QProgressBar
-from PyQt5.QtCore import Qt
+try:
+    from PyQt5.QtWidgets import QMessageBox
+    from PyQt5.QtWidgets import QProgressBar
+    from PyQt5.QtCore import Qt
 
-from qgis.core import Qgis
-from qgis.utils import iface
+    from qgis.core import Qgis
+    from qgis.utils import iface
+except ImportError:
+    iface = 'blank'  # MinPatch can be run from the command line without QGIS, when it reports to stderr instead of using these messages
 
 
 ###################### WHAT ABOUT CRITICAL?
@@ -82,6 +85,13 @@ def empty_polygon_pu_id_set_error_message(empty_polygon_pu_id_set):
     warning_message("Shapefile error", "Planning units with the following ID values have problems with their topology and could not be processed by QGIS: " + final_pu_id_string)
 
 
+def solver_status_error_message(solver_name, solver_status_text):
+    if solver_status_text == 'timed_out':
+        critical_message(solver_name + ' stopped', solver_name + ' did not finish in the time allowed and so was stopped. No results have been loaded.')
+    else:
+        critical_message(solver_name + ' error', solver_name + ' stopped with an error before it finished, so no results have been loaded. Please check the input files and settings.')
+
+
 def check_change_earmarked_to_available_pu():
     warning_title_text = 'Confirm changes to planning unit status'
     warning_main_text = 'This will change the status of the Earmarked planning units to Available. Do you want to continue?'
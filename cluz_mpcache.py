@@ -0,0 +1,90 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from array import array
+from hashlib import sha256
+from mmap import ACCESS_READ, mmap
+from os import path
+from struct import calcsize, error, pack, unpack_from
+from sys import byteorder
+
+from .cluz_mpdata import MinPatchCsrMatrix
+from .cluz_savefile import write_binary_file_by_replacing
+
+
+patch_pu_id_cache_magic = b'CLUZPPID'
+patch_pu_id_cache_version = 1
+patch_pu_id_cache_header_format = '<8sI32sqq'  # Magic text, format version, fingerprint, PU count, patch entry count
+
+
+def make_patch_pu_id_fingerprint(input_path, zone_type_dict):
+    # Changes whenever the planning units, their boundaries, the MinPatch details or the zone radii change
+    fingerprint_hash = sha256()
+    fingerprint_hash.update(str(patch_pu_id_cache_version).encode('utf-8'))
+    fingerprint_hash.update(byteorder.encode('utf-8'))
+    for fileName in ['pu.dat', 'bound.dat', 'minpatch.dat']:
+        fingerprint_hash.update(fileName.encode('utf-8'))
+        with open(path.join(input_path, fileName), 'rb') as f:
+            for aBlock in iter(lambda: f.read(1048576), b''):
+                fingerprint_hash.update(aBlock)
+
+    for zoneID in sorted(zone_type_dict):
+        fingerprint_hash.update(('zone ' + str(zoneID) + ' radius ' + repr(zone_type_dict[zoneID][1])).encode('utf-8'))
+
+    return fingerprint_hash.digest()
+
+
+def patch_pu_id_cache_is_valid(cache_path, fingerprint_value, pu_count):
+    cache_is_valid = False
+    try:
+        with open(cache_path, 'rb') as f:
+            header_bytes = f.read(calcsize(patch_pu_id_cache_header_format))
+        magic_value, version_value, cache_fingerprint_value, cache_pu_count, entry_count = unpack_from(patch_pu_id_cache_header_format, header_bytes)
+        cache_size = calcsize(patch_pu_id_cache_header_format) + (cache_pu_count + 1) * array('q').itemsize + entry_count * array('i').itemsize
+        if magic_value == patch_pu_id_cache_magic and version_value == patch_pu_id_cache_version and cache_fingerprint_value == fingerprint_value and cache_pu_count == pu_count:
+            cache_is_valid = path.getsize(cache_path) == cache_size  # Rejects a cache that was cut short
+    except (IOError, error):
+        cache_is_valid = False
+
+    return cache_is_valid
+
+
+def write_patch_pu_id_cache(cache_path, fingerprint_value, patch_pu_id_matrix):
+    indptr_array = array('q', patch_pu_id_matrix.indptr_array)
+    index_array = array('i', patch_pu_id_matrix.index_array)
+    header_bytes = pack(patch_pu_id_cache_header_format, patch_pu_id_cache_magic, patch_pu_id_cache_version, fingerprint_value, len(indptr_array) - 1, len(index_array))
+
+    write_binary_file_by_replacing(cache_path, header_bytes, [indptr_array, index_array])
+
+
+def load_patch_pu_id_cache(cache_path):
+    with open(cache_path, 'rb') as f:
+        with mmap(f.fileno(), 0, access=ACCESS_READ) as cache_map:
+            header_size = calcsize(patch_pu_id_cache_header_format)
+            pu_count, entry_count = unpack_from(patch_pu_id_cache_header_format, cache_map)[3:5]
+            indptr_end = header_size + (pu_count + 1) * array('q').itemsize
+            indptr_array = array('q')
+            indptr_array.frombytes(cache_map[header_size:indptr_end])
+            index_array = array('i')
+            index_array.frombytes(cache_map[indptr_end:indptr_end + entry_count * array('i').itemsize])
+
+    patch_pu_id_matrix = MinPatchCsrMatrix(indptr_array, index_array, None)
+
+    return patch_pu_id_matrix
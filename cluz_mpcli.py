@@ -0,0 +1,130 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+# Runs MinPatch without QGIS, eg on a compute server, using exported Marxan input and output folders:
+# python -m cluz.cluz_mpcli input_folder output_folder marxan_output_prefix --blm 0.5 --processes 4
+
+from argparse import ArgumentParser
+from os import path, sep
+from sys import exit, stderr
+
+from .cluz_mpoutputs import print_under_rep_features
+from .cluz_mprun import run_mp_analysis, print_mp_final_results
+from .cluz_mpsetup import make_minpatch_data_dict, make_mp_marxan_file_list, MinPatchObject
+
+
+class MinPatchCommandLineSetupObject:
+    def __init__(self, input_path, output_path, decimal_places):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.decimal_places = decimal_places
+        self.target_dict = dict()
+
+
+def make_mp_argument_parser():
+    argument_parser = ArgumentParser(prog='python -m cluz.cluz_mpcli', description='Run MinPatch on the portfolios produced by Marxan, without QGIS.')
+    argument_parser.add_argument('input_path', help='Marxan input folder, containing pu.dat, spec.dat, puvspr2.dat, bound.dat and minpatch.dat')
+    argument_parser.add_argument('output_path', help='Marxan output folder, containing the portfolio files for each run')
+    argument_parser.add_argument('marxan_file_name', help='Marxan output file name, so the run files are called [name]_r00001.txt etc')
+    argument_parser.add_argument('--blm', type=float, default=0, help='boundary length modifier value (default 0)')
+    argument_parser.add_argument('--no-remove', dest='remove_bool', action='store_false', help='skip the remove small patches stage')
+    argument_parser.add_argument('--no-add', dest='add_bool', action='store_false', help='skip the add patches stage')
+    argument_parser.add_argument('--no-whittle', dest='whittle_bool', action='store_false', help='skip the simulated whittling stage')
+    argument_parser.add_argument('--no-patch-cache', dest='patch_cache_bool', action='store_false', help='make the patch lists again from patchPUID.dat, rather than reusing those stored in patchPUID.bin')
+    argument_parser.add_argument('--no-patch-text', dest='patch_text_bool', action='store_false', help='only store the patch lists in patchPUID.bin, rather than also saving them as patchPUID.dat')
+    argument_parser.add_argument('--processes', type=int, default=1, help='number of processes to use (default 1)')
+    argument_parser.add_argument('--decimal-places', type=int, default=3, help='decimal places used when summing feature amounts (default 3)')
+    argument_parser.add_argument('--profile', dest='profile_bool', action='store_true', help='also save the time taken by each stage of each run in the _profile.csv and _profilesummary.csv files')
+    argument_parser.add_argument('--no-resume', dest='resume_bool', action='store_false', help='analyse every Marxan file again, rather than reloading the runs finished by an interrupted analysis')
+    argument_parser.add_argument('--yes', dest='accept_warnings_bool', action='store_true', help='continue after warnings, eg when existing MinPatch output files will be overwritten')
+
+    return argument_parser
+
+
+def make_mp_command_line_objects(argument_values):
+    setup_object = MinPatchCommandLineSetupObject(path.normpath(argument_values.input_path), path.normpath(argument_values.output_path), argument_values.decimal_places)
+
+    minpatch_object = MinPatchObject()
+    minpatch_object.marxanFileName = argument_values.marxan_file_name
+    minpatch_object.detailsDatPath = setup_object.input_path + sep + 'minpatch.dat'
+    minpatch_object.blm = argument_values.blm
+    minpatch_object.removeBool = argument_values.remove_bool
+    minpatch_object.addBool = argument_values.add_bool
+    minpatch_object.whittleBool = argument_values.whittle_bool
+    minpatch_object.usePatchPuIdCacheBool = argument_values.patch_cache_bool
+    minpatch_object.exportPatchPuIdTextBool = argument_values.patch_text_bool
+    minpatch_object.processCount = max(argument_values.processes, 1)
+    minpatch_object.progressType = 'stderr'
+    minpatch_object.acceptWarningsBool = argument_values.accept_warnings_bool
+    minpatch_object.resumeBool = argument_values.resume_bool
+    minpatch_object.profileBool = argument_values.profile_bool
+
+    return setup_object, minpatch_object
+
+
+def make_cluz_target_dict_from_mp_target_dict(mp_target_dict):
+    # print_under_rep_features reads the target from the fourth item in each row of the CLUZ target table
+    cluz_target_dict = dict()
+    for feat_id in mp_target_dict:
+        feat_name, feat_target, feat_spf, feat_type = mp_target_dict[feat_id]
+        cluz_target_dict[feat_id] = [feat_name, feat_type, feat_spf, feat_target]
+
+    return cluz_target_dict
+
+
+def run_min_patch_from_command_line(setup_object, minpatch_object, minpatch_data_dict):
+    mp_analysis_dict = run_mp_analysis(setup_object, minpatch_object, minpatch_data_dict)
+
+    if mp_analysis_dict['continue_bool']:
+        best_file_name, summed_file_name = print_mp_final_results(setup_object, minpatch_object, minpatch_data_dict, mp_analysis_dict)
+        print('MinPatch has completed the analysis. The best portfolio is in ' + best_file_name + ' and the selection frequencies are in ' + summed_file_name + '.', file=stderr)
+        exit_code = 0
+
+    else:
+        error_file_name = mp_analysis_dict['error_file_name']
+        unmet_target_id_set = mp_analysis_dict['unmet_target_id_set']
+        setup_object.target_dict = make_cluz_target_dict_from_mp_target_dict(minpatch_data_dict['target_dict'])
+        print_under_rep_features(setup_object, mp_analysis_dict['feat_amount_cons_dict'], unmet_target_id_set, error_file_name)
+        print('Target error: targets for ' + str(len(unmet_target_id_set)) + ' features cannot be met. This occurs when there is not enough of the relevant features found in patches with the specified minimum area. Details have been saved in the file ' + error_file_name + '. MinPatch has been terminated.', file=stderr)
+        exit_code = 1
+
+    return exit_code
+
+
+def main(argument_list=None):
+    # Exit codes are 0 when MinPatch finishes, 1 when targets can't be met and 2 when the input files or options are not valid
+    argument_values = make_mp_argument_parser().parse_args(argument_list)
+    setup_object, minpatch_object = make_mp_command_line_objects(argument_values)
+    if not path.isdir(setup_object.input_path) or not path.isdir(setup_object.output_path):
+        print('Folder error: the specified Marxan input or output folder does not exist.', file=stderr)
+        return 2
+    if len(make_mp_marxan_file_list(setup_object, minpatch_object.marxanFileName + '_r')) == 0:
+        print('No files found: the Marxan output folder does not contain any portfolio files called ' + minpatch_object.marxanFileName + '_r*.', file=stderr)
+        return 2
+
+    minpatch_data_dict, setup_ok_bool = make_minpatch_data_dict(setup_object, minpatch_object)
+    if setup_ok_bool is False:
+        return 2
+
+    return run_min_patch_from_command_line(setup_object, minpatch_object, minpatch_data_dict)
+
+
+if __name__ == '__main__':
+    exit(main())
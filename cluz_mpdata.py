@@ -0,0 +1,131 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from array import array
+from collections.abc import Mapping
+
+
+class MinPatchCsrMatrix:  # Compressed sparse row matrix, where row i holds the entries for the planning unit with index i
+    def __init__(self, indptr_array, index_array, value_array):
+        self.indptr_array = indptr_array
+        self.index_array = index_array
+        self.value_array = value_array
+
+    def row_count(self):
+        return len(self.indptr_array) - 1
+
+    def row_range(self, row_index):
+        return range(self.indptr_array[row_index], self.indptr_array[row_index + 1])
+
+    def row_index_list(self, row_index):
+        return self.index_array[self.indptr_array[row_index]:self.indptr_array[row_index + 1]].tolist()
+
+
+class MinPatchArrayDictView(Mapping):  # Lets code written for the old pu_id keyed dictionaries read the array data
+    def __init__(self, pu_id_array, pu_index_dict, value_arrays):
+        self.pu_id_array = pu_id_array
+        self.pu_index_dict = pu_index_dict
+        self.value_arrays = value_arrays
+
+    def __getitem__(self, pu_id):
+        pu_index = self.pu_index_dict[pu_id]
+        if isinstance(self.value_arrays, list):
+            value = [anArray[pu_index] for anArray in self.value_arrays]
+        else:
+            value = self.value_arrays[pu_index]
+
+        return value
+
+    def __iter__(self):
+        return iter(self.pu_id_array)
+
+    def __len__(self):
+        return len(self.pu_id_array)
+
+
+class MinPatchCsrDictView(Mapping):  # Returns each matrix row as a dictionary, eg {feat_id: amount} or {neighb_pu_id: bound_length}
+    def __init__(self, pu_id_array, pu_index_dict, csr_matrix, column_id_array):
+        self.pu_id_array = pu_id_array
+        self.pu_index_dict = pu_index_dict
+        self.csr_matrix = csr_matrix
+        self.column_id_array = column_id_array
+
+    def __getitem__(self, pu_id):
+        pu_index = self.pu_index_dict[pu_id]
+        index_array = self.csr_matrix.index_array
+        value_array = self.csr_matrix.value_array
+        row_dict = dict()
+        for pos in self.csr_matrix.row_range(pu_index):
+            row_dict[self.column_id_array[index_array[pos]]] = value_array[pos]
+
+        return row_dict
+
+    def __iter__(self):
+        return iter(self.pu_id_array)
+
+    def __len__(self):
+        return len(self.pu_id_array)
+
+
+def make_csr_matrix(row_count, row_index_array, column_index_array, value_array):
+    # Counting sort that keeps the file order of the entries within each row
+    indptr_array = array('q', [0]) * (row_count + 1)
+    for row_index in row_index_array:
+        indptr_array[row_index + 1] += 1
+    for row_index in range(row_count):
+        indptr_array[row_index + 1] += indptr_array[row_index]
+
+    entry_count = indptr_array[row_count]
+    next_pos_array = array('q', indptr_array[0:row_count])
+    csr_index_array = array('i', [0]) * entry_count
+    if value_array is None:
+        csr_value_array = None
+        for row_index, column_index in zip(row_index_array, column_index_array):
+            pos = next_pos_array[row_index]
+            csr_index_array[pos] = column_index
+            next_pos_array[row_index] = pos + 1
+    else:
+        csr_value_array = array('d', [0]) * entry_count
+        for row_index, column_index, a_value in zip(row_index_array, column_index_array, value_array):
+            pos = next_pos_array[row_index]
+            csr_index_array[pos] = column_index
+            csr_value_array[pos] = a_value
+            next_pos_array[row_index] = pos + 1
+
+    return MinPatchCsrMatrix(indptr_array, csr_index_array, csr_value_array)
+
+
+def make_mp_unit_dict_view(minpatch_data_dict, status_array):
+    unit_dict_view = MinPatchArrayDictView(minpatch_data_dict['pu_id_array'], minpatch_data_dict['pu_index_dict'], [minpatch_data_dict['pu_cost_array'], status_array])
+
+    return unit_dict_view
+
+
+def add_mp_dict_views_to_minpatch_data_dict(minpatch_data_dict):
+    pu_id_array = minpatch_data_dict['pu_id_array']
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    minpatch_data_dict['initial_unit_dict'] = make_mp_unit_dict_view(minpatch_data_dict, minpatch_data_dict['pu_status_array'])
+    minpatch_data_dict['xy_loc_dict'] = MinPatchArrayDictView(pu_id_array, pu_index_dict, [minpatch_data_dict['pu_status_array'], minpatch_data_dict['pu_x_array'], minpatch_data_dict['pu_y_array']])
+    minpatch_data_dict['abund_matrix_dict'] = MinPatchCsrDictView(pu_id_array, pu_index_dict, minpatch_data_dict['abund_matrix'], minpatch_data_dict['feat_id_array'])
+    minpatch_data_dict['boundary_matrix_dict'] = MinPatchCsrDictView(pu_id_array, pu_index_dict, minpatch_data_dict['bound_matrix'], pu_id_array)
+    minpatch_data_dict['area_dict'] = MinPatchArrayDictView(pu_id_array, pu_index_dict, minpatch_data_dict['pu_area_array'])
+    minpatch_data_dict['zone_dict'] = MinPatchArrayDictView(pu_id_array, pu_index_dict, [minpatch_data_dict['pu_zone_array'], minpatch_data_dict['pu_patch_area_array'], minpatch_data_dict['pu_radius_array']])
+
+    return minpatch_data_dict
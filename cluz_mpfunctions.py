@@ -18,19 +18,23 @@
  ***************************************************************************/
 """
 
-from copy import deepcopy
+from array import array
 from csv import reader
+from heapq import heapify, heappop, heappush
+from sys import stderr
 
-from .cluz_messages import clear_progress_bar, make_progress_bar, set_progress_bar_value
+from .cluz_costs import calc_portfolio_costs
+from .cluz_messages import clear_progress_bar, make_progress_bar, run_yes_cancel_warning_dialog_box, set_progress_bar_value, warning_message
+from .cluz_mpprofile import add_mp_profile_count, set_mp_profile_count
+from .cluz_mpsparse import make_patch_membership_dict, update_sparse_pu_patch_abund_dict
 
 
-def create_mp_running_unit_dictionary(minpatch_data_dict, marxan_sol_location_string):
-    pre_marxan_unit_dict = minpatch_data_dict['initial_unit_dict']
-    init_unit_dict = deepcopy(pre_marxan_unit_dict)
+def create_mp_running_status_array(minpatch_data_dict, marxan_sol_location_string):
+    running_status_array = array('b', minpatch_data_dict['pu_status_array'])
     a_marxan_sol_dict = make_mp_marxan_sol_dict(marxan_sol_location_string)
-    running_unit_dict = make_mp_start_unit_dict(init_unit_dict, a_marxan_sol_dict)
+    running_status_array = make_mp_start_status_array(minpatch_data_dict, running_status_array, a_marxan_sol_dict)
 
-    return running_unit_dict
+    return running_status_array
 
 
 def make_mp_marxan_sol_dict(marxan_sol_location_string):
@@ -46,164 +50,389 @@ def make_mp_marxan_sol_dict(marxan_sol_location_string):
     return marxan_sol_dict
 
 
-def make_mp_start_unit_dict(pu_dict, marxan_sol_dict):
-    for aRow in marxan_sol_dict:
-        sol_pu_status = marxan_sol_dict[aRow]
+def make_mp_start_status_array(minpatch_data_dict, status_array, marxan_sol_dict):
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    for pu_id in marxan_sol_dict:
+        sol_pu_status = marxan_sol_dict[pu_id]
         if sol_pu_status == 1:
-            pu_list = pu_dict[aRow]
-            pu_list[1] = 1
-            pu_dict[aRow] = pu_list
+            status_array[pu_index_dict[pu_id]] = 1
 
-    return pu_dict
+    return status_array
 
 
-def pu_status_does_not_equal_excluded(pu_dict, pu_id):
+def make_mp_progress_bar(minpatch_data_dict, progress_text):
+    # Progress bars are switched off when MinPatch runs in worker processes, as they have no access to the QGIS interface
+    if minpatch_data_dict['progress_type'] == 'qgis':
+        progress_bar = make_progress_bar(progress_text)
+    elif minpatch_data_dict['progress_type'] == 'stderr':
+        progress_bar = {'progress_text': progress_text, 'percent_value': -1}
+    else:
+        progress_bar = 'blank'
+
+    return progress_bar
+
+
+def set_mp_progress_bar_value(progress_bar, numerator_value, denominator_value):
+    if isinstance(progress_bar, dict):
+        # Only reports every tenth of the way, so the command line output stays readable
+        percent_value = 10 * int(10 * numerator_value / max(denominator_value, 1))
+        if percent_value > progress_bar['percent_value']:
+            progress_bar['percent_value'] = percent_value
+            print(progress_bar['progress_text'] + ': ' + str(percent_value) + '%', file=stderr, flush=True)
+    elif progress_bar != 'blank':
+        set_progress_bar_value(progress_bar, numerator_value, denominator_value)
+
+
+def clear_mp_progress_bar(progress_bar):
+    if isinstance(progress_bar, dict):
+        print(progress_bar['progress_text'] + ': done', file=stderr, flush=True)
+    elif progress_bar != 'blank':
+        clear_progress_bar()
+
+
+def mp_warning_message(minpatch_data_dict, title_text, main_text):
+    if minpatch_data_dict['progress_type'] == 'qgis':
+        warning_message(title_text, main_text)
+    else:
+        print(title_text + ' ' + main_text, file=stderr, flush=True)
+
+
+def run_mp_yes_cancel_warning(minpatch_data_dict, title_text, main_text):
+    # There is no one to ask when MinPatch is run from the command line, so the answer is set by the accept_warnings option
+    if minpatch_data_dict['progress_type'] == 'qgis':
+        response_value = run_yes_cancel_warning_dialog_box(title_text, main_text)
+    else:
+        response_value = minpatch_data_dict['accept_warnings']
+        print(title_text + ' ' + main_text + (' Continuing.' if response_value else ' Stopping.'), file=stderr, flush=True)
+
+    return response_value
+
+
+def pu_status_does_not_equal_excluded(status_array, pu_index):
     not_excluded_bool = True
-    if pu_dict[pu_id][1] == 3:
+    if status_array[pu_index] == 3:
         not_excluded_bool = False
 
     return not_excluded_bool
 
 
-def pu_status_is_earmarked_or_conserved(pu_dict, pu_id):
+def pu_status_is_earmarked_or_conserved(status_array, pu_index):
     is_earmarked_or_conserved = False
-    if pu_dict[pu_id][1] == 1 or pu_dict[pu_id][1] == 2:
+    if status_array[pu_index] == 1 or status_array[pu_index] == 2:
         is_earmarked_or_conserved = True
 
     return is_earmarked_or_conserved
 
 
-def make_mp_patch_dict(pu_dict, minpatch_data_dict):
-    area_dict = minpatch_data_dict['area_dict']
-    boundary_matrix_dict = minpatch_data_dict['boundary_matrix_dict']
+def make_mp_patch_dict(status_array, minpatch_data_dict):
+    portfolio_pu_index_set = make_portfolio_pu_index_set(status_array)
+    patch_dict = make_patch_dict_from_pu_index_set(minpatch_data_dict, portfolio_pu_index_set)
+
+    return patch_dict
+
+
+def make_patch_dict_from_pu_index_set(minpatch_data_dict, pu_index_set):
+    pu_area_array = minpatch_data_dict['pu_area_array']
+    bound_matrix = minpatch_data_dict['bound_matrix']
     patch_dict = dict()
     patch_id = 1
-    running_portfolio_pu_id_set = make_portfolio_pu_id_set(pu_dict)  # To contain data on all PUs in portfolio, then each PU will be removed & assiged to a patch
+    running_portfolio_pu_index_set = set(pu_index_set)  # To contain data on all PUs in portfolio, then each PU will be removed & assiged to a patch
 
-    while len(running_portfolio_pu_id_set) > 0:
-        patch_pu_id_set = make_patch_pu_id_set(boundary_matrix_dict, running_portfolio_pu_id_set)
-        running_portfolio_pu_id_set = running_portfolio_pu_id_set.difference(patch_pu_id_set)
-        patch_pu_id_list = list(patch_pu_id_set)
-        patch_pu_id_list.sort()
-        patch_area = return_patch_area(area_dict, patch_pu_id_list)
-        patch_dict[patch_id] = [patch_area, len(patch_pu_id_list), patch_pu_id_list]
-        patch_id += 1
+    for pu_index in sorted(pu_index_set):
+        if pu_index in running_portfolio_pu_index_set:
+            patch_pu_index_list = make_patch_pu_index_list(bound_matrix, running_portfolio_pu_index_set, pu_index)
+            add_mp_profile_count(minpatch_data_dict, 'flood_fill_count', 1)
+            patch_pu_index_list.sort()
+            patch_area = return_patch_area(pu_area_array, patch_pu_index_list)
+            patch_dict[patch_id] = [patch_area, len(patch_pu_index_list), patch_pu_index_list]
+            patch_id += 1
 
     return patch_dict
 
 
-def make_portfolio_pu_id_set(unit_dict):
-    portfolio_pu_id_set = set()
-    for pu_id in unit_dict:
-        if pu_status_is_earmarked_or_conserved(unit_dict, pu_id):
-            portfolio_pu_id_set.add(pu_id)
+def make_portfolio_pu_index_set(status_array):
+    portfolio_pu_index_set = set()
+    for pu_index in range(len(status_array)):
+        if pu_status_is_earmarked_or_conserved(status_array, pu_index):
+            portfolio_pu_index_set.add(pu_index)
 
-    return portfolio_pu_id_set
+    return portfolio_pu_index_set
 
 
-def make_patch_pu_id_set(boundary_matrix_dict, running_portfolio_pu_id_set):
-    loop_unit_set = set()
-    patch_pu_id_set = set()
-    initial_pu_id = list(running_portfolio_pu_id_set)[0]
-    loop_unit_set.add(initial_pu_id)
+def make_patch_pu_index_list(bound_matrix, running_portfolio_pu_index_set, initial_pu_index):
+    # PUs are removed from running_portfolio_pu_index_set as they are assigned to the patch
+    indptr_array = bound_matrix.indptr_array
+    index_array = bound_matrix.index_array
+    running_portfolio_pu_index_set.discard(initial_pu_index)
+    loop_pu_index_list = [initial_pu_index]
+    patch_pu_index_list = [initial_pu_index]
 
-    while len(loop_unit_set) > 0:
-        pu_id = loop_unit_set.pop()
-        patch_pu_id_set.add(pu_id)
-        neighb_list = boundary_matrix_dict[pu_id]
-        if len(neighb_list) > 0:
-            for neighb_pu_id in neighb_list:
-                if neighb_pu_id in running_portfolio_pu_id_set and neighb_pu_id not in patch_pu_id_set:
-                    loop_unit_set.add(neighb_pu_id)
+    while len(loop_pu_index_list) > 0:
+        pu_index = loop_pu_index_list.pop()
+        for pos in range(indptr_array[pu_index], indptr_array[pu_index + 1]):
+            neighb_pu_index = index_array[pos]
+            if neighb_pu_index in running_portfolio_pu_index_set:
+                running_portfolio_pu_index_set.remove(neighb_pu_index)
+                loop_pu_index_list.append(neighb_pu_index)
+                patch_pu_index_list.append(neighb_pu_index)
 
-    return patch_pu_id_set
+    return patch_pu_index_list
 
 
-def return_patch_area(area_dict, patch_pu_id_list):
+def return_patch_area(pu_area_array, patch_pu_index_list):
     patch_area = 0
-    for pu_id in patch_pu_id_list:
-        patch_area += area_dict[pu_id]
+    for pu_index in patch_pu_index_list:
+        patch_area += pu_area_array[pu_index]
 
     return patch_area
 
 
-def rem_small_patches_from_unit_dict(minpatch_data_dict, unit_dict, patch_dict, marxan_file_name):
-    pre_marxan_unit_dict = minpatch_data_dict['initial_unit_dict']
-    zone_dict = minpatch_data_dict['zone_dict']
+def rem_small_patches_from_unit_dict(minpatch_data_dict, status_array, patch_dict, marxan_file_name):
+    pre_marxan_status_array = minpatch_data_dict['pu_status_array']
+    pu_patch_area_array = minpatch_data_dict['pu_patch_area_array']
 
-    progress_bar = make_progress_bar('Removing small patches:' + marxan_file_name)
+    progress_bar = make_mp_progress_bar(minpatch_data_dict, 'Removing small patches:' + marxan_file_name)
     row_total_count = len(patch_dict)
     row_count = 1
 
     for patchID in patch_dict:
-        set_progress_bar_value(progress_bar, row_count, row_total_count)
+        set_mp_progress_bar_value(progress_bar, row_count, row_total_count)
         row_count += 1
         patch_size = patch_dict[patchID][0]
-        patch_size_threshold = calc_patch_size_threshold(zone_dict, patch_dict, patchID)
+        patch_size_threshold = calc_patch_size_threshold(pu_patch_area_array, patch_dict, patchID)
 
         if patch_size < patch_size_threshold:
-            patch_id_list = patch_dict[patchID][2]
-            for unitIDValue in patch_id_list:
-                orig_status = pre_marxan_unit_dict[unitIDValue][1]
-                unit_list = unit_dict[unitIDValue]
-                unit_status = unit_list[1]
-                if orig_status == 0 and unit_status == 1:
-                    unit_list[1] = 0
-                    unit_dict[unitIDValue] = unit_list
-
-    clear_progress_bar()
-    return unit_dict
-
-
-def calc_patch_size_threshold(zone_dict, patch_dict, patch_id):
-    patch_pu_id_list = patch_dict[patch_id][2]
-    if len(zone_dict) == 1:
-        first_pu_id = patch_pu_id_list[0]  # Takes patch threshold size from first PU, as every PU has same threshold
-        patch_size_threshold = zone_dict[first_pu_id][1]
-    else:
-        patch_pu_id_list = patch_dict[patch_id][2]
-        patch_size_threshold = 'blank'
-        for pu_id in patch_pu_id_list:
-            pu_patch_threshold = zone_dict[pu_id][1]
-            if patch_size_threshold == 'blank':
-                patch_size_threshold = pu_patch_threshold
-            if patch_size_threshold < pu_patch_threshold:
-                patch_size_threshold = pu_patch_threshold
+            add_mp_profile_count(minpatch_data_dict, 'removed_patch_count', 1)
+            patch_pu_index_list = patch_dict[patchID][2]
+            for pu_index in patch_pu_index_list:
+                if pre_marxan_status_array[pu_index] == 0 and status_array[pu_index] == 1:
+                    status_array[pu_index] = 0
+                    add_mp_profile_count(minpatch_data_dict, 'removed_pu_count', 1)
+
+    clear_mp_progress_bar(progress_bar)
+    return status_array
+
+
+def calc_patch_size_threshold(pu_patch_area_array, patch_dict, patch_id):
+    # Patch threshold is the largest minimum patch size of the zones that the patch PUs are in
+    patch_pu_index_list = patch_dict[patch_id][2]
+    patch_size_threshold = 'blank'
+    for pu_index in patch_pu_index_list:
+        pu_patch_threshold = pu_patch_area_array[pu_index]
+        if patch_size_threshold == 'blank' or patch_size_threshold < pu_patch_threshold:
+            patch_size_threshold = pu_patch_threshold
 
     return patch_size_threshold
 
 
-def add_mp_patches(setup_object, minpatch_data_dict, running_unit_dict, marxan_file_name):
+def add_mp_patches(minpatch_data_dict, running_status_array, marxan_file_name):
     continue_bool = True
-    feat_amount_cons_dict = make_mp_feat_amount_cons_dict(setup_object, minpatch_data_dict, running_unit_dict)
-    unmet_target_id_set = make_mp_unmet_target_id_set(feat_amount_cons_dict, minpatch_data_dict)
-    pu_selection_set = make_mp_pu_selection_set(minpatch_data_dict, running_unit_dict)
+    feat_amount_cons_list = make_mp_feat_amount_cons_list(minpatch_data_dict, running_status_array)
+    unmet_target_index_set = make_mp_unmet_target_index_set(feat_amount_cons_list, minpatch_data_dict)
+    pu_selection_set = make_mp_pu_selection_set(minpatch_data_dict, running_status_array)
     pu_patch_set_dict = make_mp_pu_patch_set_dict(pu_selection_set, minpatch_data_dict)
-    all_pu_patch_abund_dict = make_mp_pu_patch_abund_dict(minpatch_data_dict, running_unit_dict, pu_selection_set, pu_patch_set_dict, unmet_target_id_set)
+    if minpatch_data_dict['patch_abundance_engine'] == 'sparse':
+        patch_membership_dict = make_patch_membership_dict(minpatch_data_dict, pu_selection_set, pu_patch_set_dict)
+    else:
+        patch_membership_dict = 'blank'
+    all_pu_patch_abund_dict = update_candidate_pu_patch_abund_dict(dict(), minpatch_data_dict, running_status_array, pu_patch_set_dict, patch_membership_dict, unmet_target_index_set, pu_selection_set)
+
+    progress_bar = make_mp_progress_bar(minpatch_data_dict, 'Adding new patches:' + marxan_file_name)
+    if minpatch_data_dict['patch_selection_engine'] == 'heap':
+        running_status_array, feat_amount_cons_list, unmet_target_index_set, continue_bool = run_mp_add_patches_heap_loop(minpatch_data_dict, running_status_array, feat_amount_cons_list, unmet_target_index_set, pu_selection_set, pu_patch_set_dict, patch_membership_dict, all_pu_patch_abund_dict, progress_bar)
+    else:
+        running_status_array, feat_amount_cons_list, unmet_target_index_set, continue_bool = run_mp_add_patches_scan_loop(minpatch_data_dict, running_status_array, feat_amount_cons_list, unmet_target_index_set, pu_selection_set, pu_patch_set_dict, patch_membership_dict, all_pu_patch_abund_dict, progress_bar)
+    clear_mp_progress_bar(progress_bar)
+
+    return running_status_array, feat_amount_cons_list, unmet_target_index_set, continue_bool
+
+
+def run_mp_add_patches_scan_loop(minpatch_data_dict, running_status_array, feat_amount_cons_list, unmet_target_index_set, pu_selection_set, pu_patch_set_dict, patch_membership_dict, all_pu_patch_abund_dict, progress_bar):
+    continue_bool = True
+    row_total_count = len(unmet_target_index_set)
+
+    while len(unmet_target_index_set) > 0:
+        row_count = row_total_count - len(unmet_target_index_set)
+        set_mp_progress_bar_value(progress_bar, row_count, row_total_count)
+
+        pu_patch_score_dict = make_pu_patch_score_dict(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_selection_set)
+        pu_index, pu_selection_set = return_best_pu(pu_patch_score_dict)
+
+        if pu_index == -1:
+            continue_bool = False
+            break
 
-    progress_bar = make_progress_bar('Adding new patches:' + marxan_file_name)
-    row_total_count = len(unmet_target_id_set)
+        running_status_array, added_pu_index_list = add_patch(minpatch_data_dict, running_status_array, pu_index)
+        pu_selection_set.remove(pu_index)
 
-    while len(unmet_target_id_set) > 0:
-        row_count = row_total_count - len(unmet_target_id_set)
-        set_progress_bar_value(progress_bar, row_count, row_total_count)
+        all_pu_patch_abund_dict = update_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, running_status_array, pu_selection_set, pu_patch_set_dict, patch_membership_dict, unmet_target_index_set, pu_index)
+        feat_amount_cons_list, prev_feat_amount_cons_dict = update_mp_feat_amount_cons_list(minpatch_data_dict, feat_amount_cons_list, added_pu_index_list)
+        unmet_target_index_set = update_mp_unmet_target_index_set(minpatch_data_dict, feat_amount_cons_list, unmet_target_index_set, prev_feat_amount_cons_dict)
 
-        pu_patch_score_dict = make_pu_patch_score_dict(minpatch_data_dict, feat_amount_cons_dict, all_pu_patch_abund_dict, pu_selection_set)
-        pu_id, pu_selection_set = return_best_pu(pu_patch_score_dict)
+    return running_status_array, feat_amount_cons_list, unmet_target_index_set, continue_bool
 
-        if pu_id == -1:
+
+def run_mp_add_patches_heap_loop(minpatch_data_dict, running_status_array, feat_amount_cons_list, unmet_target_index_set, pu_selection_set, pu_patch_set_dict, patch_membership_dict, all_pu_patch_abund_dict, progress_bar):
+    # Patch scores can go up as well as down as patches are added (eg when another patch narrows a target gap), so the heap holds
+    # an upper bound on each candidate's score. Bounds are raised when a target gap narrows and a candidate is only re-scored when
+    # its bound reaches the top of the heap, which selects the same patches as re-scoring every candidate after each addition.
+    continue_bool = True
+    row_total_count = len(unmet_target_index_set)
+    patch_member_candidate_dict = make_patch_member_candidate_dict(pu_patch_set_dict)
+    feat_candidate_dict = make_feat_candidate_dict(all_pu_patch_abund_dict)
+    score_heap_dict = make_score_heap_dict(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_selection_set)
+
+    while len(unmet_target_index_set) > 0:
+        row_count = row_total_count - len(unmet_target_index_set)
+        set_mp_progress_bar_value(progress_bar, row_count, row_total_count)
+
+        pu_index = pop_best_pu_from_score_heap(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_selection_set, score_heap_dict)
+
+        if pu_index == -1:
             continue_bool = False
             break
 
-        running_unit_dict = add_patch(minpatch_data_dict, running_unit_dict, pu_id)
-        pu_selection_set.remove(pu_id)
+        running_status_array, added_pu_index_list = add_patch(minpatch_data_dict, running_status_array, pu_index)
+        pu_selection_set.remove(pu_index)
+        remove_pu_from_score_heap_dict(score_heap_dict, pu_index)
+
+        overlap_candidate_set = return_overlap_candidate_set(patch_member_candidate_dict, pu_patch_set_dict, pu_selection_set, pu_index)
+        for candidate_pu_index in overlap_candidate_set:
+            remove_candidate_from_feat_candidate_dict(feat_candidate_dict, all_pu_patch_abund_dict, candidate_pu_index)
+        all_pu_patch_abund_dict = update_candidate_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, running_status_array, pu_patch_set_dict, patch_membership_dict, unmet_target_index_set, overlap_candidate_set)
+        for candidate_pu_index in overlap_candidate_set:
+            add_candidate_to_feat_candidate_dict(feat_candidate_dict, all_pu_patch_abund_dict, candidate_pu_index)
+
+        feat_amount_cons_list, prev_feat_amount_cons_dict = update_mp_feat_amount_cons_list(minpatch_data_dict, feat_amount_cons_list, added_pu_index_list)
+        unmet_target_index_set = update_mp_unmet_target_index_set(minpatch_data_dict, feat_amount_cons_list, unmet_target_index_set, prev_feat_amount_cons_dict)
+
+        raise_pu_score_bounds(minpatch_data_dict, feat_amount_cons_list, prev_feat_amount_cons_dict, feat_candidate_dict, all_pu_patch_abund_dict, overlap_candidate_set, score_heap_dict)
+        for candidate_pu_index in overlap_candidate_set:
+            score_value = calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, candidate_pu_index)
+            set_pu_score_in_score_heap_dict(score_heap_dict, pu_selection_set, candidate_pu_index, score_value)
+
+    return running_status_array, feat_amount_cons_list, unmet_target_index_set, continue_bool
+
+
+def make_patch_member_candidate_dict(pu_patch_set_dict):
+    patch_member_candidate_dict = dict()
+    for candidate_pu_index in pu_patch_set_dict:
+        for patch_pu_index in pu_patch_set_dict[candidate_pu_index]:
+            try:
+                patch_member_candidate_dict[patch_pu_index].add(candidate_pu_index)
+            except KeyError:
+                patch_member_candidate_dict[patch_pu_index] = {candidate_pu_index}
+
+    return patch_member_candidate_dict
+
+
+def make_feat_candidate_dict(all_pu_patch_abund_dict):
+    feat_candidate_dict = dict()
+    for candidate_pu_index in all_pu_patch_abund_dict:
+        add_candidate_to_feat_candidate_dict(feat_candidate_dict, all_pu_patch_abund_dict, candidate_pu_index)
+
+    return feat_candidate_dict
 
-        all_pu_patch_abund_dict = update_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, running_unit_dict, pu_selection_set, pu_patch_set_dict, unmet_target_id_set, pu_id)
-        feat_amount_cons_dict = make_mp_feat_amount_cons_dict(setup_object, minpatch_data_dict, running_unit_dict)
-        unmet_target_id_set = make_mp_unmet_target_id_set(feat_amount_cons_dict, minpatch_data_dict)
-    clear_progress_bar()
 
-    return running_unit_dict, feat_amount_cons_dict, unmet_target_id_set, continue_bool
+def add_candidate_to_feat_candidate_dict(feat_candidate_dict, all_pu_patch_abund_dict, candidate_pu_index):
+    for feat_index in all_pu_patch_abund_dict[candidate_pu_index][0]:
+        try:
+            feat_candidate_dict[feat_index].add(candidate_pu_index)
+        except KeyError:
+            feat_candidate_dict[feat_index] = {candidate_pu_index}
+
+
+def remove_candidate_from_feat_candidate_dict(feat_candidate_dict, all_pu_patch_abund_dict, candidate_pu_index):
+    for feat_index in all_pu_patch_abund_dict[candidate_pu_index][0]:
+        feat_candidate_dict[feat_index].discard(candidate_pu_index)
+
+
+def return_overlap_candidate_set(patch_member_candidate_dict, pu_patch_set_dict, pu_selection_set, best_pu_index):
+    overlap_candidate_set = set()
+    for patch_pu_index in pu_patch_set_dict[best_pu_index]:
+        overlap_candidate_set.update(patch_member_candidate_dict[patch_pu_index])
+
+    return overlap_candidate_set.intersection(pu_selection_set)
+
+
+def make_score_heap_dict(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_selection_set):
+    score_heap_dict = dict()
+    score_heap_dict['heap'] = list()
+    score_heap_dict['bound_dict'] = dict()  # Upper bound on the current score of each candidate
+    score_heap_dict['exact_set'] = set()  # Candidates whose bound is their current score
+    for pu_index in list(pu_selection_set):
+        score_value = calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_index)
+        set_pu_score_in_score_heap_dict(score_heap_dict, pu_selection_set, pu_index, score_value)
+
+    return score_heap_dict
+
+
+def set_pu_score_in_score_heap_dict(score_heap_dict, pu_selection_set, pu_index, score_value):
+    # Scores can't rise above zero once they have fallen to it, so these candidates are dropped, as they are by return_best_pu
+    if score_value > 0:
+        score_heap_dict['bound_dict'][pu_index] = score_value
+        score_heap_dict['exact_set'].add(pu_index)
+        heappush(score_heap_dict['heap'], (-score_value, pu_index))
+    else:
+        pu_selection_set.discard(pu_index)
+        remove_pu_from_score_heap_dict(score_heap_dict, pu_index)
+
+
+def remove_pu_from_score_heap_dict(score_heap_dict, pu_index):
+    score_heap_dict['bound_dict'].pop(pu_index, None)
+    score_heap_dict['exact_set'].discard(pu_index)
+
+
+def raise_pu_score_bounds(minpatch_data_dict, feat_amount_cons_list, prev_feat_amount_cons_dict, feat_candidate_dict, all_pu_patch_abund_dict, rescored_pu_index_set, score_heap_dict):
+    feat_target_array = minpatch_data_dict['feat_target_array']
+    bound_dict = score_heap_dict['bound_dict']
+    exact_set = score_heap_dict['exact_set']
+    score_increase_dict = dict()
+    for feat_index in prev_feat_amount_cons_dict:
+        target_value = feat_target_array[feat_index]
+        prev_target_gap = target_value - prev_feat_amount_cons_dict[feat_index]
+        target_gap = target_value - feat_amount_cons_list[feat_index]
+        if target_gap <= 0 < prev_target_gap:  # Meeting a target lowers patch scores, so bounds stay valid but are no longer exact
+            exact_set.difference_update(feat_candidate_dict.get(feat_index, set()))
+        if target_gap > 0:
+            for candidate_pu_index in feat_candidate_dict.get(feat_index, set()):
+                if candidate_pu_index in bound_dict and candidate_pu_index not in rescored_pu_index_set:
+                    pu_patch_abund_dict, pu_patch_cost = all_pu_patch_abund_dict[candidate_pu_index]
+                    patch_amount = pu_patch_abund_dict[feat_index]
+                    if patch_amount < prev_target_gap and pu_patch_cost > 0:  # Otherwise the feature score stays capped at 1
+                        feat_score = patch_amount / target_gap
+                        if feat_score > 1:
+                            feat_score = 1
+                        score_increase = (feat_score - patch_amount / prev_target_gap) / pu_patch_cost
+                        score_increase_dict[candidate_pu_index] = score_increase_dict.get(candidate_pu_index, 0) + score_increase
+
+    for candidate_pu_index in score_increase_dict:
+        # Small margin so rounding errors can't leave the bound below the recalculated score
+        bound_value = (bound_dict[candidate_pu_index] + score_increase_dict[candidate_pu_index]) * (1 + 1e-9)
+        bound_dict[candidate_pu_index] = bound_value
+        exact_set.discard(candidate_pu_index)
+        heappush(score_heap_dict['heap'], (-bound_value, candidate_pu_index))
+
+    if len(score_heap_dict['heap']) > 4 * len(bound_dict):  # Rebuild the heap when it is mostly made up of out of date entries
+        score_heap = [(-bound_dict[pu_index], pu_index) for pu_index in bound_dict]
+        heapify(score_heap)
+        score_heap_dict['heap'] = score_heap
+
+
+def pop_best_pu_from_score_heap(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_selection_set, score_heap_dict):
+    # Heap entries are ordered by score then PU index, so joint equal scores select the PU that comes first in the pu.dat file.
+    # Entries left behind when a bound was changed or a PU was removed are skipped.
+    score_heap = score_heap_dict['heap']
+    bound_dict = score_heap_dict['bound_dict']
+    while len(score_heap) > 0:
+        neg_bound_value, pu_index = heappop(score_heap)
+        if bound_dict.get(pu_index) == -neg_bound_value:
+            if pu_index in score_heap_dict['exact_set']:
+                return pu_index
+            score_value = calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_index)
+            set_pu_score_in_score_heap_dict(score_heap_dict, pu_selection_set, pu_index, score_value)
+
+    return -1
 
 
 def make_feature_id_list_of_unmeetable_targets_string(unmet_target_id_set):
@@ -216,122 +445,176 @@ def make_feature_id_list_of_unmeetable_targets_string(unmet_target_id_set):
     return final_feat_id_list_string
 
 
-def make_mp_feat_amount_cons_dict(setup_object, minpatch_data_dict, unit_dict):
-    target_dict = minpatch_data_dict['target_dict']
-    abund_matrix_dict = minpatch_data_dict['abund_matrix_dict']
+def make_mp_feat_amount_cons_list(minpatch_data_dict, status_array):
+    abund_matrix = minpatch_data_dict['abund_matrix']
+    index_array = abund_matrix.index_array
+    value_array = abund_matrix.value_array
+    decimal_places = minpatch_data_dict['decimal_places']
 
-    feat_amount_cons_dict = dict(zip(target_dict.keys(), len(target_dict.keys()) * [0]))
+    feat_amount_cons_list = len(minpatch_data_dict['feat_id_array']) * [0]
 
-    for pu_id in abund_matrix_dict:
-        pu_status = unit_dict[pu_id][1]
+    for pu_index in range(len(status_array)):
+        pu_status = status_array[pu_index]
         if pu_status == 1 or pu_status == 2:
-            pu_abund_dict = abund_matrix_dict[pu_id]
-            for featID in pu_abund_dict:
-                feat_amount = pu_abund_dict[featID]
-                con_total_amount = feat_amount_cons_dict[featID]
-                con_total_amount += feat_amount
-                final_con_total_amount = round(con_total_amount, setup_object.decimal_places)
-                feat_amount_cons_dict[featID] = final_con_total_amount
+            for pos in abund_matrix.row_range(pu_index):
+                feat_index = index_array[pos]
+                con_total_amount = feat_amount_cons_list[feat_index]
+                con_total_amount += value_array[pos]
+                feat_amount_cons_list[feat_index] = round(con_total_amount, decimal_places)
+
+    return feat_amount_cons_list
+
+
+def update_mp_feat_amount_cons_list(minpatch_data_dict, feat_amount_cons_list, added_pu_index_list):
+    # Only adds the amounts from the PUs that have just been added to the portfolio, rather than rescanning every PU
+    abund_matrix = minpatch_data_dict['abund_matrix']
+    index_array = abund_matrix.index_array
+    value_array = abund_matrix.value_array
+    decimal_places = minpatch_data_dict['decimal_places']
+
+    prev_feat_amount_cons_dict = dict()  # Amounts before the PUs were added, for each feature that has changed
+    for pu_index in added_pu_index_list:
+        for pos in abund_matrix.row_range(pu_index):
+            feat_index = index_array[pos]
+            con_total_amount = feat_amount_cons_list[feat_index]
+            if feat_index not in prev_feat_amount_cons_dict:
+                prev_feat_amount_cons_dict[feat_index] = con_total_amount
+            con_total_amount += value_array[pos]
+            feat_amount_cons_list[feat_index] = round(con_total_amount, decimal_places)
+
+    return feat_amount_cons_list, prev_feat_amount_cons_dict
+
+
+def update_mp_unmet_target_index_set(minpatch_data_dict, feat_amount_cons_list, unmet_target_index_set, prev_feat_amount_cons_dict):
+    feat_target_array = minpatch_data_dict['feat_target_array']
+    for feat_index in prev_feat_amount_cons_dict:
+        target_value = feat_target_array[feat_index]
+        if target_value > 0 and feat_amount_cons_list[feat_index] < target_value:
+            unmet_target_index_set.add(feat_index)
+        else:
+            unmet_target_index_set.discard(feat_index)
 
-    return feat_amount_cons_dict
+    return unmet_target_index_set
 
 
-def make_mp_unmet_target_id_set(amount_con_dict, minpatch_data_dict):
+def make_mp_unmet_target_index_set(feat_amount_cons_list, minpatch_data_dict):
     unmet_target_set = set()
-    target_dict = minpatch_data_dict['target_dict']
-    for featID in amount_con_dict:
-        amount_conserved = amount_con_dict[featID]
-        target_value = target_dict[featID][1]
+    feat_target_array = minpatch_data_dict['feat_target_array']
+    for feat_index in range(len(feat_amount_cons_list)):
+        amount_conserved = feat_amount_cons_list[feat_index]
+        target_value = feat_target_array[feat_index]
 
         if target_value > 0 and amount_conserved < target_value:
-            unmet_target_set.add(featID)
+            unmet_target_set.add(feat_index)
 
     return unmet_target_set
 
 
-def make_mp_pu_selection_set(minpatch_data_dict, running_unit_dict):
+def make_mp_feat_id_amount_cons_dict(minpatch_data_dict, feat_amount_cons_list):
+    feat_id_array = minpatch_data_dict['feat_id_array']
+    feat_amount_cons_dict = dict()
+    for feat_index in range(len(feat_amount_cons_list)):
+        feat_amount_cons_dict[feat_id_array[feat_index]] = feat_amount_cons_list[feat_index]
+
+    return feat_amount_cons_dict
+
+
+def make_mp_feat_id_set(minpatch_data_dict, feat_index_set):
+    feat_id_array = minpatch_data_dict['feat_id_array']
+    feat_id_set = set()
+    for feat_index in feat_index_set:
+        feat_id_set.add(feat_id_array[feat_index])
+
+    return feat_id_set
+
+
+def make_mp_pu_selection_set(minpatch_data_dict, status_array):
     pu_selection_set = set()
-    add_patch_pu_id_dict = minpatch_data_dict['add_patch_pu_id_dict']
-    for pu_id in running_unit_dict:
-        if pu_status_does_not_equal_excluded(running_unit_dict, pu_id):
-            neighb_patch_id_list = add_patch_pu_id_dict[pu_id]
-            if len(neighb_patch_id_list) > 0:
-                pu_selection_set.add(pu_id)
+    add_patch_matrix = minpatch_data_dict['add_patch_matrix']
+    for pu_index in range(len(status_array)):
+        if pu_status_does_not_equal_excluded(status_array, pu_index):
+            if len(add_patch_matrix.row_range(pu_index)) > 0:
+                pu_selection_set.add(pu_index)
 
     return pu_selection_set
 
 
 def make_mp_pu_patch_set_dict(pu_selection_set, minpatch_data_dict):
     pu_patch_set_dict = dict()
-    add_patch_pu_id_dict = minpatch_data_dict['add_patch_pu_id_dict']
-    for pu_id in pu_selection_set:
-        pu_set = set(add_patch_pu_id_dict[pu_id])
-        pu_set.add(pu_id)
-        pu_patch_set_dict[pu_id] = pu_set
+    add_patch_matrix = minpatch_data_dict['add_patch_matrix']
+    for pu_index in pu_selection_set:
+        pu_set = set(add_patch_matrix.row_index_list(pu_index))
+        pu_set.add(pu_index)
+        pu_patch_set_dict[pu_index] = pu_set
 
     return pu_patch_set_dict
 
 
-def make_mp_pu_patch_abund_dict(minpatch_data_dict, unit_dict, pu_selection_set, pu_patch_set_dict, unmet_target_id_set):
-    all_pu_patch_abund_dict = dict()
-    for pu_id in pu_selection_set:
-        patch_cost = return_single_pu_patch_cost(unit_dict, pu_patch_set_dict, pu_id)
-        pu_patch_abund_dict = make_single_pu_patch_abund_dict(minpatch_data_dict, unit_dict, pu_patch_set_dict, unmet_target_id_set, pu_id)
-        all_pu_patch_abund_dict[pu_id] = [pu_patch_abund_dict, patch_cost]
+def update_candidate_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, status_array, pu_patch_set_dict, patch_membership_dict, unmet_target_index_set, candidate_pu_index_set):
+    if patch_membership_dict == 'blank':
+        for pu_index in candidate_pu_index_set:
+            patch_cost = return_single_pu_patch_cost(minpatch_data_dict, status_array, pu_patch_set_dict, pu_index)
+            pu_patch_abund_dict = make_single_pu_patch_abund_dict(minpatch_data_dict, status_array, pu_patch_set_dict, unmet_target_index_set, pu_index)
+            all_pu_patch_abund_dict[pu_index] = [pu_patch_abund_dict, patch_cost]
+    else:
+        all_pu_patch_abund_dict = update_sparse_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, patch_membership_dict, status_array, unmet_target_index_set, candidate_pu_index_set)
 
     return all_pu_patch_abund_dict
 
 
-def return_single_pu_patch_cost(unit_dict, pu_patch_set_dict, pu_id):
-    patch_pu_id_set = pu_patch_set_dict[pu_id]
+def return_single_pu_patch_cost(minpatch_data_dict, status_array, pu_patch_set_dict, pu_index):
+    pu_cost_array = minpatch_data_dict['pu_cost_array']
+    patch_pu_index_set = pu_patch_set_dict[pu_index]
     patch_cost = 0
 
-    for pu_patch_id in patch_pu_id_set:
-        pu_status = unit_dict[pu_patch_id][1]
-        pu_cost = unit_dict[pu_patch_id][0]
-        if pu_status == 0:
-            patch_cost += pu_cost
+    for patch_pu_index in patch_pu_index_set:
+        if status_array[patch_pu_index] == 0:
+            patch_cost += pu_cost_array[patch_pu_index]
 
     return patch_cost
 
 
-def make_single_pu_patch_abund_dict(minpatch_data_dict, unit_dict, pu_patch_set_dict, unmet_target_id_set, pu_id):
-    abund_matrix_dict = minpatch_data_dict['abund_matrix_dict']
-    patch_pu_id_set = pu_patch_set_dict[pu_id]
-    pu_patch_abund_dict = dict()
+def make_single_pu_patch_abund_dict(minpatch_data_dict, status_array, pu_patch_set_dict, unmet_target_index_set, pu_index):
+    abund_matrix = minpatch_data_dict['abund_matrix']
+    index_array = abund_matrix.index_array
+    value_array = abund_matrix.value_array
+    patch_pu_index_set = pu_patch_set_dict[pu_index]
+    patch_amount_dict = dict()
 
-    for featID in unmet_target_id_set:
-        patch_amount = 0
-        for puPatchID in patch_pu_id_set:
-            pu_patch_status = unit_dict[puPatchID][1]
-            if pu_patch_status == 0:
-                abund_dict = abund_matrix_dict[puPatchID]
-                try:
-                    abund_amount = abund_dict[featID]
-                except KeyError:
-                    abund_amount = 0
-                patch_amount += abund_amount
+    for patch_pu_index in patch_pu_index_set:
+        if status_array[patch_pu_index] == 0:
+            for pos in abund_matrix.row_range(patch_pu_index):
+                feat_index = index_array[pos]
+                if feat_index in unmet_target_index_set:
+                    if feat_index in patch_amount_dict:
+                        patch_amount_dict[feat_index] += value_array[pos]
+                    else:
+                        patch_amount_dict[feat_index] = value_array[pos]
+
+    pu_patch_abund_dict = dict()
+    for feat_index in sorted(patch_amount_dict):
+        patch_amount = patch_amount_dict[feat_index]
         if patch_amount > 0:
-            pu_patch_abund_dict[featID] = patch_amount
+            pu_patch_abund_dict[feat_index] = patch_amount
 
     return pu_patch_abund_dict
 
 
-def make_pu_patch_score_dict(minpatch_data_dict, feat_amount_cons_dict, all_pu_patch_abund_dict, pu_selection_set):
+def make_pu_patch_score_dict(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_selection_set):
     pu_patch_score_dict = dict()
-    for pu_id in pu_selection_set:
-        pu_patch_score_dict[pu_id] = calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_dict, all_pu_patch_abund_dict, pu_id)
+    for pu_index in pu_selection_set:
+        pu_patch_score_dict[pu_index] = calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_index)
 
     return pu_patch_score_dict
 
 
-def calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_dict, all_pu_patch_abund_dict, pu_id):
-    target_dict = minpatch_data_dict['target_dict']
+def calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_list, all_pu_patch_abund_dict, pu_index):
+    feat_target_array = minpatch_data_dict['feat_target_array']
     pu_score = 0
-    pu_patch_abund_dict = all_pu_patch_abund_dict[pu_id][0]
-    pu_patch_cost = all_pu_patch_abund_dict[pu_id][1]
-    for featID in pu_patch_abund_dict:
-        feat_score = calc_pu_patch_feature_score(target_dict, feat_amount_cons_dict, pu_patch_abund_dict, featID)
+    pu_patch_abund_dict = all_pu_patch_abund_dict[pu_index][0]
+    pu_patch_cost = all_pu_patch_abund_dict[pu_index][1]
+    for feat_index in pu_patch_abund_dict:
+        feat_score = calc_pu_patch_feature_score(feat_target_array, feat_amount_cons_list, pu_patch_abund_dict, feat_index)
         if feat_score != 'blank':
             pu_score += feat_score
 
@@ -343,11 +626,11 @@ def calc_pu_patch_score(minpatch_data_dict, feat_amount_cons_dict, all_pu_patch_
     return final_pu_score
 
 
-def calc_pu_patch_feature_score(target_dict, feat_amount_cons_dict, pu_patch_abund_dict, feat_id):
+def calc_pu_patch_feature_score(feat_target_array, feat_amount_cons_list, pu_patch_abund_dict, feat_index):
     feat_score = 'blank'
-    patch_amount = pu_patch_abund_dict[feat_id]
-    target_amount = target_dict[feat_id][1]
-    con_amount = feat_amount_cons_dict[feat_id]
+    patch_amount = pu_patch_abund_dict[feat_index]
+    target_amount = feat_target_array[feat_index]
+    con_amount = feat_amount_cons_list[feat_index]
     target_gap = target_amount - con_amount
     if target_gap > 0:
         feat_score = patch_amount / target_gap
@@ -360,148 +643,303 @@ def calc_pu_patch_feature_score(target_dict, feat_amount_cons_dict, pu_patch_abu
 
 def return_best_pu(pu_patch_score_dict):
     pu_selection_set = set()
-    pu_id_value = -1
+    pu_index_value = -1
     running_score = 0
-    for pu_id in pu_patch_score_dict:
-        score_value = pu_patch_score_dict[pu_id]
+    for pu_index in pu_patch_score_dict:
+        score_value = pu_patch_score_dict[pu_index]
         if score_value > 0:
-            pu_selection_set.add(pu_id)
-        # If joint equal then always selects first PU in list
-        if score_value > running_score:
+            pu_selection_set.add(pu_index)
+        # If joint equal then always selects the PU that comes first in the pu.dat file
+        if score_value > running_score or (score_value == running_score and pu_index < pu_index_value):
             running_score = score_value
-            pu_id_value = pu_id
-
-    return pu_id_value, pu_selection_set
-
-
-def add_patch(minpatch_data_dict, unit_dict, pu_id_value):
-    add_patch_pu_id_dict = minpatch_data_dict['add_patch_pu_id_dict']
-    init_pu_list = add_patch_pu_id_dict[pu_id_value]
-    pu_list = init_pu_list + [pu_id_value]
-    for a_pu_id_value in pu_list:
-        pu_list = unit_dict[a_pu_id_value]
-        pu_status = pu_list[1]
-        if pu_status == 0:
-            pu_list[1] = 1
-            unit_dict[a_pu_id_value] = pu_list
-    return unit_dict
-
-
-def update_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, unit_dict, pu_selection_list, pu_patch_set_dict, unmet_target_id_list, best_pu_id):
-    abund_matrix_dict = minpatch_data_dict['abund_matrix_dict']
-    best_patch_set = pu_patch_set_dict[best_pu_id]
-
-    for a_patch_centre_pu in pu_selection_list:
-        a_patch_pu_id_set = pu_patch_set_dict[a_patch_centre_pu]
-        set_over_lap = best_patch_set.intersection(a_patch_pu_id_set)
-        if len(set_over_lap) > 0:
-            a_patch_cost = 0
-            for b_pu_id in a_patch_pu_id_set:
-                b_pu_status = unit_dict[b_pu_id][1]
-                b_pu_cost = unit_dict[b_pu_id][0]
-                if b_pu_status == 0:
-                    a_patch_cost += b_pu_cost
-
-            pu_patch_abund_dict = dict()
-            for featID in unmet_target_id_list:
-                feat_patch_amount = 0
-                for c_pu_id in a_patch_pu_id_set:
-                    abund_dict = abund_matrix_dict[c_pu_id]
-                    if unit_dict[c_pu_id][1] == 0 and featID in abund_dict:
-                        abund_amount = abund_dict[featID]
-                        feat_patch_amount += abund_amount
-                if feat_patch_amount > 0:
-                    pu_patch_abund_dict[featID] = feat_patch_amount
-
-            all_pu_patch_abund_dict[a_patch_centre_pu] = [pu_patch_abund_dict, a_patch_cost]
+            pu_index_value = pu_index
+
+    return pu_index_value, pu_selection_set
+
+
+def add_patch(minpatch_data_dict, status_array, pu_index_value):
+    add_patch_matrix = minpatch_data_dict['add_patch_matrix']
+    patch_pu_index_list = add_patch_matrix.row_index_list(pu_index_value) + [pu_index_value]
+    added_pu_index_list = list()
+    for patch_pu_index in patch_pu_index_list:
+        if status_array[patch_pu_index] == 0:
+            status_array[patch_pu_index] = 1
+            added_pu_index_list.append(patch_pu_index)
+    add_mp_profile_count(minpatch_data_dict, 'added_patch_count', 1)
+    add_mp_profile_count(minpatch_data_dict, 'added_pu_count', len(added_pu_index_list))
+
+    return status_array, added_pu_index_list
+
+
+def update_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, status_array, pu_selection_set, pu_patch_set_dict, patch_membership_dict, unmet_target_index_set, best_pu_index):
+    best_patch_set = pu_patch_set_dict[best_pu_index]
+    overlap_candidate_set = set()
+    for a_patch_centre_pu in pu_selection_set:
+        a_patch_pu_index_set = pu_patch_set_dict[a_patch_centre_pu]
+        if not best_patch_set.isdisjoint(a_patch_pu_index_set):
+            overlap_candidate_set.add(a_patch_centre_pu)
+    all_pu_patch_abund_dict = update_candidate_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, status_array, pu_patch_set_dict, patch_membership_dict, unmet_target_index_set, overlap_candidate_set)
 
     return all_pu_patch_abund_dict
 
 
-def run_sim_whittle(setup_object, running_unit_dict, minpatch_data_dict, marxan_file_name):
-    patch_dict = make_mp_patch_dict(running_unit_dict, minpatch_data_dict)
-    raw_edge_pu_id_set = make_edge_pu_id_set(running_unit_dict, minpatch_data_dict)
-    pu_patch_id_dict = make_pu_patch_id_dict(running_unit_dict, patch_dict)
-    feat_amount_cons_dict = make_mp_feat_amount_cons_dict(setup_object, minpatch_data_dict, running_unit_dict)
-    keystone_pu_id_set = set()     # Keystone list is of PUs that can't be removed without affecting patch size or targets
-    costly_pu_id_set = set()  # List of PUs that increases portfolio so shouldn't be removed. PUs REMOVED WHEN NEIGHBOURING PLANNING UNITS ARE WHITTLED.
+def run_sim_whittle(running_status_array, minpatch_data_dict, marxan_file_name):
+    patch_connectivity_dict = make_patch_connectivity_dict(minpatch_data_dict, running_status_array)
+    raw_edge_pu_index_set = make_edge_pu_index_set(running_status_array, minpatch_data_dict)
+    feat_amount_cons_list = make_mp_feat_amount_cons_list(minpatch_data_dict, running_status_array)
+    keystone_pu_index_set = set()     # Keystone list is of PUs that can't be removed without affecting patch size or targets
+    costly_pu_index_set = set()  # List of PUs that increases portfolio so shouldn't be removed. PUs REMOVED WHEN NEIGHBOURING PLANNING UNITS ARE WHITTLED.
 
-    candidate_edge_pu_id_set, keystone_pu_id_set = make_edge_pu_id_sets(minpatch_data_dict, running_unit_dict, patch_dict, pu_patch_id_dict, raw_edge_pu_id_set, keystone_pu_id_set)
+    candidate_edge_pu_index_set, keystone_pu_index_set = make_edge_pu_index_sets(minpatch_data_dict, running_status_array, patch_connectivity_dict, raw_edge_pu_index_set, keystone_pu_index_set)
+    whittle_candidate_dict = make_whittle_candidate_dict(minpatch_data_dict, feat_amount_cons_list, candidate_edge_pu_index_set, keystone_pu_index_set)
 
-    progress_bar = make_progress_bar('Whittling away:' + marxan_file_name)
+    progress_bar = make_mp_progress_bar(minpatch_data_dict, 'Whittling away:' + marxan_file_name)
 
-    whittle_pu_id = 'initialising'
-    while whittle_pu_id != 'blank':
-        whittle_score_dict, keystone_pu_id_set = make_whittle_score_dict_keystone_set(minpatch_data_dict, feat_amount_cons_dict, candidate_edge_pu_id_set, keystone_pu_id_set)
-        whittle_pu_id, keystone_pu_id_set, costly_pu_id_set = return_whittle_pu_id_keystone_set(minpatch_data_dict, running_unit_dict, patch_dict, pu_patch_id_dict, whittle_score_dict, keystone_pu_id_set, costly_pu_id_set)
-        if whittle_pu_id != 'blank':
-            running_unit_dict = remove_whittle_pu(running_unit_dict, whittle_pu_id)
-            feat_amount_cons_dict = make_mp_feat_amount_cons_dict(setup_object, minpatch_data_dict, running_unit_dict)
-            patch_dict = make_mp_patch_dict(running_unit_dict, minpatch_data_dict)
-            pu_patch_id_dict = make_pu_patch_id_dict(running_unit_dict, patch_dict)
+    whittle_pu_index = 'initialising'
+    while whittle_pu_index != 'blank':
+        whittle_pu_index, keystone_pu_index_set, costly_pu_index_set = return_whittle_pu_index_keystone_set(minpatch_data_dict, running_status_array, patch_connectivity_dict, whittle_candidate_dict, keystone_pu_index_set, costly_pu_index_set)
+        if whittle_pu_index != 'blank':
+            running_status_array = remove_whittle_pu(running_status_array, whittle_pu_index)
+            add_mp_profile_count(minpatch_data_dict, 'whittled_pu_count', 1)
+            feat_amount_cons_list, changed_feat_index_list = update_whittle_feat_amount_cons_list(minpatch_data_dict, feat_amount_cons_list, whittle_pu_index)
+            remove_pu_from_patch_connectivity_dict(minpatch_data_dict, patch_connectivity_dict, whittle_pu_index)
+            rescore_whittle_candidates_with_changed_feats(minpatch_data_dict, feat_amount_cons_list, whittle_candidate_dict, keystone_pu_index_set, changed_feat_index_list)
 
-            candidate_edge_pu_id_set.remove(whittle_pu_id)
+            costly_pu_index_set = update_costly_pu_index_set_to_remove_neighb_of_whittle_pu_index(minpatch_data_dict, costly_pu_index_set, whittle_pu_index)
+            excluded_from_candidate_edge_pu_index_set = keystone_pu_index_set.union(costly_pu_index_set)
 
-            costly_pu_id_set = update_costly_pu_id_set_to_remove_neighb_of_whittle_pu_id(minpatch_data_dict, costly_pu_id_set, whittle_pu_id)
-            excluded_from_candidate_edge_pu_id_set = keystone_pu_id_set.union(costly_pu_id_set)
+            neighb_edge_pu_set = make_neighb_edge_pu_set(minpatch_data_dict, running_status_array, excluded_from_candidate_edge_pu_index_set, whittle_pu_index)
+            for neighb_pu_index in neighb_edge_pu_set:
+                if neighb_pu_index not in whittle_candidate_dict['score_dict']:
+                    set_whittle_candidate_score(minpatch_data_dict, feat_amount_cons_list, whittle_candidate_dict, keystone_pu_index_set, neighb_pu_index)
 
-            candidate_edge_pu_id_set = candidate_edge_pu_id_set.difference(excluded_from_candidate_edge_pu_id_set)
-            neighb_edge_pu_set = make_neighb_edge_pu_set(minpatch_data_dict, running_unit_dict, excluded_from_candidate_edge_pu_id_set, whittle_pu_id)
-            candidate_edge_pu_id_set = candidate_edge_pu_id_set.union(neighb_edge_pu_set)
+        set_mp_progress_bar_value(progress_bar, len(costly_pu_index_set) + len(keystone_pu_index_set), len(running_status_array))
 
-        set_progress_bar_value(progress_bar, len(costly_pu_id_set) + len(keystone_pu_id_set), len(running_unit_dict))
+    clear_mp_progress_bar(progress_bar)
+    set_mp_profile_count(minpatch_data_dict, 'keystone_pu_count', len(keystone_pu_index_set))
+    set_mp_profile_count(minpatch_data_dict, 'costly_pu_count', len(costly_pu_index_set))
 
-    clear_progress_bar()
+    return running_status_array
 
-    return running_unit_dict
 
+def update_whittle_feat_amount_cons_list(minpatch_data_dict, feat_amount_cons_list, whittle_pu_index):
+    # Only subtracts the amounts in the whittled PU, as update_mp_feat_amount_cons_list does when PUs are added
+    abund_matrix = minpatch_data_dict['abund_matrix']
+    index_array = abund_matrix.index_array
+    value_array = abund_matrix.value_array
+    decimal_places = minpatch_data_dict['decimal_places']
 
-def update_costly_pu_id_set_to_remove_neighb_of_whittle_pu_id(minpatch_data_dict, costly_pu_id_set, pu_id):
-    bound_matrix_dict = minpatch_data_dict['boundary_matrix_dict']
-    neighb_list = list(bound_matrix_dict[pu_id].keys())
-    neighb_set = set(neighb_list)
+    changed_feat_index_list = list()
+    for pos in abund_matrix.row_range(whittle_pu_index):
+        feat_index = index_array[pos]
+        con_total_amount = feat_amount_cons_list[feat_index]
+        con_total_amount -= value_array[pos]
+        feat_amount_cons_list[feat_index] = round(con_total_amount, decimal_places)
+        changed_feat_index_list.append(feat_index)
 
-    updated_costly_pu_id_set = costly_pu_id_set.difference(neighb_set)
+    return feat_amount_cons_list, changed_feat_index_list
 
-    return updated_costly_pu_id_set
 
+def make_whittle_candidate_dict(minpatch_data_dict, feat_amount_cons_list, edge_pu_index_set, keystone_pu_index_set):
+    whittle_candidate_dict = dict()
+    whittle_candidate_dict['score_dict'] = dict()
+    whittle_candidate_dict['heap'] = list()
+    whittle_candidate_dict['feat_candidate_dict'] = dict()  # The candidates containing each feature, so only those affected by a whittle are re-scored
+    for edge_pu_index in edge_pu_index_set:
+        set_whittle_candidate_score(minpatch_data_dict, feat_amount_cons_list, whittle_candidate_dict, keystone_pu_index_set, edge_pu_index)
 
-def return_whittle_pu_id_keystone_set(mp_data_dict, pu_dict, patch_dict, pu_patch_id_dict, whittle_score_dict, keystone_pu_id_set, costly_pu_id_set):
-    bound_matrix_dict = mp_data_dict['boundary_matrix_dict']
-    whittle_pu_id = 'blank'
-    while whittle_score_dict_not_empty(whittle_score_dict) and whittle_pu_id == 'blank':
-        candidate_pu_id = return_candidate_whittle_pu_id(whittle_score_dict)
-        if removing_pu_increases_marxan_cost(mp_data_dict, pu_dict, bound_matrix_dict, candidate_pu_id):
-            costly_pu_id_set.add(candidate_pu_id)
-            whittle_score_dict.pop(candidate_pu_id)
-        else:
-            if removing_pu_makes_patch_too_small(mp_data_dict, patch_dict, pu_patch_id_dict, candidate_pu_id):
-                keystone_pu_id_set.add(candidate_pu_id)
-                whittle_score_dict.pop(candidate_pu_id)
+    return whittle_candidate_dict
+
+
+def set_whittle_candidate_score(minpatch_data_dict, feat_amount_cons_list, whittle_candidate_dict, keystone_pu_index_set, pu_index):
+    whittle_score = calc_pu_whittle_score(minpatch_data_dict, feat_amount_cons_list, pu_index)
+    if whittle_score == 'PU cannot be whittled, as needed to meet targets':
+        keystone_pu_index_set.add(pu_index)
+        remove_whittle_candidate(minpatch_data_dict, whittle_candidate_dict, pu_index)
+    else:
+        score_dict = whittle_candidate_dict['score_dict']
+        if pu_index not in score_dict:
+            feat_candidate_dict = whittle_candidate_dict['feat_candidate_dict']
+            for feat_index in minpatch_data_dict['abund_matrix'].row_index_list(pu_index):
+                try:
+                    feat_candidate_dict[feat_index].add(pu_index)
+                except KeyError:
+                    feat_candidate_dict[feat_index] = {pu_index}
+        if score_dict.get(pu_index) != whittle_score:
+            score_dict[pu_index] = whittle_score
+            heappush(whittle_candidate_dict['heap'], (whittle_score, pu_index))
+
+
+def remove_whittle_candidate(minpatch_data_dict, whittle_candidate_dict, pu_index):
+    if pu_index in whittle_candidate_dict['score_dict']:
+        whittle_candidate_dict['score_dict'].pop(pu_index)
+        feat_candidate_dict = whittle_candidate_dict['feat_candidate_dict']
+        for feat_index in minpatch_data_dict['abund_matrix'].row_index_list(pu_index):
+            feat_candidate_dict[feat_index].discard(pu_index)
+
+
+def rescore_whittle_candidates_with_changed_feats(minpatch_data_dict, feat_amount_cons_list, whittle_candidate_dict, keystone_pu_index_set, changed_feat_index_list):
+    feat_candidate_dict = whittle_candidate_dict['feat_candidate_dict']
+    rescore_pu_index_set = set()
+    for feat_index in changed_feat_index_list:
+        rescore_pu_index_set.update(feat_candidate_dict.get(feat_index, set()))
+
+    for pu_index in rescore_pu_index_set:
+        set_whittle_candidate_score(minpatch_data_dict, feat_amount_cons_list, whittle_candidate_dict, keystone_pu_index_set, pu_index)
+
+
+def pop_lowest_whittle_candidate(whittle_candidate_dict):
+    # Heap entries are ordered by score then PU index, so joint equal scores select the PU that comes first in the pu.dat file.
+    # Entries left behind when a PU was re-scored or removed are skipped.
+    whittle_heap = whittle_candidate_dict['heap']
+    score_dict = whittle_candidate_dict['score_dict']
+    while len(whittle_heap) > 0:
+        whittle_score, pu_index = heappop(whittle_heap)
+        if pu_index in score_dict and score_dict[pu_index] == whittle_score:
+            return pu_index
+
+    return 'blank'
+
+
+def make_patch_connectivity_dict(minpatch_data_dict, status_array):
+    # Holds the patches in the portfolio, which are updated as PUs are whittled rather than being remade each time
+    patch_connectivity_dict = dict()
+    patch_dict = make_mp_patch_dict(status_array, minpatch_data_dict)
+    patch_connectivity_dict['patch_dict'] = patch_dict
+    patch_connectivity_dict['pu_patch_id_array'] = make_pu_patch_id_array(status_array, patch_dict)
+    patch_connectivity_dict['patch_threshold_dict'] = dict()
+    patch_connectivity_dict['patch_cut_pu_index_set_dict'] = dict()
+    patch_connectivity_dict['next_patch_id'] = len(patch_dict) + 1
+    for patchID in patch_dict:
+        update_patch_connectivity_dict_patch_details(minpatch_data_dict, patch_connectivity_dict, patchID)
+
+    return patch_connectivity_dict
+
+
+def update_patch_connectivity_dict_patch_details(minpatch_data_dict, patch_connectivity_dict, patch_id):
+    patch_dict = patch_connectivity_dict['patch_dict']
+    patch_connectivity_dict['patch_threshold_dict'][patch_id] = calc_patch_size_threshold(minpatch_data_dict['pu_patch_area_array'], patch_dict, patch_id)
+    patch_connectivity_dict['patch_cut_pu_index_set_dict'][patch_id] = make_patch_cut_pu_index_set(minpatch_data_dict['bound_matrix'], patch_dict[patch_id][2])
+
+
+def make_patch_cut_pu_index_set(bound_matrix, patch_pu_index_list):
+    # Finds the PUs that would split the patch if they were removed (articulation points), using an iterative depth first search
+    patch_pu_index_set = set(patch_pu_index_list)
+    cut_pu_index_set = set()
+    root_pu_index = patch_pu_index_list[0]
+    discovery_dict = {root_pu_index: 0}
+    low_dict = {root_pu_index: 0}
+    root_child_count = 0
+    search_stack = [(root_pu_index, -1, iter(bound_matrix.row_index_list(root_pu_index)))]
+
+    while len(search_stack) > 0:
+        pu_index, parent_pu_index, neighb_iterator = search_stack[-1]
+        moved_down_bool = False
+        for neighb_pu_index in neighb_iterator:
+            if neighb_pu_index != pu_index and neighb_pu_index in patch_pu_index_set:
+                if neighb_pu_index not in discovery_dict:
+                    discovery_dict[neighb_pu_index] = len(discovery_dict)
+                    low_dict[neighb_pu_index] = discovery_dict[neighb_pu_index]
+                    if pu_index == root_pu_index:
+                        root_child_count += 1
+                    search_stack.append((neighb_pu_index, pu_index, iter(bound_matrix.row_index_list(neighb_pu_index))))
+                    moved_down_bool = True
+                    break
+                elif neighb_pu_index != parent_pu_index and discovery_dict[neighb_pu_index] < low_dict[pu_index]:
+                    low_dict[pu_index] = discovery_dict[neighb_pu_index]
+
+        if not moved_down_bool:
+            search_stack.pop()
+            if parent_pu_index != -1:
+                if low_dict[pu_index] < low_dict[parent_pu_index]:
+                    low_dict[parent_pu_index] = low_dict[pu_index]
+                if parent_pu_index != root_pu_index and low_dict[pu_index] >= discovery_dict[parent_pu_index]:
+                    cut_pu_index_set.add(parent_pu_index)
+
+    if root_child_count > 1:
+        cut_pu_index_set.add(root_pu_index)
+
+    return cut_pu_index_set
+
+
+def remove_pu_from_patch_connectivity_dict(minpatch_data_dict, patch_connectivity_dict, pu_index):
+    patch_dict = patch_connectivity_dict['patch_dict']
+    pu_patch_id_array = patch_connectivity_dict['pu_patch_id_array']
+    patch_id = pu_patch_id_array[pu_index]
+    pu_patch_id_array[pu_index] = 0
+
+    if len(patch_dict[patch_id][2]) == 1:
+        remove_patch_from_patch_connectivity_dict(patch_connectivity_dict, patch_id)
+    elif pu_index in patch_connectivity_dict['patch_cut_pu_index_set_dict'][patch_id]:
+        remaining_pu_index_set = set(patch_dict[patch_id][2])
+        remaining_pu_index_set.remove(pu_index)
+        remove_patch_from_patch_connectivity_dict(patch_connectivity_dict, patch_id)
+        split_patch_dict = make_patch_dict_from_pu_index_set(minpatch_data_dict, remaining_pu_index_set)
+        for splitPatchID in split_patch_dict:
+            new_patch_id = patch_connectivity_dict['next_patch_id']
+            patch_connectivity_dict['next_patch_id'] += 1
+            patch_dict[new_patch_id] = split_patch_dict[splitPatchID]
+            for patch_pu_index in patch_dict[new_patch_id][2]:
+                pu_patch_id_array[patch_pu_index] = new_patch_id
+            update_patch_connectivity_dict_patch_details(minpatch_data_dict, patch_connectivity_dict, new_patch_id)
+    else:
+        patch_pu_index_list = patch_dict[patch_id][2]
+        patch_pu_index_list.remove(pu_index)
+        patch_area = return_patch_area(minpatch_data_dict['pu_area_array'], patch_pu_index_list)
+        patch_dict[patch_id] = [patch_area, len(patch_pu_index_list), patch_pu_index_list]
+        update_patch_connectivity_dict_patch_details(minpatch_data_dict, patch_connectivity_dict, patch_id)
+
+
+def remove_patch_from_patch_connectivity_dict(patch_connectivity_dict, patch_id):
+    patch_connectivity_dict['patch_dict'].pop(patch_id)
+    patch_connectivity_dict['patch_threshold_dict'].pop(patch_id)
+    patch_connectivity_dict['patch_cut_pu_index_set_dict'].pop(patch_id)
+
+
+def update_costly_pu_index_set_to_remove_neighb_of_whittle_pu_index(minpatch_data_dict, costly_pu_index_set, pu_index):
+    bound_matrix = minpatch_data_dict['bound_matrix']
+    neighb_set = set(bound_matrix.row_index_list(pu_index))
+
+    updated_costly_pu_index_set = costly_pu_index_set.difference(neighb_set)
+
+    return updated_costly_pu_index_set
+
+
+def return_whittle_pu_index_keystone_set(mp_data_dict, status_array, patch_connectivity_dict, whittle_candidate_dict, keystone_pu_index_set, costly_pu_index_set):
+    whittle_pu_index = 'blank'
+    candidate_pu_index = 'initialising'
+    while candidate_pu_index != 'blank' and whittle_pu_index == 'blank':
+        candidate_pu_index = pop_lowest_whittle_candidate(whittle_candidate_dict)
+        if candidate_pu_index != 'blank':
+            remove_whittle_candidate(mp_data_dict, whittle_candidate_dict, candidate_pu_index)
+            add_mp_profile_count(mp_data_dict, 'whittle_candidate_count', 1)
+            if removing_pu_increases_marxan_cost(mp_data_dict, status_array, candidate_pu_index):
+                costly_pu_index_set.add(candidate_pu_index)
+            elif removing_pu_makes_patch_too_small(mp_data_dict, patch_connectivity_dict, candidate_pu_index):
+                keystone_pu_index_set.add(candidate_pu_index)
+            elif removing_pu_splits_into_nonviable_patches(mp_data_dict, patch_connectivity_dict, candidate_pu_index):
+                keystone_pu_index_set.add(candidate_pu_index)
             else:
-                if removing_pu_splits_into_nonviable_patches(mp_data_dict, pu_dict, patch_dict, pu_patch_id_dict, candidate_pu_id):
-                    keystone_pu_id_set.add(candidate_pu_id)
-                    whittle_score_dict.pop(candidate_pu_id)
-                else:
-                    whittle_pu_id = candidate_pu_id
+                whittle_pu_index = candidate_pu_index
 
-    return whittle_pu_id, keystone_pu_id_set, costly_pu_id_set
+    return whittle_pu_index, keystone_pu_index_set, costly_pu_index_set
 
 
-def removing_pu_increases_marxan_cost(minpatch_data_dict, unit_dict, bound_matrix_dict, candidate_pu_id):
+def removing_pu_increases_marxan_cost(minpatch_data_dict, status_array, candidate_pu_index):
     marxan_blm = minpatch_data_dict['bound_cost']
+    bound_matrix = minpatch_data_dict['bound_matrix']
+    index_array = bound_matrix.index_array
+    value_array = bound_matrix.value_array
     pu_increases_marxan_cost_bool = False
 
-    pu_cost = unit_dict[candidate_pu_id][0]
-    neighb_detail_dict = bound_matrix_dict[candidate_pu_id]
-    marx_neighb_list = neighb_detail_dict.keys()
+    pu_cost = minpatch_data_dict['pu_cost_array'][candidate_pu_index]
     edge_score = 0
-    for neighbID in marx_neighb_list:
-        neighb_status = unit_dict[neighbID][1]
+    for pos in bound_matrix.row_range(candidate_pu_index):
+        neighb_status = status_array[index_array[pos]]
         if neighb_status == 1 or neighb_status == 2:
-            edge_score += neighb_detail_dict[neighbID]
+            edge_score += value_array[pos]
         if neighb_status == 0 or neighb_status == 3:
-            edge_score -= neighb_detail_dict[neighbID]
+            edge_score -= value_array[pos]
 
     edge_score *= marxan_blm
     final_edge_score = edge_score  # Removed mention of blmFudgeWeight
@@ -511,148 +949,109 @@ def removing_pu_increases_marxan_cost(minpatch_data_dict, unit_dict, bound_matri
     return pu_increases_marxan_cost_bool
 
 
-def removing_pu_makes_patch_too_small(mp_data_dict, patch_dict, pu_patch_id_dict, pu_id):
-    area_dict = mp_data_dict['area_dict']
-    zone_dict = mp_data_dict['zone_dict']
+def removing_pu_makes_patch_too_small(mp_data_dict, patch_connectivity_dict, pu_index):
     removing_pu_makes_patch_too_small_bool = False
 
-    pu_size = area_dict[pu_id]
-    patch_id = pu_patch_id_dict[pu_id]
-    patch_size = patch_dict[patch_id][0]
-    patch_size_threshold = calc_patch_size_threshold(zone_dict, patch_dict, patch_id)
+    pu_size = mp_data_dict['pu_area_array'][pu_index]
+    patch_id = patch_connectivity_dict['pu_patch_id_array'][pu_index]
+    patch_size = patch_connectivity_dict['patch_dict'][patch_id][0]
+    patch_size_threshold = patch_connectivity_dict['patch_threshold_dict'][patch_id]
     if patch_size - pu_size < patch_size_threshold:
         removing_pu_makes_patch_too_small_bool = True
 
     return removing_pu_makes_patch_too_small_bool
 
 
-def removing_pu_splits_into_nonviable_patches(mp_data_dict, pu_dict, patch_dict, pu_patch_id_dict, candidate_pu_id):
-    zone_dict = mp_data_dict['zone_dict']
+def removing_pu_splits_into_nonviable_patches(mp_data_dict, patch_connectivity_dict, candidate_pu_index):
+    # Only PUs that are cut vertices split their patch. Otherwise the one remaining patch has been checked by removing_pu_makes_patch_too_small
+    pu_patch_area_array = mp_data_dict['pu_patch_area_array']
     removing_pu_splits_into_nonviable_patches_bool = False
 
-    after_split_patch_dict = make_after_split_patch_dict(mp_data_dict, pu_dict, patch_dict, pu_patch_id_dict, candidate_pu_id)
-
-    for patchID in after_split_patch_dict:
-        patch_size_threshold = calc_patch_size_threshold(zone_dict, after_split_patch_dict, patchID)
-        if after_split_patch_dict[patchID][0] < patch_size_threshold:
-            removing_pu_splits_into_nonviable_patches_bool = True
+    patch_id = patch_connectivity_dict['pu_patch_id_array'][candidate_pu_index]
+    if candidate_pu_index in patch_connectivity_dict['patch_cut_pu_index_set_dict'][patch_id]:
+        after_split_patch_dict = make_after_split_patch_dict(mp_data_dict, patch_connectivity_dict, candidate_pu_index)
+        for patchID in after_split_patch_dict:
+            patch_size_threshold = calc_patch_size_threshold(pu_patch_area_array, after_split_patch_dict, patchID)
+            if after_split_patch_dict[patchID][0] < patch_size_threshold:
+                removing_pu_splits_into_nonviable_patches_bool = True
 
     return removing_pu_splits_into_nonviable_patches_bool
 
 
-def make_after_split_patch_dict(mp_data_dict, unit_dict, patch_dict, pu_patch_id_dict, candidate_pu_id):
-    to_split_patch_pu_dict = dict()
-    patch_id = pu_patch_id_dict[candidate_pu_id]
-    patch_pu_id_list = patch_dict[patch_id][2]
-
-    for pu_id in patch_pu_id_list:
-        to_split_patch_pu_dict[pu_id] = unit_dict[pu_id]
-    to_split_patch_pu_dict.pop(candidate_pu_id)
+def make_after_split_patch_dict(mp_data_dict, patch_connectivity_dict, candidate_pu_index):
+    patch_id = patch_connectivity_dict['pu_patch_id_array'][candidate_pu_index]
+    to_split_patch_pu_index_set = set(patch_connectivity_dict['patch_dict'][patch_id][2])
+    to_split_patch_pu_index_set.remove(candidate_pu_index)
 
-    after_split_patch_dict = make_mp_patch_dict(to_split_patch_pu_dict, mp_data_dict)
+    after_split_patch_dict = make_patch_dict_from_pu_index_set(mp_data_dict, to_split_patch_pu_index_set)
 
     return after_split_patch_dict
 
 
-def whittle_score_dict_not_empty(whittle_score_dict):
-    is_whittle_score_dict_not_empty = True
-    if len(whittle_score_dict) == 0:
-        is_whittle_score_dict_not_empty = False
-
-    return is_whittle_score_dict_not_empty
-
-
-def return_candidate_whittle_pu_id(whittle_score_dict):
-    candidate_pu_id = 'blank'
-    candidate_score = 'blank'
-    for pu_id in whittle_score_dict:
-        whittle_score = whittle_score_dict[pu_id]
-        if candidate_pu_id == 'blank' or whittle_score < candidate_score:
-            candidate_score = whittle_score
-            candidate_pu_id = pu_id
-        if whittle_score < candidate_score:
-            candidate_score = whittle_score
-            candidate_pu_id = pu_id
-
-    return candidate_pu_id
-
-
-def make_neighb_edge_pu_set(minpatch_data_dict, unit_dict, keystone_pu_id_set, pu_id):
-    bound_matrix_dict = minpatch_data_dict['boundary_matrix_dict']
-    neighb_list = bound_matrix_dict[pu_id].keys()
+def make_neighb_edge_pu_set(minpatch_data_dict, status_array, keystone_pu_index_set, pu_index):
+    bound_matrix = minpatch_data_dict['bound_matrix']
     neighb_edge_set = set()
-    for neighb_pu_id in neighb_list:
+    for neighb_pu_index in bound_matrix.row_index_list(pu_index):
         neighb_pu_is_on_edge = False
-        if neighb_pu_id not in keystone_pu_id_set and unit_dict[neighb_pu_id][1] == 1:
-            neighb_neighb_list = bound_matrix_dict[neighb_pu_id].keys()
-            for neighb_neighb_pu_id in neighb_neighb_list:
-                neighb_neighb_status = unit_dict[neighb_neighb_pu_id][1]
+        if neighb_pu_index not in keystone_pu_index_set and status_array[neighb_pu_index] == 1:
+            for neighb_neighb_pu_index in bound_matrix.row_index_list(neighb_pu_index):
+                neighb_neighb_status = status_array[neighb_neighb_pu_index]
                 if neighb_neighb_status == 0 or neighb_neighb_status == 3:
                     neighb_pu_is_on_edge = True
             if neighb_pu_is_on_edge:
-                neighb_edge_set.add(neighb_pu_id)
+                neighb_edge_set.add(neighb_pu_index)
 
     return neighb_edge_set
 
 
-def make_edge_pu_id_sets(minpatch_data_dict, pu_dict, patch_dict, pu_patch_id_dict, edge_pu_id_set, keystone_pu_id_set):
-    pre_marxan_unit_dict = minpatch_data_dict['initial_unit_dict']
-    area_dict = minpatch_data_dict['area_dict']
-    zone_dict = minpatch_data_dict['zone_dict']
+def make_edge_pu_index_sets(minpatch_data_dict, status_array, patch_connectivity_dict, edge_pu_index_set, keystone_pu_index_set):
+    pre_marxan_status_array = minpatch_data_dict['pu_status_array']
+    pu_area_array = minpatch_data_dict['pu_area_array']
+    patch_dict = patch_connectivity_dict['patch_dict']
+    pu_patch_id_array = patch_connectivity_dict['pu_patch_id_array']
 
-    viable_edge_pu_id_set = set()
-    for edgePU in edge_pu_id_set:
-        edge_pu_status = pu_dict[edgePU][1]
-        edge_pu_init_status = pre_marxan_unit_dict[edgePU][1]
+    viable_edge_pu_index_set = set()
+    for edgePU in edge_pu_index_set:
+        edge_pu_status = status_array[edgePU]
+        edge_pu_init_status = pre_marxan_status_array[edgePU]
 
         if edge_pu_status == 1 and edge_pu_init_status != 2:
-            edge_pu_area = area_dict[edgePU]
-            edge_pu_patch_id = pu_patch_id_dict[edgePU]
+            edge_pu_area = pu_area_array[edgePU]
+            edge_pu_patch_id = pu_patch_id_array[edgePU]
             patch_area = patch_dict[edge_pu_patch_id][0]
             patch_area_with_pu_removed = patch_area - edge_pu_area
 
-            min_patch_size = lookup_min_size_value_of_patch(zone_dict, patch_dict, edge_pu_patch_id)
+            min_patch_size = patch_connectivity_dict['patch_threshold_dict'][edge_pu_patch_id]
 
-            if edge_pu_status == 1 and patch_area_with_pu_removed >= min_patch_size:
-                viable_edge_pu_id_set.add(edgePU)
-            elif edge_pu_status == 1 and patch_area_with_pu_removed < min_patch_size:
-                keystone_pu_id_set.add(edgePU)
+            if patch_area_with_pu_removed >= min_patch_size:
+                viable_edge_pu_index_set.add(edgePU)
+            else:
+                keystone_pu_index_set.add(edgePU)
 
-    return viable_edge_pu_id_set, keystone_pu_id_set
+    return viable_edge_pu_index_set, keystone_pu_index_set
 
 
-def make_pu_patch_id_dict(unit_dict, patch_dict):
-    pu_patch_id_dict = dict(zip(list(unit_dict.keys()), len(unit_dict) * [0]))
+def make_pu_patch_id_array(status_array, patch_dict):
+    pu_patch_id_array = array('q', [0]) * len(status_array)
     for patchID in patch_dict:
         patch_list = patch_dict[patchID][2]
-        for patch_pu_id in patch_list:
-            pu_patch_id_dict[patch_pu_id] = patchID
-
-    return pu_patch_id_dict
-
-
-def make_whittle_score_dict_keystone_set(minpatch_data_dict, feat_amount_cons_dict, edge_pu_id_set, keystone_pu_id_set):
-    abund_matrix_dict = minpatch_data_dict['abund_matrix_dict']
-    target_dict = minpatch_data_dict['target_dict']
-    whittle_score_dict = dict()
-
-    for edge_pu_id in edge_pu_id_set:
-        whittle_score = calc_pu_whittle_score(abund_matrix_dict, target_dict, feat_amount_cons_dict, edge_pu_id)
-        if whittle_score == 'PU cannot be whittled, as needed to meet targets':
-            keystone_pu_id_set.add(edge_pu_id)
-        else:
-            whittle_score_dict[edge_pu_id] = whittle_score
+        for patch_pu_index in patch_list:
+            pu_patch_id_array[patch_pu_index] = patchID
 
-    return whittle_score_dict, keystone_pu_id_set
+    return pu_patch_id_array
 
 
-def calc_pu_whittle_score(abund_matrix_dict, target_dict, feat_amount_cons_dict, pu_id):
-    pu_abund_dict = abund_matrix_dict[pu_id]
+def calc_pu_whittle_score(minpatch_data_dict, feat_amount_cons_list, pu_index):
+    abund_matrix = minpatch_data_dict['abund_matrix']
+    feat_target_array = minpatch_data_dict['feat_target_array']
+    index_array = abund_matrix.index_array
+    value_array = abund_matrix.value_array
     feat_score_list = list()
-    for aFeat in pu_abund_dict:
-        feat_amount = pu_abund_dict[aFeat]
-        feat_target = target_dict[aFeat][1]
-        feat_con_amount = feat_amount_cons_dict[aFeat]
+    for pos in abund_matrix.row_range(pu_index):
+        feat_index = index_array[pos]
+        feat_amount = value_array[pos]
+        feat_target = feat_target_array[feat_index]
+        feat_con_amount = feat_amount_cons_list[feat_index]
 
         if pu_needed_to_meet_target(feat_target, feat_con_amount, feat_amount):
             feat_score_list.append('Cannot be removed')
@@ -684,229 +1083,58 @@ def pu_needed_to_meet_target(feat_target, feat_con_amount, feat_amount):
     return pu_needed_to_meet_target_bool
 
 
-def make_edge_pu_id_set(unit_dict, minpatch_data_dict):
-    edge_pu_id_set = set()
-    boundary_matrix_dict = minpatch_data_dict['boundary_matrix_dict']
-    for pu_id in unit_dict:
-        if pu_is_on_edge(boundary_matrix_dict, unit_dict, pu_id):
-            edge_pu_id_set.add(pu_id)
+def make_edge_pu_index_set(status_array, minpatch_data_dict):
+    edge_pu_index_set = set()
+    bound_matrix = minpatch_data_dict['bound_matrix']
+    for pu_index in range(len(status_array)):
+        if pu_is_on_edge(bound_matrix, status_array, pu_index):
+            edge_pu_index_set.add(pu_index)
 
-    return edge_pu_id_set
+    return edge_pu_index_set
 
 
-def pu_is_on_edge(boundary_matrix_dict, unit_dict, pu_id):
+def pu_is_on_edge(bound_matrix, status_array, pu_index):
     edge_bool = False
-    pu_status = unit_dict[pu_id][1]
-    if pu_status == 1:
-        neighb_list = boundary_matrix_dict[pu_id].keys()
-        for neighbID in neighb_list:
-            neighb_status = unit_dict[neighbID][1]
+    if status_array[pu_index] == 1:
+        for neighb_pu_index in bound_matrix.row_index_list(pu_index):
+            neighb_status = status_array[neighb_pu_index]
             # Check if neighbour is available, excluded or if PU has edge with itself (ie on edge of planning region)
-            if neighb_status == 0 or neighb_status == 3 or pu_id == neighbID:
+            if neighb_status == 0 or neighb_status == 3 or pu_index == neighb_pu_index:
                 edge_bool = True
 
     return edge_bool
 
 
-def lookup_min_size_value_of_patch(zone_dict, patch_dict, edge_pu_patch_id):
-    patch_pu_id_list = patch_dict[edge_pu_patch_id][2]
-    min_patch_size = -1
+def remove_whittle_pu(status_array, whittle_pu_index):
+    status_array[whittle_pu_index] = 0
 
-    for thePU in patch_pu_id_list:
-        zone_min_patch_size = zone_dict[thePU][1]
-        if min_patch_size == -1:
-            min_patch_size = zone_min_patch_size
-        if min_patch_size < zone_min_patch_size:
-            min_patch_size = zone_min_patch_size
+    return status_array
 
-    return min_patch_size
 
+def add_conserved_pus(running_status_array, minpatch_data_dict):
+    init_status_array = minpatch_data_dict['pu_status_array']
+    for pu_index in range(len(running_status_array)):
+        if init_status_array[pu_index] == 2:
+            running_status_array[pu_index] = 2
 
-def remove_whittle_pu(unit_dict, whittle_pu_id):
-    pu_list = unit_dict[whittle_pu_id]
-    pu_list[1] = 0
-    unit_dict[whittle_pu_id] = pu_list
+    return running_status_array
 
-    return unit_dict
 
+def make_mp_cost_dict(minpatch_data_dict, status_array):
+    portfolio_costs_dict = calc_portfolio_costs(minpatch_data_dict['cost_data_dict'], [status_array])
+    feat_id_array = minpatch_data_dict['feat_id_array']
+    feat_index_list = sorted(range(len(feat_id_array)), key=feat_id_array.__getitem__)
+    abundance_values_list = portfolio_costs_dict['abundance_values'][0].tolist()
+    amount_conserved_list = portfolio_costs_dict['amount_conserved'][0].tolist()
 
-def add_conserved_pus(running_unit_dict, minpatch_data_dict):
-    init_unit_dict = minpatch_data_dict['initial_unit_dict']
-    for puUnitValue in running_unit_dict:
-        if init_unit_dict[puUnitValue][1] == 2:
-            pu_list = running_unit_dict[puUnitValue]
-            pu_list[1] = 2
-            running_unit_dict[puUnitValue] = pu_list
-
-    return running_unit_dict
-
-
-def make_mp_cost_dict(minpatch_data_dict, pu_dict):
     cost_dict = dict()
-
-    abund_matrix_dict = minpatch_data_dict['abund_matrix_dict']
-    target_dict = minpatch_data_dict['target_dict']
-    boundary_matrix_dict = minpatch_data_dict['boundary_matrix_dict']
-    target_list = list(target_dict.keys())
-    target_list.sort()
-
-    abund_values_dict, num_active_pus = make_abund_values_dict_num_active_pus(target_list, abund_matrix_dict, pu_dict)
-    cost_dict['abundance_values_dict'] = abund_values_dict
-    cost_dict['number_active_pus'] = num_active_pus
-
-    total_unit_cost, con_unit_count = calc_unit_costs(pu_dict)
-    cost_dict['total_unit_cost'] = total_unit_cost
-    cost_dict['con_unit_count'] = con_unit_count
-
-    amount_conserved_dict = make_amount_conserved_dictionary(target_list, abund_matrix_dict, pu_dict)
-    cost_dict['amount_conserved_dict'] = amount_conserved_dict
-    cost_dict['total_target_cost'] = make_total_target_cost(amount_conserved_dict, target_dict)
-
-    total_bound_length, total_boundary_cost = make_bound_costs(minpatch_data_dict, boundary_matrix_dict, pu_dict)
-    cost_dict['total_boundary_length'] = total_bound_length
-    cost_dict['total_boundary_cost'] = total_boundary_cost
+    cost_dict['abundance_values_dict'] = dict((feat_id_array[feat_index], abundance_values_list[feat_index]) for feat_index in feat_index_list)
+    cost_dict['number_active_pus'] = int(portfolio_costs_dict['number_active_pus'][0])
+    cost_dict['total_unit_cost'] = float(portfolio_costs_dict['total_unit_cost'][0])
+    cost_dict['con_unit_count'] = int(portfolio_costs_dict['con_unit_count'][0])
+    cost_dict['amount_conserved_dict'] = dict((feat_id_array[feat_index], amount_conserved_list[feat_index]) for feat_index in feat_index_list)
+    cost_dict['total_target_cost'] = float(portfolio_costs_dict['total_target_cost'][0])
+    cost_dict['total_boundary_length'] = float(portfolio_costs_dict['total_boundary_length'][0])
+    cost_dict['total_boundary_cost'] = cost_dict['total_boundary_length'] * minpatch_data_dict['bound_cost']
 
     return cost_dict
-
-
-def make_abund_values_dict_num_active_pus(target_list, abund_matrix_dict, pu_dict):
-    num_active_pus = 0
-    abund_values_dict = dict()
-    for aRow in target_list:
-        abund_values_dict[aRow] = [0, 0, 0, 0]
-
-    for pu_id in abund_matrix_dict:
-        pu_list = pu_dict[pu_id]
-        pu_status = pu_list[1]
-        # Count the number of units that could be selected in the iteration section
-        if pu_status == 0 or pu_status == 1:
-            num_active_pus += 1
-        pu_abund_dict = abund_matrix_dict[pu_id]
-        for aFeature in pu_abund_dict:
-            the_amount = pu_abund_dict[aFeature]
-            feature_list = abund_values_dict[aFeature]
-            running_value = feature_list[pu_status]
-            running_value += the_amount
-            feature_list[pu_status] = running_value
-            abund_values_dict[aFeature] = feature_list
-
-    return abund_values_dict, num_active_pus
-
-
-def calc_unit_costs(pu_dict):
-    total_unit_cost = 0
-    con_unit_count = 0
-    for pu_id in pu_dict:
-        the_list = pu_dict[pu_id]
-        unit_value, unit_status = the_list
-        if unit_status == 1 or unit_status == 2:
-            total_unit_cost += unit_value
-            con_unit_count += 1
-
-    return total_unit_cost, con_unit_count
-
-
-def make_amount_conserved_dictionary(target_list, abund_matrix_dict, unit_dict):
-    amount_conserved_dict = dict()
-
-    for bNum in target_list:
-        amount_conserved_dict[bNum] = 0
-
-    for pu_id in abund_matrix_dict:
-        pu_status = unit_dict[pu_id][1]
-        if pu_status == 1 or pu_status == 2:
-            pu_abund_dict = abund_matrix_dict[pu_id]
-            for featID in pu_abund_dict:
-                feat_amount = pu_abund_dict[featID]
-                con_total_value = amount_conserved_dict[featID]
-                con_total_value += feat_amount
-                amount_conserved_dict[featID] = con_total_value
-
-    return amount_conserved_dict
-
-
-def make_total_target_cost(amount_conserved_dict, target_dict):
-    total_target_cost = 0
-    for featID in amount_conserved_dict:
-        amount_conserved = amount_conserved_dict[featID]
-        target_values_list = target_dict[featID]
-        the_target = target_values_list[1]
-        the_penalty = target_values_list[2]
-        if amount_conserved < the_target:
-            total_target_cost = total_target_cost + the_penalty
-
-    return total_target_cost
-
-
-def make_bound_costs(minpatch_data_dict, boundary_matrix_dict, pu_dict):
-    total_bound_length = calc_mp_total_bound_length(boundary_matrix_dict, pu_dict)
-
-    blm_value = minpatch_data_dict['bound_cost']
-    total_boundary_cost = total_bound_length * blm_value
-
-    return total_bound_length, total_boundary_cost
-
-
-def calc_mp_total_bound_length(boundary_matrix_dict, pu_dict):
-    total_bound_length = 0
-
-    for id1Value in boundary_matrix_dict:
-        pu_bound_dict = boundary_matrix_dict[id1Value]
-        for id2Value in pu_bound_dict:
-            if id2Value >= id1Value:
-                bound_value = pu_bound_dict[id2Value]
-                con_count = 0
-                id1_status_value = pu_dict[id1Value][1]
-                id2_status_value = pu_dict[id2Value][1]
-
-                if id1_status_value == 1 or id1_status_value == 2:
-                    con_count += 1
-                if id2_status_value == 1 or id2_status_value == 2:
-                    con_count += 1
-                if con_count == 1:
-                    total_bound_length += bound_value
-                # Allow for external edges
-                if con_count == 2 and id1Value == id2Value:
-                    total_bound_length += bound_value
-
-    return total_bound_length
-
-
-def marxan_polish_pu_dict(minpatch_data_dictionary_dict, pu_dict, polish_edge_pu_set):
-    bound_matrix_dict = minpatch_data_dictionary_dict['boundary_matrix_dict']
-    marxan_blm = minpatch_data_dictionary_dict['bound_cost']
-    while len(polish_edge_pu_set) > 0:
-        edge_pu = polish_edge_pu_set.pop()
-        neighb_list = list(bound_matrix_dict[edge_pu].keys())
-        for neighbPU in neighb_list:
-            polish_cost = make_polish_cost(pu_dict, bound_matrix_dict, marxan_blm, neighbPU)
-
-            if polish_cost < 0:
-                polish_edge_pu_set.add(neighbPU)
-                neighb_pu_list = pu_dict[neighbPU]
-                neighb_pu_list[1] = 1
-                pu_dict[neighbPU] = neighb_pu_list
-
-    return pu_dict
-
-
-def make_polish_cost(unit_dict, bound_matrix_dict, marxan_blm, neighb_pu_id):
-    neighb_status = unit_dict[neighb_pu_id][1]
-    if neighb_status == 0:
-        neighb_cost = unit_dict[neighb_pu_id][0]
-        neigh_neighb_dict = bound_matrix_dict[neighb_pu_id]
-        neighb_bound_cost = 0
-        for neighNeighbPU in neigh_neighb_dict:
-            neigh_neighb_pu_status = unit_dict[neighNeighbPU][1]
-            neigh_neighb_bound_length = neigh_neighb_dict[neighNeighbPU]
-            if neigh_neighb_pu_status == 1 or neigh_neighb_pu_status == 2:
-                neighb_bound_cost -= neigh_neighb_bound_length
-            if neigh_neighb_pu_status == 0 or neigh_neighb_pu_status == 3:
-                neighb_bound_cost += neigh_neighb_bound_length
-
-        polish_cost = neighb_cost + (neighb_bound_cost * marxan_blm)
-
-    else:
-        polish_cost = 'blank'
-
-    return polish_cost
@@ -0,0 +1,186 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from array import array
+from ast import literal_eval
+from csv import reader
+from hashlib import sha256
+from os import fsync, path, remove, sep
+
+from .cluz_savefile import write_file_by_replacing
+
+
+mp_journal_version = 2
+
+
+def make_mp_journal_path(setup_object, minpatch_object):
+    journal_path = setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName + '_journal.txt'
+
+    return journal_path
+
+
+def make_mp_journal_key(setup_object, minpatch_data_dict):
+    # Changes whenever an input file or a setting that affects the results of each run changes
+    key_hash = sha256()
+    key_hash.update(('version ' + str(mp_journal_version)).encode('utf-8'))
+    for fileName in ['pu.dat', 'spec.dat', 'puvspr2.dat', 'bound.dat', 'minpatch.dat']:
+        key_hash.update(fileName.encode('utf-8'))
+        add_file_to_hash(key_hash, setup_object.input_path + sep + fileName)
+
+    for settingName in ['decimal_places', 'bound_cost', 'rem_small_patch', 'add_patches', 'whittle_polish', 'patch_stats', 'zone_stats']:
+        key_hash.update((settingName + ' ' + repr(minpatch_data_dict[settingName])).encode('utf-8'))
+
+    return key_hash.hexdigest()
+
+
+def make_mp_marxan_file_key(marxan_sol_file_path):
+    key_hash = sha256()
+    add_file_to_hash(key_hash, marxan_sol_file_path)
+
+    return key_hash.hexdigest()
+
+
+def add_file_to_hash(key_hash, file_path):
+    with open(file_path, 'rb') as f:
+        for aBlock in iter(lambda: f.read(1048576), b''):
+            key_hash.update(aBlock)
+
+
+def start_mp_journal(minpatch_data_dict, journal_path, journal_key, marxan_sol_file_list, output_file_path_dict):
+    # Returns the run results of the Marxan files that were finished by an earlier, interrupted analysis with the same settings
+    journal_run_results_dict = dict()
+    journal_entry_list = list()
+    if minpatch_data_dict['resume_runs']:
+        journal_entry_dict = load_mp_journal_entry_dict(journal_path, journal_key)
+        for marxanSolFilePath in marxan_sol_file_list:
+            file_name = path.basename(marxanSolFilePath)
+            if file_name in journal_entry_dict:
+                journal_entry = journal_entry_dict[file_name]
+                run_results_dict = make_run_results_dict_from_mp_journal_entry(minpatch_data_dict, journal_entry, marxanSolFilePath, output_file_path_dict[marxanSolFilePath])
+                if run_results_dict != 'blank':
+                    journal_run_results_dict[file_name] = run_results_dict
+                    journal_entry_list.append(journal_entry)
+
+    # The journal is rewritten with only the entries that are still valid, so an entry cut short by the interruption is dropped
+    write_file_by_replacing(journal_path, lambda temp_journal_path: write_mp_journal_file(temp_journal_path, journal_key, journal_entry_list))
+
+    return journal_run_results_dict
+
+
+def write_mp_journal_file(journal_file_path, journal_key, journal_entry_list):
+    with open(journal_file_path, 'w', encoding='utf-8') as journalFile:
+        journalFile.write(journal_key + '\n')
+        for journalEntry in journal_entry_list:
+            journalFile.write(repr(journalEntry) + '\n')
+
+
+def load_mp_journal_entry_dict(journal_path, journal_key):
+    journal_entry_dict = dict()
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as journalFile:
+            if journalFile.readline().strip() == journal_key:
+                for aLine in journalFile:
+                    try:
+                        journal_entry = literal_eval(aLine)
+                        journal_entry_dict[journal_entry['file_name']] = journal_entry
+                    except (SyntaxError, ValueError, TypeError, KeyError):
+                        pass
+    except (IOError, UnicodeDecodeError):
+        pass
+
+    return journal_entry_dict
+
+
+def load_mp_journal_file_name_set(journal_path):
+    # Names of the Marxan files whose runs were finished by an earlier analysis, whatever its settings
+    journal_file_name_set = set()
+    try:
+        with open(journal_path, 'r', encoding='utf-8') as journalFile:
+            journalFile.readline()
+            for aLine in journalFile:
+                try:
+                    journal_file_name_set.add(literal_eval(aLine)['file_name'])
+                except (SyntaxError, ValueError, TypeError, KeyError):
+                    pass
+    except (IOError, UnicodeDecodeError):
+        pass
+
+    return journal_file_name_set
+
+
+def make_run_results_dict_from_mp_journal_entry(minpatch_data_dict, journal_entry, marxan_sol_file_path, output_file_path):
+    run_results_dict = 'blank'
+    try:
+        if journal_entry['marxan_file_key'] == make_mp_marxan_file_key(marxan_sol_file_path):
+            run_results_dict = dict()
+            run_results_dict['running_status_array'] = load_mp_run_results_status_array(minpatch_data_dict, output_file_path)
+            for keyName in ['cost_dict', 'before_patch_stats_dict', 'after_patch_stats_dict', 'run_zone_stats_dict', 'run_zone_feature_prop_stats_dict', 'profile_dict']:
+                if keyName in journal_entry:
+                    run_results_dict[keyName] = journal_entry[keyName]
+            run_results_dict['continue_bool'] = True
+            run_results_dict['journal_bool'] = True
+    except (IOError, ValueError, KeyError, IndexError):
+        run_results_dict = 'blank'
+
+    return run_results_dict
+
+
+def load_mp_run_results_status_array(minpatch_data_dict, output_file_path):
+    # The run output file only records whether each planning unit is in the final portfolio, which is all that the
+    # best and summed results need, as they treat earmarked units that were already conserved in the same way
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    status_array = array('b', [0]) * len(minpatch_data_dict['pu_id_array'])
+    pu_count = 0
+    with open(output_file_path, 'rt') as f:
+        results_reader = reader(f)
+        next(results_reader)
+        for aRow in results_reader:
+            status_array[pu_index_dict[int(aRow[0])]] = int(aRow[1])
+            pu_count += 1
+    if pu_count != len(status_array):
+        raise ValueError('incomplete run output file')
+
+    return status_array
+
+
+def append_mp_journal_entry(journal_path, marxan_sol_file_path, run_results_dict):
+    # Written after the run output file, so every entry in the journal refers to a complete output file
+    journal_entry = dict()
+    journal_entry['file_name'] = path.basename(marxan_sol_file_path)
+    journal_entry['marxan_file_key'] = make_mp_marxan_file_key(marxan_sol_file_path)
+    cost_dict = run_results_dict['cost_dict']
+    journal_entry['total_cost'] = cost_dict['total_boundary_cost'] + cost_dict['total_unit_cost']
+    journal_entry['cost_dict'] = dict((keyName, cost_dict[keyName]) for keyName in ['total_unit_cost', 'total_boundary_length', 'total_boundary_cost'])
+    for keyName in ['before_patch_stats_dict', 'after_patch_stats_dict', 'run_zone_stats_dict', 'run_zone_feature_prop_stats_dict', 'profile_dict']:
+        if keyName in run_results_dict:
+            journal_entry[keyName] = run_results_dict[keyName]
+
+    with open(journal_path, 'a', encoding='utf-8') as journalFile:
+        journalFile.write(repr(journal_entry) + '\n')
+        journalFile.flush()
+        fsync(journalFile.fileno())
+
+
+def remove_mp_journal(journal_path):
+    # The journal is only needed to resume an interrupted analysis, so it is removed once all the results files are saved
+    try:
+        remove(journal_path)
+    except OSError:
+        pass
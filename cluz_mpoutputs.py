@@ -18,18 +18,20 @@
  ***************************************************************************/
 """
 
+from array import array
 from copy import deepcopy
 from csv import writer
 from os import path
 from statistics import median, StatisticsError
 
 from .cluz_mpfunctions import calc_patch_size_threshold
+from .cluz_mpprofile import make_mp_profile_header_list, make_mp_profile_summary_dict
 
 
 def make_mp_patch_stats_dict(patch_dict, minpatch_data_dict):
-    zone_dict = minpatch_data_dict['zone_dict']
+    pu_patch_area_array = minpatch_data_dict['pu_patch_area_array']
     patch_stats_dict = dict()
-    all_area_list, valid_area_list = make_patch_area_lists(patch_dict, zone_dict)
+    all_area_list, valid_area_list = make_patch_area_lists(patch_dict, pu_patch_area_array)
 
     try:
         median_all_patch = median(all_area_list)
@@ -51,12 +53,12 @@ def make_mp_patch_stats_dict(patch_dict, minpatch_data_dict):
     return patch_stats_dict
 
 
-def make_patch_area_lists(patch_dict, zone_dict):
+def make_patch_area_lists(patch_dict, pu_patch_area_array):
     all_area_list = list()
     valid_area_list = list()
     for patchID in patch_dict:
         patch_area = patch_dict[patchID][0]
-        patch_size_threshold = calc_patch_size_threshold(zone_dict, patch_dict, patchID)
+        patch_size_threshold = calc_patch_size_threshold(pu_patch_area_array, patch_dict, patchID)
 
         all_area_list.append(patch_area)
         if patch_area >= patch_size_threshold:
@@ -92,13 +94,10 @@ def print_mp_patch_list_dict(patch_neighb_list_dict, zone_type_dict, output_path
             output_writer.writerow(line_string_list)
 
 
-def produce_mp_summed_dict(pu_dict):
-    id_list = list(pu_dict.keys())
-    count_list = [0] * len(id_list)
-    init_tuple = zip(id_list, count_list)
-    summed_dict = dict(init_tuple)
+def produce_mp_summed_count_array(minpatch_data_dict):
+    summed_count_array = array('l', [0]) * len(minpatch_data_dict['pu_id_array'])
 
-    return summed_dict
+    return summed_count_array
 
 
 def produce_patch_results_dict(patch_results_dict, a_marxan_sol_file_path, before_patch_stats_dict, after_patch_stats_dict, cost_dict):
@@ -134,10 +133,10 @@ def produce_patch_results_dict(patch_results_dict, a_marxan_sol_file_path, befor
 def make_run_zone_stats_dict(minpatch_data_dict, running_unit_dict):
     area_dictionary = minpatch_data_dict['area_dict']
     zone_dict = minpatch_data_dict['zone_dict']
-    zone_type_dict = minpatch_data_dict['zone_dict']
+    zone_type_dict = minpatch_data_dict['zone_type_dict']
 
     run_zone_stats_dict = dict()
-    for aZone in zone_type_dict:
+    for aZone in sorted(zone_type_dict):  # Same order as the zone columns in the zone stats file
         run_zone_stats_dict[aZone] = [0, 0]
 
     for a_unit in running_unit_dict:
@@ -209,46 +208,42 @@ def make_run_zone_feature_stats_dict(target_dict, abund_matrix_dict, unit_dict,
     return run_zone_feature_stats_dict
 
 
-def update_mp_summed_dict(summed_dict, unit_dict):
-    for pu_id in unit_dict:
-        unit_list = unit_dict[pu_id]
-        unit_status = unit_list[1]
-        if unit_status == 1 or unit_status == 2:
-            initial_count = summed_dict[pu_id]
-            final_count = initial_count + 1
-            summed_dict[pu_id] = final_count
+def update_mp_summed_count_array(summed_count_array, status_array):
+    for pu_index in range(len(status_array)):
+        pu_status = status_array[pu_index]
+        if pu_status == 1 or pu_status == 2:
+            summed_count_array[pu_index] += 1
 
-    return summed_dict
+    return summed_count_array
 
 
-def print_mp_summed_results(summed_dict, summed_file_path):
+def print_mp_summed_results(minpatch_data_dict, summed_count_array, summed_file_path):
+    pu_id_array = minpatch_data_dict['pu_id_array']
     with open(summed_file_path, 'w', newline='', encoding='utf-8') as summedFile:
         summed_results_writer = writer(summedFile)
         header_row = ['planning_unit', 'solution']
         summed_results_writer.writerow(header_row)
 
-        pu_list = list(summed_dict.keys())
-        pu_list.sort()
-        for pu_id in pu_list:
-            summed_results_writer.writerow([pu_id, summed_dict[pu_id]])
+        pu_index_list = sorted(range(len(pu_id_array)), key=pu_id_array.__getitem__)
+        for pu_index in pu_index_list:
+            summed_results_writer.writerow([pu_id_array[pu_index], summed_count_array[pu_index]])
 
 
-def print_mp_run_results(minpatch_data_dict, limbo_best_result_dict, file_path_string):
+def print_mp_run_results(minpatch_data_dict, status_array, file_path_string):
+    pu_id_array = minpatch_data_dict['pu_id_array']
+    pu_status_array = minpatch_data_dict['pu_status_array']
     with open(file_path_string, 'w', newline='', encoding='utf-8') as resultsFile:
         run_results_writer = writer(resultsFile)
         header_row = ['planning_unit', 'solution']
         run_results_writer.writerow(header_row)
 
-        unit_dict = minpatch_data_dict['initial_unit_dict']
-        for unitID in unit_dict:
-            unit_status = unit_dict[unitID][1]
-            unit_limbo_status = limbo_best_result_dict[unitID][1]
-            if unit_status == 2 or unit_limbo_status == 1:
+        for pu_index in range(len(pu_id_array)):
+            if pu_status_array[pu_index] == 2 or status_array[pu_index] == 1:
                 final_unit_status = 1
             else:
                 final_unit_status = 0
 
-            run_results_writer.writerow([unitID, final_unit_status])
+            run_results_writer.writerow([pu_id_array[pu_index], final_unit_status])
 
 
 def print_mp_patch_stats(patch_results_dict, file_path_string):
@@ -264,6 +259,44 @@ def print_mp_patch_stats(patch_results_dict, file_path_string):
             patch_stats_writer.writerow([filenameString] + patch_results_dict[filenameString])
 
 
+def print_mp_profile(profile_results_dict, file_path_string):
+    profile_header_list = make_mp_profile_header_list()
+    with open(file_path_string, 'w', newline='', encoding='utf-8') as profileFile:
+        profile_writer = writer(profileFile)
+        profile_writer.writerow(['File_name'] + profile_header_list)
+
+        for filenameString in profile_results_dict:
+            run_profile_dict = profile_results_dict[filenameString]
+            profile_writer.writerow([filenameString] + [run_profile_dict[headerName] for headerName in profile_header_list])
+
+
+def print_mp_profile_summary(minpatch_data_dict, mp_analysis_dict, file_path_string):
+    profile_summary_dict = make_mp_profile_summary_dict(mp_analysis_dict['profile_results_dict'])
+    with open(file_path_string, 'w', newline='', encoding='utf-8') as profileSummaryFile:
+        profile_summary_writer = writer(profileSummaryFile)
+        profile_summary_writer.writerow(['Measure', 'Total', 'Mean', 'Minimum', 'Maximum'])
+        profile_summary_writer.writerow(['run_count', len(mp_analysis_dict['profile_results_dict']), '', '', ''])
+        profile_summary_writer.writerow(['input_setup_seconds', minpatch_data_dict['setup_seconds'], '', '', ''])
+        profile_summary_writer.writerow(['analysis_seconds', mp_analysis_dict['analysis_seconds'], '', '', ''])
+
+        for headerName in profile_summary_dict:
+            profile_summary_writer.writerow([headerName] + profile_summary_dict[headerName])
+
+
+def print_mp_sweep_results(zone_id_list, sweep_results_list, file_path_string):
+    with open(file_path_string, 'w', newline='', encoding='utf-8') as sweepFile:
+        sweep_writer = writer(sweepFile)
+        header_row = ['Combination', 'BLM']
+        for zoneID in zone_id_list:
+            header_row += ['Zone' + str(zoneID) + '_MinPatchArea', 'Zone' + str(zoneID) + '_Radius']
+        header_row += ['File_name', 'Targets_met', 'PortfolioPUCost', 'PortfolioBoundLength', 'PortfolioBoundCost', 'PortfolioTotalCost']
+        header_row += ['Aft_AllPatchCount', 'Aft_ValidPatchCount', 'Aft_ValidPatchArea', 'Aft_medianValidPatch']
+        sweep_writer.writerow(header_row)
+
+        for resultsRow in sweep_results_list:
+            sweep_writer.writerow(resultsRow)
+
+
 def print_mp_zone_stats(minpatch_data_dict, zone_stats_dict, zone_stats_base_file_name):
     zone_list = list(minpatch_data_dict['zone_type_dict'].keys())
     zone_list.sort()
@@ -273,7 +306,7 @@ def print_mp_zone_stats(minpatch_data_dict, zone_stats_dict, zone_stats_base_fil
         zone_stats_header_list = make_mp_zone_stats_header_list(zone_list)
         zone_stats_writer.writerow(zone_stats_header_list)
     
-        filename_list = zone_stats_dict.keys()
+        filename_list = list(zone_stats_dict.keys())
         filename_list.sort()
     
         for filenameString in filename_list:
@@ -295,7 +328,7 @@ def make_mp_zone_stats_header_list(zone_list):
 
 
 def print_mp_zone_feature_prop_stats(minpatch_data_dict, zone_feature_prop_stats_dict, zone_stats_base_file_name):
-    feat_list = minpatch_data_dict['target_dict'].keys()
+    feat_list = list(minpatch_data_dict['target_dict'].keys())
     feat_list.sort()
 
     zone_feat_stats_header_list = ['File_name']
@@ -314,7 +347,7 @@ def print_mp_zone_feature_prop_stats(minpatch_data_dict, zone_feature_prop_stats
 
 
 def make_mp_zone_feature_output_dict(minpatch_data_dict, feat_list, zone_feature_prop_stats_dict):
-    run_list = zone_feature_prop_stats_dict.keys()
+    run_list = list(zone_feature_prop_stats_dict.keys())
     run_list.sort()
     zone_list = list(minpatch_data_dict['zone_type_dict'].keys())
     zone_feature_output_dict = dict()
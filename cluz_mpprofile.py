@@ -0,0 +1,83 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from time import perf_counter
+
+
+mp_profile_stage_list = ['read', 'remove', 'add', 'whittle', 'results']
+mp_profile_counter_list = ['initial_patch_count', 'flood_fill_count', 'removed_patch_count', 'removed_pu_count', 'added_patch_count', 'added_pu_count', 'whittle_candidate_count', 'whittled_pu_count', 'keystone_pu_count', 'costly_pu_count']
+
+
+def make_mp_run_profile_dict(minpatch_data_dict):
+    if minpatch_data_dict['profile_runs']:
+        run_profile_dict = dict()
+        for stageName in mp_profile_stage_list:
+            run_profile_dict[stageName + '_seconds'] = 0
+        run_profile_dict['run_seconds'] = 0
+        for counterName in mp_profile_counter_list:
+            run_profile_dict[counterName] = 0
+    else:
+        run_profile_dict = 'blank'
+
+    return run_profile_dict
+
+
+def make_mp_profile_header_list():
+    profile_header_list = [stageName + '_seconds' for stageName in mp_profile_stage_list] + ['run_seconds'] + mp_profile_counter_list
+
+    return profile_header_list
+
+
+def start_mp_profile_timer():
+    start_time = perf_counter()
+
+    return start_time
+
+
+def add_mp_profile_time(minpatch_data_dict, stage_name, start_time):
+    run_profile_dict = minpatch_data_dict.get('run_profile_dict', 'blank')  # Data dicts made outside MinPatch runs, eg for the portfolio tools, have no profile
+    if run_profile_dict != 'blank':
+        run_profile_dict[stage_name + '_seconds'] += perf_counter() - start_time
+
+
+def add_mp_profile_count(minpatch_data_dict, counter_name, count_value):
+    run_profile_dict = minpatch_data_dict.get('run_profile_dict', 'blank')
+    if run_profile_dict != 'blank':
+        run_profile_dict[counter_name] += count_value
+
+
+def set_mp_profile_count(minpatch_data_dict, counter_name, count_value):
+    run_profile_dict = minpatch_data_dict.get('run_profile_dict', 'blank')
+    if run_profile_dict != 'blank':
+        run_profile_dict[counter_name] = count_value
+
+
+def make_mp_profile_summary_dict(profile_results_dict):
+    # Holds the total, mean, minimum and maximum of each profile value across the runs
+    profile_summary_dict = dict()
+    run_profile_dict_list = list(profile_results_dict.values())
+    for headerName in make_mp_profile_header_list():
+        value_list = [runProfileDict[headerName] for runProfileDict in run_profile_dict_list]
+        if len(value_list) > 0:
+            profile_summary_dict[headerName] = [sum(value_list), sum(value_list) / len(value_list), min(value_list), max(value_list)]
+        else:
+            profile_summary_dict[headerName] = [0, 0, 0, 0]
+
+    return profile_summary_dict
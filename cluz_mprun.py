@@ -0,0 +1,242 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from os import path, sep
+
+from .cluz_mpfunctions import make_mp_patch_dict, make_mp_cost_dict, rem_small_patches_from_unit_dict
+from .cluz_mpdata import make_mp_unit_dict_view
+from .cluz_mpfunctions import create_mp_running_status_array, add_conserved_pus, run_sim_whittle, add_mp_patches
+from .cluz_mpfunctions import make_mp_feat_id_amount_cons_dict, make_mp_feat_id_set
+from .cluz_mpfunctions import make_mp_progress_bar, set_mp_progress_bar_value, clear_mp_progress_bar
+from .cluz_mpoutputs import make_mp_patch_stats_dict, make_run_zone_feature_prop_stats_dict, print_mp_summed_results
+from .cluz_mpoutputs import produce_mp_summed_count_array, print_mp_patch_stats, update_mp_summed_count_array, print_mp_zone_stats
+from .cluz_mpoutputs import produce_patch_results_dict, print_mp_run_results, print_mp_zone_feature_prop_stats
+from .cluz_mpoutputs import make_run_zone_stats_dict
+from .cluz_mpoutputs import print_mp_profile, print_mp_profile_summary
+from .cluz_mpprofile import make_mp_run_profile_dict, start_mp_profile_timer, add_mp_profile_time, add_mp_profile_count
+from .cluz_mpjournal import make_mp_journal_path, make_mp_journal_key, start_mp_journal, append_mp_journal_entry, remove_mp_journal
+from .cluz_mpsetup import make_mp_marxan_file_list
+from .cluz_processes import return_process_pool_results
+
+
+mp_worker_data_dict = dict()  # Holds the MinPatch data in each worker process, so it is only passed once to each process
+
+
+def run_mp_analysis(setup_object, minpatch_object, minpatch_data_dict):
+    marxan_name_string = minpatch_object.marxanFileName + '_r'
+    marxan_sol_file_list = make_mp_marxan_file_list(setup_object, marxan_name_string)
+    mp_analysis_dict = make_mp_analysis_dict(minpatch_data_dict, marxan_name_string)
+    analysis_start_time = start_mp_profile_timer()
+
+    mp_analysis_dict['journal_path'] = make_mp_journal_path(setup_object, minpatch_object)
+    journal_key = make_mp_journal_key(setup_object, minpatch_data_dict)
+    output_file_path_dict = dict((marxanSolFilePath, make_mp_run_output_file_path(mp_analysis_dict, marxanSolFilePath)) for marxanSolFilePath in marxan_sol_file_list)
+    journal_run_results_dict = start_mp_journal(minpatch_data_dict, mp_analysis_dict['journal_path'], journal_key, marxan_sol_file_list, output_file_path_dict)
+    remaining_file_list = [marxanSolFilePath for marxanSolFilePath in marxan_sol_file_list if path.basename(marxanSolFilePath) not in journal_run_results_dict]
+
+    if minpatch_data_dict['process_count'] > 1 and len(remaining_file_list) > 1:
+        run_mp_marxan_files_in_process_pool(minpatch_data_dict, mp_analysis_dict, marxan_sol_file_list, remaining_file_list, journal_run_results_dict)
+    else:
+        new_run_results_iterator = (run_mp_marxan_file(minpatch_data_dict, marxanSolFilePath) for marxanSolFilePath in remaining_file_list)
+        run_results_iterator = make_mp_run_results_iterator(marxan_sol_file_list, journal_run_results_dict, new_run_results_iterator)
+        add_mp_run_results_to_analysis_dict(minpatch_data_dict, mp_analysis_dict, marxan_sol_file_list, run_results_iterator, 'blank')
+    mp_analysis_dict['analysis_seconds'] = start_mp_profile_timer() - analysis_start_time
+
+    return mp_analysis_dict
+
+
+def make_mp_run_results_iterator(marxan_sol_file_list, journal_run_results_dict, new_run_results_iterator):
+    # Finished runs are reloaded from the journal in their place in the file list, so the results are added in the same order as in an uninterrupted analysis
+    for marxanSolFilePath in marxan_sol_file_list:
+        file_name = path.basename(marxanSolFilePath)
+        if file_name in journal_run_results_dict:
+            yield journal_run_results_dict[file_name]
+        else:
+            yield next(new_run_results_iterator)
+
+
+def make_mp_run_output_file_path(mp_analysis_dict, marxan_sol_file_path):
+    output_file_path = marxan_sol_file_path.replace(mp_analysis_dict['marxan_name_string'], mp_analysis_dict['final_name_string'])
+
+    return output_file_path
+
+
+def make_mp_analysis_dict(minpatch_data_dict, marxan_name_string):
+    mp_analysis_dict = dict()
+    mp_analysis_dict['marxan_name_string'] = marxan_name_string
+    mp_analysis_dict['final_name_string'] = 'mp_' + marxan_name_string
+    mp_analysis_dict['summed_count_array'] = produce_mp_summed_count_array(minpatch_data_dict)
+    mp_analysis_dict['patch_results_dict'] = dict()
+    mp_analysis_dict['zone_stats_dict'] = dict()
+    mp_analysis_dict['zone_feature_prop_stats_dict'] = dict()
+    mp_analysis_dict['profile_results_dict'] = dict()
+    mp_analysis_dict['best_portfolio_cost'] = -1
+    mp_analysis_dict['best_portfolio_status_array'] = 'blank'
+    mp_analysis_dict['continue_bool'] = True
+
+    return mp_analysis_dict
+
+
+def run_mp_marxan_files_in_process_pool(minpatch_data_dict, mp_analysis_dict, marxan_sol_file_list, remaining_file_list, journal_run_results_dict):
+    progress_bar = make_mp_progress_bar(minpatch_data_dict, 'Running MinPatch on ' + str(len(marxan_sol_file_list)) + ' Marxan files')
+    try:
+        return_process_pool_results(minpatch_data_dict['process_count'], init_mp_worker_process, (minpatch_data_dict,), run_mp_marxan_file_in_worker_process, remaining_file_list, lambda new_run_results_iterator: add_mp_run_results_to_analysis_dict(minpatch_data_dict, mp_analysis_dict, marxan_sol_file_list, make_mp_run_results_iterator(marxan_sol_file_list, journal_run_results_dict, new_run_results_iterator), progress_bar))
+    finally:
+        clear_mp_progress_bar(progress_bar)
+
+
+def init_mp_worker_process(minpatch_data_dict):
+    worker_minpatch_data_dict = dict(minpatch_data_dict)
+    worker_minpatch_data_dict['progress_type'] = 'none'
+    mp_worker_data_dict['minpatch_data_dict'] = worker_minpatch_data_dict
+
+
+def run_mp_marxan_file_in_worker_process(marxan_sol_file_path):
+    run_results_dict = run_mp_marxan_file(mp_worker_data_dict['minpatch_data_dict'], marxan_sol_file_path)
+
+    return run_results_dict
+
+
+def run_mp_marxan_file(minpatch_data_dict, marxan_sol_file_path):
+    run_results_dict = dict()
+    continue_bool = True
+    minpatch_data_dict['run_profile_dict'] = make_mp_run_profile_dict(minpatch_data_dict)  # Replaced for each run, and each worker process has its own copy
+    run_start_time = start_mp_profile_timer()
+
+    running_status_array = create_mp_running_status_array(minpatch_data_dict, marxan_sol_file_path)
+    patch_dict = make_mp_patch_dict(running_status_array, minpatch_data_dict)
+    add_mp_profile_count(minpatch_data_dict, 'initial_patch_count', len(patch_dict))
+
+    if minpatch_data_dict['patch_stats']:
+        run_results_dict['before_patch_stats_dict'] = make_mp_patch_stats_dict(patch_dict, minpatch_data_dict)
+    add_mp_profile_time(minpatch_data_dict, 'read', run_start_time)
+
+    if minpatch_data_dict['rem_small_patch']:
+        stage_start_time = start_mp_profile_timer()
+        running_status_array = rem_small_patches_from_unit_dict(minpatch_data_dict, running_status_array, patch_dict, marxan_sol_file_path)
+        add_mp_profile_time(minpatch_data_dict, 'remove', stage_start_time)
+
+    if minpatch_data_dict['add_patches']:
+        stage_start_time = start_mp_profile_timer()
+        running_status_array, feat_amount_cons_list, unmet_target_index_set, continue_bool = add_mp_patches(minpatch_data_dict, running_status_array, marxan_sol_file_path)
+        if len(unmet_target_index_set) > 0:
+            run_results_dict['feat_amount_cons_dict'] = make_mp_feat_id_amount_cons_dict(minpatch_data_dict, feat_amount_cons_list)
+            run_results_dict['unmet_target_id_set'] = make_mp_feat_id_set(minpatch_data_dict, unmet_target_index_set)
+            continue_bool = False
+        add_mp_profile_time(minpatch_data_dict, 'add', stage_start_time)
+
+    if minpatch_data_dict['whittle_polish'] and continue_bool:
+        stage_start_time = start_mp_profile_timer()
+        running_status_array = run_sim_whittle(running_status_array, minpatch_data_dict, marxan_sol_file_path)
+        add_mp_profile_time(minpatch_data_dict, 'whittle', stage_start_time)
+
+    if continue_bool:
+        stage_start_time = start_mp_profile_timer()
+        running_status_array = add_conserved_pus(running_status_array, minpatch_data_dict)
+        if minpatch_data_dict['patch_stats']:
+            patch_dict = make_mp_patch_dict(running_status_array, minpatch_data_dict)
+            run_results_dict['after_patch_stats_dict'] = make_mp_patch_stats_dict(patch_dict, minpatch_data_dict)
+
+        run_results_dict['cost_dict'] = make_mp_cost_dict(minpatch_data_dict, running_status_array)
+        if minpatch_data_dict['zone_stats']:
+            running_unit_dict = make_mp_unit_dict_view(minpatch_data_dict, running_status_array)
+            run_results_dict['run_zone_stats_dict'] = make_run_zone_stats_dict(minpatch_data_dict, running_unit_dict)
+            run_results_dict['run_zone_feature_prop_stats_dict'] = make_run_zone_feature_prop_stats_dict(minpatch_data_dict, running_unit_dict)
+        add_mp_profile_time(minpatch_data_dict, 'results', stage_start_time)
+
+    add_mp_profile_time(minpatch_data_dict, 'run', run_start_time)
+    if minpatch_data_dict['run_profile_dict'] != 'blank':
+        run_results_dict['profile_dict'] = minpatch_data_dict['run_profile_dict']
+    run_results_dict['running_status_array'] = running_status_array
+    run_results_dict['continue_bool'] = continue_bool
+
+    return run_results_dict
+
+
+def add_mp_run_results_to_analysis_dict(minpatch_data_dict, mp_analysis_dict, marxan_sol_file_list, run_results_iterator, progress_bar):
+    run_count = 1
+    for marxanSolFilePath, run_results_dict in zip(marxan_sol_file_list, run_results_iterator):
+        set_mp_progress_bar_value(progress_bar, run_count, len(marxan_sol_file_list))
+        run_count += 1
+
+        if run_results_dict['continue_bool'] is False:
+            error_file_name = marxanSolFilePath.replace(mp_analysis_dict['marxan_name_string'], mp_analysis_dict['final_name_string']).replace('.txt', '_errror.csv')
+            mp_analysis_dict['error_file_name'] = error_file_name
+            mp_analysis_dict['feat_amount_cons_dict'] = run_results_dict['feat_amount_cons_dict']
+            mp_analysis_dict['unmet_target_id_set'] = run_results_dict['unmet_target_id_set']
+            mp_analysis_dict['continue_bool'] = False
+            break
+
+        update_mp_analysis_dict_with_run_results(minpatch_data_dict, mp_analysis_dict, marxanSolFilePath, run_results_dict)
+
+
+def update_mp_analysis_dict_with_run_results(minpatch_data_dict, mp_analysis_dict, marxan_sol_file_path, run_results_dict):
+    running_status_array = run_results_dict['running_status_array']
+    cost_dict = run_results_dict['cost_dict']
+
+    if 'journal_bool' not in run_results_dict:
+        output_file_path = make_mp_run_output_file_path(mp_analysis_dict, marxan_sol_file_path)
+        print_mp_run_results(minpatch_data_dict, running_status_array, output_file_path)
+        append_mp_journal_entry(mp_analysis_dict['journal_path'], marxan_sol_file_path, run_results_dict)
+
+    if minpatch_data_dict['patch_stats']:
+        before_patch_stats_dict = run_results_dict['before_patch_stats_dict']
+        after_patch_stats_dict = run_results_dict['after_patch_stats_dict']
+        produce_patch_results_dict(mp_analysis_dict['patch_results_dict'], marxan_sol_file_path, before_patch_stats_dict, after_patch_stats_dict, cost_dict)
+
+    if minpatch_data_dict['zone_stats']:
+        zone_name_string = path.basename(marxan_sol_file_path)
+        mp_analysis_dict['zone_stats_dict'][zone_name_string] = run_results_dict['run_zone_stats_dict']
+        mp_analysis_dict['zone_feature_prop_stats_dict'][zone_name_string] = run_results_dict['run_zone_feature_prop_stats_dict']
+
+    if 'profile_dict' in run_results_dict:
+        mp_analysis_dict['profile_results_dict'][path.basename(marxan_sol_file_path)] = run_results_dict['profile_dict']
+
+    total_cost = cost_dict['total_boundary_cost'] + cost_dict['total_unit_cost']
+    if mp_analysis_dict['best_portfolio_cost'] == -1 or total_cost < mp_analysis_dict['best_portfolio_cost']:
+        mp_analysis_dict['best_portfolio_cost'] = total_cost
+        # Each run makes its own status array and never changes it after returning it, so the best one is kept without copying
+        mp_analysis_dict['best_portfolio_status_array'] = running_status_array
+
+    update_mp_summed_count_array(mp_analysis_dict['summed_count_array'], running_status_array)
+
+
+def print_mp_final_results(setup_object, minpatch_object, minpatch_data_dict, mp_analysis_dict):
+    base_file_name = setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName
+    best_file_name = base_file_name + '_best.txt'
+    print_mp_run_results(minpatch_data_dict, mp_analysis_dict['best_portfolio_status_array'], best_file_name)
+
+    summed_file_name = base_file_name + '_summed.txt'
+    print_mp_summed_results(minpatch_data_dict, mp_analysis_dict['summed_count_array'], summed_file_name)
+
+    if minpatch_data_dict['patch_stats']:
+        print_mp_patch_stats(mp_analysis_dict['patch_results_dict'], base_file_name + '_patchstats.csv')
+
+    if minpatch_data_dict['zone_stats']:
+        print_mp_zone_stats(minpatch_data_dict, mp_analysis_dict['zone_stats_dict'], base_file_name)
+        print_mp_zone_feature_prop_stats(minpatch_data_dict, mp_analysis_dict['zone_feature_prop_stats_dict'], base_file_name)
+
+    if minpatch_data_dict['profile_runs']:
+        print_mp_profile(mp_analysis_dict['profile_results_dict'], base_file_name + '_profile.csv')
+        print_mp_profile_summary(minpatch_data_dict, mp_analysis_dict, base_file_name + '_profilesummary.csv')
+
+    remove_mp_journal(mp_analysis_dict['journal_path'])
+
+    return best_file_name, summed_file_name
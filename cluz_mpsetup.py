@@ -18,106 +18,136 @@
  ***************************************************************************/
 """
 
+from array import array
 from os import listdir, path, sep
 from math import sqrt
 from csv import reader
 
-from .cluz_messages import run_yes_cancel_warning_dialog_box, clear_progress_bar, make_progress_bar, warning_message
-from .cluz_messages import set_progress_bar_value
-from .cluz_mpfunctions import pu_status_does_not_equal_excluded
+from .cluz_costs import make_cost_data_dict
+from .cluz_mpcache import load_patch_pu_id_cache, make_patch_pu_id_fingerprint, patch_pu_id_cache_is_valid, write_patch_pu_id_cache
+from .cluz_mpdata import add_mp_dict_views_to_minpatch_data_dict, make_csr_matrix
+from .cluz_mpfunctions import clear_mp_progress_bar, make_mp_progress_bar, mp_warning_message, pu_status_does_not_equal_excluded
+from .cluz_mpfunctions import run_mp_yes_cancel_warning, set_mp_progress_bar_value
+from .cluz_mpjournal import load_mp_journal_file_name_set, make_mp_journal_path
 from .cluz_mpoutputs import print_mp_patch_list_dict
+from .cluz_mpprofile import start_mp_profile_timer
+from .cluz_processes import return_process_pool_results
 
 
-def make_minpatch_data_dict(setup_object, minpatch_object):
-    minpatch_data_dict = dict()
-    input_path = setup_object.input_path
-    setup_ok_bool = True
+patch_pu_id_range_size = 1000  # Number of PUs in each block of patch lists that is sent to a worker process
+patch_pu_id_worker_data_dict = dict()  # Holds the data needed to make the patch lists in each worker process
 
-    pu_dict, xy_loc_dictionary = make_mp_pu_dicts(input_path + sep + 'pu.dat')
-    minpatch_data_dict['initial_unit_dict'] = pu_dict
-    minpatch_data_dict['xy_loc_dict'] = xy_loc_dictionary
 
-    target_dict = make_mp_target_dict(input_path + sep + 'spec.dat')
-    minpatch_data_dict['target_dict'] = make_mp_target_dict(input_path + sep + 'spec.dat')
+class MinPatchObject:
+    def __init__(self):
+        self.setupStatus = 'blank'  # Can be 'values_set', 'values_checked' or 'files_checked'
+        self.processCount = 1  # Marxan files and patchPUID.dat lines are processed one after another unless more than one process is specified
+        self.usePatchPuIdCacheBool = True  # Patch lists are stored in patchPUID.bin, which is remade when the input files or radii change
+        self.exportPatchPuIdTextBool = True  # Also saves the patch lists as the patchPUID.dat text file
+        self.patchSelectionEngine = 'heap'  # Can be 'heap' or 'scan', which re-scores every candidate patch each time a patch is added
+        self.progressType = 'qgis'  # Can be 'qgis' or 'stderr', which reports progress and warnings as text when MinPatch is run from the command line
+        self.acceptWarningsBool = False  # Answer given to warnings that ask whether to continue when there is no QGIS interface
+        self.patchAbundanceEngine = 'sparse'  # Can be 'sparse' or 'dict', which sums the abundances of each candidate patch in a Python loop
+        self.profileBool = False  # Also saves the time taken by each stage of each run, with counts of the patches and PUs processed
+        self.resumeBool = True  # Runs recorded in the journal by an interrupted analysis with the same inputs and settings are reloaded rather than repeated
 
-    abund_matrix_dict = make_mp_abund_matrix_dict(input_path + sep + 'puvspr2.dat', target_dict, pu_dict)
-    minpatch_data_dict['abund_matrix_dict'] = abund_matrix_dict
 
-    bound_matrix_dict = make_bound_matrix_dict(input_path + sep + 'bound.dat', pu_dict)
-    minpatch_data_dict['boundary_matrix_dict'] = bound_matrix_dict
+def make_minpatch_data_dict(setup_object, minpatch_object):
+    minpatch_data_dict = dict()
+    setup_start_time = start_mp_profile_timer()
+    input_path = setup_object.input_path
+    setup_ok_bool = True
+    minpatch_data_dict['decimal_places'] = setup_object.decimal_places
+    minpatch_data_dict['progress_type'] = minpatch_object.progressType
+    minpatch_data_dict['accept_warnings'] = minpatch_object.acceptWarningsBool
 
-    area_dict, zone_dict, zone_type_dict = make_mp_dicts(input_path + sep + 'minpatch.dat')
-    minpatch_data_dict['area_dict'] = area_dict
-    minpatch_data_dict['zone_dict'] = zone_dict
-    minpatch_data_dict['zone_type_dict'] = zone_type_dict
+    minpatch_data_dict, zone_type_dict, pu_id_values_match_bool = add_mp_input_data(minpatch_data_dict, input_path)
     if len(zone_type_dict) > 1:
         minpatch_object.zonestats_bool = True
     else:
         minpatch_object.zonestats_bool = False
 
-    setup_ok_bool = check_mp_pu_id_values_match(pu_dict, zone_dict, setup_ok_bool)
+    setup_ok_bool = check_mp_pu_id_values_match(minpatch_data_dict, pu_id_values_match_bool, setup_ok_bool)
     files_to_be_created_list = make_mp_files_to_be_created_list(setup_object, minpatch_object, zone_type_dict)
-    setup_ok_bool = check_mp_overwrite_existing_files(files_to_be_created_list, setup_ok_bool)
-    setup_ok_bool = check_mp_files_can_be_saved(files_to_be_created_list, setup_ok_bool)
-    setup_ok_bool = check_mp_patch_pu_id_file(setup_object, minpatch_data_dict, setup_ok_bool)
+    setup_ok_bool = check_mp_overwrite_existing_files(minpatch_data_dict, make_mp_files_to_be_overwritten_list(setup_object, minpatch_object, files_to_be_created_list), setup_ok_bool)
+    setup_ok_bool = check_mp_files_can_be_saved(minpatch_data_dict, files_to_be_created_list + [make_mp_journal_path(setup_object, minpatch_object)], setup_ok_bool)
+    setup_ok_bool = check_mp_patch_pu_id_file(setup_object, minpatch_object, minpatch_data_dict, setup_ok_bool)
     if setup_ok_bool:
-        add_patch_pu_id_dict = make_mp_patch_pu_id_dict(setup_object, minpatch_data_dict)
-        minpatch_data_dict['add_patch_pu_id_dict'] = add_patch_pu_id_dict
+        minpatch_data_dict['add_patch_matrix'] = make_mp_add_patch_matrix(setup_object, minpatch_object, minpatch_data_dict)
         minpatch_data_dict = update_minpatch_data_dict_with_parameters(minpatch_object, minpatch_data_dict)
+        minpatch_data_dict['setup_seconds'] = start_mp_profile_timer() - setup_start_time
 
     return minpatch_data_dict, setup_ok_bool
 
 
-def check_mp_pu_id_values_match(pu_dict, zone_dict, setup_ok_bool):
+def add_mp_input_data(minpatch_data_dict, input_path):
+    minpatch_data_dict = add_mp_pu_arrays(minpatch_data_dict, input_path + sep + 'pu.dat')
+
+    target_dict = make_mp_target_dict(input_path + sep + 'spec.dat')
+    minpatch_data_dict['target_dict'] = target_dict
+    minpatch_data_dict = add_mp_feat_arrays(minpatch_data_dict, target_dict)
+
+    minpatch_data_dict['abund_matrix'] = make_mp_abund_matrix(input_path + sep + 'puvspr2.dat', minpatch_data_dict)
+    minpatch_data_dict['bound_matrix'] = make_mp_bound_matrix(input_path + sep + 'bound.dat', minpatch_data_dict)
+    minpatch_data_dict['cost_data_dict'] = make_mp_cost_data_dict(minpatch_data_dict)
+
+    zone_type_dict, pu_id_values_match_bool = add_mp_zone_arrays(minpatch_data_dict, input_path + sep + 'minpatch.dat')
+    minpatch_data_dict['zone_type_dict'] = zone_type_dict
+    minpatch_data_dict = add_mp_dict_views_to_minpatch_data_dict(minpatch_data_dict)
+
+    return minpatch_data_dict, zone_type_dict, pu_id_values_match_bool
+
+
+def check_mp_pu_id_values_match(minpatch_data_dict, pu_id_values_match_bool, setup_ok_bool):
     if setup_ok_bool:
-        if zone_dict.keys() != pu_dict.keys():
-            warning_message('Input files error: ', 'the planning unit ID values in the unit.dat and MinPatch details file do not match, so MinPatch has been terminated.')
+        if pu_id_values_match_bool is False:
+            mp_warning_message(minpatch_data_dict, 'Input files error: ', 'the planning unit ID values in the unit.dat and MinPatch details file do not match, so MinPatch has been terminated.')
             setup_ok_bool = False
         
     return setup_ok_bool
 
 
-def check_mp_overwrite_existing_files(files_to_be_created_list, setup_ok_bool):
+def check_mp_overwrite_existing_files(minpatch_data_dict, files_to_be_created_list, setup_ok_bool):
     if setup_ok_bool:
         output_files_already_exist_bool = False
         for filePath in files_to_be_created_list:
-            if path.isfile(filePath):
+            if path.isfile(filePath) and path.getsize(filePath) > 0:  # Empty files are left by the check that the files can be saved
                 output_files_already_exist_bool = True
         if output_files_already_exist_bool:
-            warning_value = run_yes_cancel_warning_dialog_box('Overwrite files?', 'This will overwrite the existing files from a previous MinPatch analysis of the same Marxan files. Do you want to continue?')
+            warning_value = run_mp_yes_cancel_warning(minpatch_data_dict, 'Overwrite files?', 'This will overwrite the existing files from a previous MinPatch analysis of the same Marxan files. Do you want to continue?')
             if warning_value is False:
                 setup_ok_bool = False
 
     return setup_ok_bool
 
 
-def check_mp_files_can_be_saved(files_to_be_created_list, setup_ok_bool):
+def check_mp_files_can_be_saved(minpatch_data_dict, files_to_be_created_list, setup_ok_bool):
     if setup_ok_bool:
         output_files_cannot_be_saved_bool = False
         try:
             for filePath in files_to_be_created_list:
-                with open(filePath, 'wb') as f:
+                with open(filePath, 'ab') as f:  # Appending leaves the run files kept for resuming an analysis intact
                     reader(f)
         except IOError:
             output_files_cannot_be_saved_bool = True
 
         if output_files_cannot_be_saved_bool:
-            warning_message('Output files error: ', 'at least one of the required output files cannot be created. Please check that you have permission to write files in the specified output folder and that a file with the same name is not already open.')
+            mp_warning_message(minpatch_data_dict, 'Output files error: ', 'at least one of the required output files cannot be created. Please check that you have permission to write files in the specified output folder and that a file with the same name is not already open.')
             setup_ok_bool = False
 
     return setup_ok_bool
 
 
-def check_mp_patch_pu_id_file(setup_object, minpatch_data_dict, setup_ok_bool):
+def check_mp_patch_pu_id_file(setup_object, minpatch_object, minpatch_data_dict, setup_ok_bool):
     if setup_ok_bool:
-        make_new_patch_pu_id_files_bool = check_patch_pu_id_file(setup_object, minpatch_data_dict)
+        make_new_patch_pu_id_files_bool = check_patch_pu_id_file(setup_object, minpatch_object, minpatch_data_dict)
         if make_new_patch_pu_id_files_bool:
             if radius_values_very_high(minpatch_data_dict):
-                response_value = run_yes_cancel_warning_dialog_box('Radius values very high', 'At least one of the radius values specified in the MinPatch details file is more than 25% of the approximate height and/or width of the planning region. This could produce very large patches and make MinPatch run very slowly. Is that OK?')
+                response_value = run_mp_yes_cancel_warning(minpatch_data_dict, 'Radius values very high', 'At least one of the radius values specified in the MinPatch details file is more than 25% of the approximate height and/or width of the planning region. This could produce very large patches and make MinPatch run very slowly. Is that OK?')
                 if response_value is False:
                     setup_ok_bool = False
             if setup_ok_bool:
-                create_patch_pu_id_text_file(setup_object, minpatch_data_dict)
+                create_patch_pu_id_files(setup_object, minpatch_object, minpatch_data_dict)
 
     return setup_ok_bool
 
@@ -129,6 +159,11 @@ def update_minpatch_data_dict_with_parameters(minpatch_object, minpatch_data_dic
     minpatch_data_dict['whittle_polish'] = minpatch_object.whittleBool
     minpatch_data_dict['patch_stats'] = True
     minpatch_data_dict['zone_stats'] = minpatch_object.zonestats_bool
+    minpatch_data_dict['process_count'] = minpatch_object.processCount
+    minpatch_data_dict['patch_selection_engine'] = minpatch_object.patchSelectionEngine
+    minpatch_data_dict['resume_runs'] = minpatch_object.resumeBool
+    minpatch_data_dict['profile_runs'] = minpatch_object.profileBool
+    minpatch_data_dict['patch_abundance_engine'] = minpatch_object.patchAbundanceEngine
 
     return minpatch_data_dict
 
@@ -138,6 +173,9 @@ def make_mp_files_to_be_created_list(setup_object, minpatch_object, zone_type_di
     best_file_path = setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName + '_best.txt'
     summed_file_path = setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName + '_summed.txt'
     files_to_be_created_list = [patch_stats_file_path, best_file_path, summed_file_path]
+    if minpatch_object.profileBool:
+        files_to_be_created_list.append(setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName + '_profile.csv')
+        files_to_be_created_list.append(setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName + '_profilesummary.csv')
 
     marxan_name_string = minpatch_object.marxanFileName + '_r'
     final_name_string = 'mp_' + marxan_name_string
@@ -158,6 +196,19 @@ def make_mp_files_to_be_created_list(setup_object, minpatch_object, zone_type_di
     return files_to_be_created_list
 
 
+def make_mp_files_to_be_overwritten_list(setup_object, minpatch_object, files_to_be_created_list):
+    # When resuming, the run files finished by the interrupted analysis are kept or remade by MinPatch itself, so they don't need the user's OK
+    files_to_be_overwritten_list = files_to_be_created_list
+    if minpatch_object.resumeBool:
+        marxan_name_string = minpatch_object.marxanFileName + '_r'
+        final_name_string = 'mp_' + marxan_name_string
+        journal_file_name_set = load_mp_journal_file_name_set(make_mp_journal_path(setup_object, minpatch_object))
+        resumed_file_path_set = set(path.normpath(setup_object.output_path + sep + fileName.replace(marxan_name_string, final_name_string)) for fileName in journal_file_name_set)
+        files_to_be_overwritten_list = [filePath for filePath in files_to_be_created_list if filePath not in resumed_file_path_set]
+
+    return files_to_be_overwritten_list
+
+
 def make_mp_marxan_file_list(setup_object, marxan_name_string):
     marxan_file_list = list()
     raw_list = listdir(setup_object.output_path)
@@ -166,28 +217,63 @@ def make_mp_marxan_file_list(setup_object, marxan_name_string):
             b_string = setup_object.output_path + sep + a_string
             c_string = path.normpath(b_string)
             marxan_file_list.append(c_string)
+    marxan_file_list.sort()  # Runs are always analysed in the same order, so an interrupted analysis can be resumed
 
     return marxan_file_list
 
 
-def make_mp_pu_dicts(pu_loc_string):
-    unit_dict = dict()
-    xy_loc_dictionary = dict()
+def add_mp_pu_arrays(minpatch_data_dict, pu_loc_string):
+    pu_id_array = array('q')
+    pu_cost_array = array('d')
+    pu_status_array = array('b')
+    pu_x_array = array('d')
+    pu_y_array = array('d')
+    pu_index_dict = dict()
 
     with open(pu_loc_string, 'rt') as f:
         pu_reader = reader(f)
         next(pu_reader)
         for aRow in pu_reader:
             pu_id = int(aRow[0])
-            pu_cost = float(aRow[1])
-            pu_status = int(aRow[2])
-            x_loc = float(aRow[3])
-            y_loc = float(aRow[4])
+            pu_index_dict[pu_id] = len(pu_id_array)
+            pu_id_array.append(pu_id)
+            pu_cost_array.append(float(aRow[1]))
+            pu_status_array.append(int(aRow[2]))
+            pu_x_array.append(float(aRow[3]))
+            pu_y_array.append(float(aRow[4]))
+
+    minpatch_data_dict['pu_id_array'] = pu_id_array
+    minpatch_data_dict['pu_index_dict'] = pu_index_dict
+    minpatch_data_dict['pu_cost_array'] = pu_cost_array
+    minpatch_data_dict['pu_status_array'] = pu_status_array
+    minpatch_data_dict['pu_x_array'] = pu_x_array
+    minpatch_data_dict['pu_y_array'] = pu_y_array
+
+    return minpatch_data_dict
 
-            unit_dict[pu_id] = [pu_cost, pu_status]
-            xy_loc_dictionary[pu_id] = [pu_status, x_loc, y_loc]
 
-    return unit_dict, xy_loc_dictionary
+def add_mp_feat_arrays(minpatch_data_dict, target_dict):
+    feat_id_array = array('q')
+    feat_target_array = array('d')
+    feat_index_dict = dict()
+    for feat_id in target_dict:
+        feat_index_dict[feat_id] = len(feat_id_array)
+        feat_id_array.append(feat_id)
+        feat_target_array.append(target_dict[feat_id][1])
+
+    minpatch_data_dict['feat_id_array'] = feat_id_array
+    minpatch_data_dict['feat_index_dict'] = feat_index_dict
+    minpatch_data_dict['feat_target_array'] = feat_target_array
+
+    return minpatch_data_dict
+
+
+def make_mp_cost_data_dict(minpatch_data_dict):
+    target_dict = minpatch_data_dict['target_dict']
+    feat_penalty_list = [target_dict[feat_id][2] for feat_id in minpatch_data_dict['feat_id_array']]
+    cost_data_dict = make_cost_data_dict(minpatch_data_dict['pu_id_array'], minpatch_data_dict['pu_cost_array'], minpatch_data_dict['bound_matrix'], minpatch_data_dict['abund_matrix'], minpatch_data_dict['feat_id_array'], minpatch_data_dict['feat_target_array'], feat_penalty_list)
+
+    return cost_data_dict
 
 
 def make_mp_target_dict(target_loc_string):
@@ -209,10 +295,16 @@ def make_mp_target_dict(target_loc_string):
     return target_dict
 
 
-def make_mp_dicts(details_dat_path):
-    area_dictionary = dict()
-    zone_dict = dict()
+def add_mp_zone_arrays(minpatch_data_dict, details_dat_path):
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    pu_count = len(pu_index_dict)
+    pu_area_array = array('d', [0]) * pu_count
+    pu_zone_array = array('q', [0]) * pu_count
+    pu_patch_area_array = array('d', [0]) * pu_count
+    pu_radius_array = array('d', [0]) * pu_count
     zone_type_dict = dict()
+    details_pu_id_set = set()
+    pu_id_values_match_bool = True
 
     with open(details_dat_path, 'rt') as f:
         zone_reader = reader(f)
@@ -224,14 +316,42 @@ def make_mp_dicts(details_dat_path):
             zone_patch_area_value = float(aRow[3])
             zone_radius_value = float(aRow[4])
 
-            area_dictionary[pu_id] = area_value
-            zone_dict[pu_id] = [zone_id, zone_patch_area_value, zone_radius_value]
             zone_type_dict[zone_id] = [zone_patch_area_value, zone_radius_value]
+            details_pu_id_set.add(pu_id)
+            try:
+                pu_index = pu_index_dict[pu_id]
+                pu_area_array[pu_index] = area_value
+                pu_zone_array[pu_index] = zone_id
+                pu_patch_area_array[pu_index] = zone_patch_area_value
+                pu_radius_array[pu_index] = zone_radius_value
+            except KeyError:
+                pu_id_values_match_bool = False
+
+    if len(details_pu_id_set) != pu_count:
+        pu_id_values_match_bool = False
+
+    minpatch_data_dict['pu_area_array'] = pu_area_array
+    minpatch_data_dict['pu_zone_array'] = pu_zone_array
+    minpatch_data_dict['pu_patch_area_array'] = pu_patch_area_array
+    minpatch_data_dict['pu_radius_array'] = pu_radius_array
+
+    return zone_type_dict, pu_id_values_match_bool
+
+
+def check_patch_pu_id_file(setup_object, minpatch_object, minpatch_data_dict):
+    if minpatch_object.usePatchPuIdCacheBool:
+        minpatch_data_dict['patch_pu_id_fingerprint'] = make_patch_pu_id_fingerprint(setup_object.input_path, minpatch_data_dict['zone_type_dict'])
+        patch_pu_id_cache_path = setup_object.input_path + sep + 'patchPUID.bin'
+        make_new_patch_pu_id_files_bool = not patch_pu_id_cache_is_valid(patch_pu_id_cache_path, minpatch_data_dict['patch_pu_id_fingerprint'], len(minpatch_data_dict['pu_id_array']))
+        if minpatch_object.exportPatchPuIdTextBool and make_new_patch_pu_id_files_bool is False:
+            make_new_patch_pu_id_files_bool = check_patch_pu_id_text_file(setup_object, minpatch_data_dict)  # Remade if patchPUID.dat is missing or was made with other radii
+    else:
+        make_new_patch_pu_id_files_bool = check_patch_pu_id_text_file(setup_object, minpatch_data_dict)
 
-    return area_dictionary, zone_dict, zone_type_dict
+    return make_new_patch_pu_id_files_bool
 
 
-def check_patch_pu_id_file(setup_object, minpatch_data_dict):
+def check_patch_pu_id_text_file(setup_object, minpatch_data_dict):
     zone_type_dict = minpatch_data_dict['zone_type_dict']
     zone_type_radius_dict = dict()
     for zoneID in zone_type_dict:
@@ -270,24 +390,50 @@ def make_patch_pu_id_zone_radius_dict(patch_pu_id_file_path):
     return patch_pu_id_zone_radius_dict
 
 
-def make_mp_patch_pu_id_dict(setup_object, minpatch_data_dict):
-    patch_pu_id_path_name = setup_object.input_path + sep + 'patchPUID.dat'
-    area_dict = minpatch_data_dict['area_dict']
-    zone_dict = minpatch_data_dict['zone_dict']
+def make_mp_add_patch_matrix(setup_object, minpatch_object, minpatch_data_dict):
+    if minpatch_object.usePatchPuIdCacheBool:
+        patch_pu_id_matrix = load_patch_pu_id_cache(setup_object.input_path + sep + 'patchPUID.bin')
+    else:
+        patch_pu_id_matrix = make_patch_pu_id_matrix_from_text_file(setup_object.input_path + sep + 'patchPUID.dat', minpatch_data_dict)
+    add_patch_matrix = make_add_patch_matrix_from_patch_pu_id_matrix(minpatch_data_dict, patch_pu_id_matrix)
+
+    return add_patch_matrix
+
+
+def make_add_patch_matrix_from_patch_pu_id_matrix(minpatch_data_dict, patch_pu_id_matrix):
+    # Only keeps the patches that are at least the minimum patch size of the zone of their central PU
+    row_index_array = array('q')
+    column_index_array = array('i')
+    for pu_index in range(patch_pu_id_matrix.row_count()):
+        patch_index_list = patch_pu_id_matrix.row_index_list(pu_index)
+        if is_patch_bigger_than_minimum_size(minpatch_data_dict, pu_index, patch_index_list):
+            for patch_pu_index in patch_index_list:
+                row_index_array.append(pu_index)
+                column_index_array.append(patch_pu_index)
 
-    patch_pu_id_dict = dict()
+    add_patch_matrix = make_csr_matrix(len(minpatch_data_dict['pu_index_dict']), row_index_array, column_index_array, None)
+
+    return add_patch_matrix
+
+
+def make_patch_pu_id_matrix_from_text_file(patch_pu_id_path_name, minpatch_data_dict):
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    row_index_array = array('q')
+    column_index_array = array('i')
 
     with open(patch_pu_id_path_name, 'rt') as f:
         patch_reader = reader(f)
         for aRow in patch_reader:
             if '***' not in aRow[0]:
                 pu_id, patch_id_list = make_patch_id_details_from_file_row(aRow)
-                if is_patch_bigger_than_minimum_size(pu_id, patch_id_list, area_dict, zone_dict):
-                    patch_pu_id_dict[pu_id] = patch_id_list
-                else:
-                    patch_pu_id_dict[pu_id] = []
+                pu_index = pu_index_dict[pu_id]
+                for patch_pu_id in patch_id_list:
+                    row_index_array.append(pu_index)
+                    column_index_array.append(pu_index_dict[patch_pu_id])
 
-    return patch_pu_id_dict
+    patch_pu_id_matrix = make_csr_matrix(len(pu_index_dict), row_index_array, column_index_array, None)
+
+    return patch_pu_id_matrix
 
 
 def make_patch_id_details_from_file_row(a_row):
@@ -314,13 +460,13 @@ def is_patch_pu_id_list_empty(first_patch_value):
     return patch_pu_id_list_is_empty
 
 
-def is_patch_bigger_than_minimum_size(pu_id, patch_id_list, area_dict, zone_dict):
+def is_patch_bigger_than_minimum_size(minpatch_data_dict, pu_index, patch_index_list):
+    pu_area_array = minpatch_data_dict['pu_area_array']
     patch_is_bigger_than_minimum = False
-    min_patch_size = zone_dict[pu_id][1]
-    running_patch_size = area_dict[pu_id]
-    for patch_pu_id in patch_id_list:
-        patch_pu_size = area_dict[patch_pu_id]
-        running_patch_size += patch_pu_size
+    min_patch_size = minpatch_data_dict['pu_patch_area_array'][pu_index]
+    running_patch_size = pu_area_array[pu_index]
+    for patch_pu_index in patch_index_list:
+        running_patch_size += pu_area_array[patch_pu_index]
 
     if running_patch_size >= min_patch_size:
         patch_is_bigger_than_minimum = True
@@ -328,99 +474,177 @@ def is_patch_bigger_than_minimum_size(pu_id, patch_id_list, area_dict, zone_dict
     return patch_is_bigger_than_minimum
 
 
-def make_bound_matrix_dict(boundary_location_string, pu_dict):
-    bound_matrix_dict = dict()
-    pu_list = list(pu_dict.keys())
-    for aNum in pu_list:
-        bound_matrix_dict[aNum] = dict()
+def make_mp_bound_matrix(boundary_location_string, minpatch_data_dict):
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    row_index_array = array('q')
+    column_index_array = array('i')
+    bound_value_array = array('d')
 
     with open(boundary_location_string, 'rt') as f:
         bound_reader = reader(f)
         next(bound_reader)
         for aRow in bound_reader:
-            id1_value = int(aRow[0])
-            id2_value = int(aRow[1])
+            id1_index = pu_index_dict[int(aRow[0])]
+            id2_index = pu_index_dict[int(aRow[1])]
             bound_value = float(aRow[2])
 
-            bound_dict1 = bound_matrix_dict[id1_value]
-            bound_dict1[id2_value] = bound_value
-            bound_dict2 = bound_matrix_dict[id2_value]
-            bound_dict2[id1_value] = bound_value
+            row_index_array.append(id1_index)
+            column_index_array.append(id2_index)
+            bound_value_array.append(bound_value)
+            if id1_index != id2_index:
+                row_index_array.append(id2_index)
+                column_index_array.append(id1_index)
+                bound_value_array.append(bound_value)
+
+    bound_matrix = make_csr_matrix(len(pu_index_dict), row_index_array, column_index_array, bound_value_array)
 
-    return bound_matrix_dict
+    return bound_matrix
 
 
-def make_mp_abund_matrix_dict(abundance_location_string, target_dict, pu_dict):
-    abund_matrix_dict = dict()
-    pu_list = pu_dict.keys()
-    feat_set = set(target_dict.keys())
-    for aNum in pu_list:
-        abund_matrix_dict[aNum] = dict()
+def make_mp_abund_matrix(abundance_location_string, minpatch_data_dict):
+    pu_index_dict = minpatch_data_dict['pu_index_dict']
+    feat_index_dict = minpatch_data_dict['feat_index_dict']
+    row_index_array = array('q')
+    column_index_array = array('i')
+    abund_value_array = array('d')
 
     with open(abundance_location_string, 'rt') as f:
         abund_reader = reader(f)
         next(abund_reader)
         for aRow in abund_reader:
             feat_id = int(aRow[0])
-            if feat_id in feat_set:
-                pu_id = int(aRow[1])
-                feat_amount = float(aRow[2])
+            if feat_id in feat_index_dict:
+                row_index_array.append(pu_index_dict[int(aRow[1])])
+                column_index_array.append(feat_index_dict[feat_id])
+                abund_value_array.append(float(aRow[2]))
 
-                pu_abund_dict = abund_matrix_dict[pu_id]
-                pu_abund_dict[feat_id] = feat_amount
+    abund_matrix = make_csr_matrix(len(pu_index_dict), row_index_array, column_index_array, abund_value_array)
 
-    return abund_matrix_dict
+    return abund_matrix
 
 
-def create_patch_pu_id_text_file(setup_object, minpatch_data_dict):
-    xy_loc_dict = minpatch_data_dict['xy_loc_dict']
-    zone_dict = minpatch_data_dict['zone_dict']
-    zone_type_dict = minpatch_data_dict['zone_type_dict']
-    unit_dict = minpatch_data_dict['initial_unit_dict']
-    bound_matrix_dict = minpatch_data_dict['boundary_matrix_dict']
+def create_patch_pu_id_files(setup_object, minpatch_object, minpatch_data_dict):
+    patch_pu_id_matrix = make_patch_pu_id_matrix(minpatch_data_dict, minpatch_object.processCount)
+    if minpatch_object.usePatchPuIdCacheBool:
+        write_patch_pu_id_cache(setup_object.input_path + sep + 'patchPUID.bin', minpatch_data_dict['patch_pu_id_fingerprint'], patch_pu_id_matrix)
+    if minpatch_object.exportPatchPuIdTextBool or minpatch_object.usePatchPuIdCacheBool is False:
+        patch_list_dict = make_patch_list_dict_from_patch_pu_id_matrix(minpatch_data_dict, patch_pu_id_matrix)
+        print_mp_patch_list_dict(patch_list_dict, minpatch_data_dict['zone_type_dict'], setup_object.input_path + sep + 'patchPUID.dat')
+
+
+def make_patch_pu_id_matrix(minpatch_data_dict, process_count):
+    patch_pu_id_data_dict = make_patch_pu_id_data_dict(minpatch_data_dict)
+    pu_index_range_list = make_patch_pu_id_pu_index_range_list(len(minpatch_data_dict['pu_id_array']))
+
+    progress_bar = make_mp_progress_bar(minpatch_data_dict, 'Making patchPUID file in input folder')
+    if process_count > 1:
+        patch_pu_id_matrix = return_process_pool_results(process_count, init_patch_pu_id_worker_process, (patch_pu_id_data_dict,), make_patch_pu_id_list_in_worker_process, pu_index_range_list, lambda patch_list_iterator: make_patch_pu_id_matrix_from_patch_lists(minpatch_data_dict, pu_index_range_list, patch_list_iterator, progress_bar))
+    else:
+        patch_list_iterator = (make_patch_pu_id_list(patch_pu_id_data_dict, puIndexRange) for puIndexRange in pu_index_range_list)
+        patch_pu_id_matrix = make_patch_pu_id_matrix_from_patch_lists(minpatch_data_dict, pu_index_range_list, patch_list_iterator, progress_bar)
+    clear_mp_progress_bar(progress_bar)
+
+    return patch_pu_id_matrix
+
+
+def make_patch_list_dict_from_patch_pu_id_matrix(minpatch_data_dict, patch_pu_id_matrix):
+    pu_id_array = minpatch_data_dict['pu_id_array']
+    pu_status_array = minpatch_data_dict['pu_status_array']
     patch_list_dict = dict()
+    for pu_index in range(patch_pu_id_matrix.row_count()):
+        if pu_status_does_not_equal_excluded(pu_status_array, pu_index):
+            patch_list_dict[pu_id_array[pu_index]] = [pu_id_array[patch_pu_index] for patch_pu_index in patch_pu_id_matrix.row_index_list(pu_index)]
+
+    return patch_list_dict
+
+
+def make_patch_pu_id_data_dict(minpatch_data_dict):
+    patch_pu_id_data_dict = dict()
+    for keyName in ['pu_id_array', 'pu_status_array', 'pu_x_array', 'pu_y_array', 'pu_radius_array', 'bound_matrix']:
+        patch_pu_id_data_dict[keyName] = minpatch_data_dict[keyName]
+
+    return patch_pu_id_data_dict
+
+
+def make_patch_pu_id_pu_index_range_list(pu_count):
+    pu_index_range_list = list()
+    for start_pu_index in range(0, pu_count, patch_pu_id_range_size):
+        pu_index_range_list.append((start_pu_index, min(start_pu_index + patch_pu_id_range_size, pu_count)))
+
+    return pu_index_range_list
+
+
+def make_patch_pu_id_matrix_from_patch_lists(minpatch_data_dict, pu_index_range_list, patch_list_iterator, progress_bar):
+    row_index_array = array('q')
+    column_index_array = array('i')
+    range_count = 1
+    for patch_list in patch_list_iterator:
+        set_mp_progress_bar_value(progress_bar, range_count, len(pu_index_range_list))
+        range_count += 1
+        for pu_index, patch_index_list in patch_list:
+            row_index_array.extend([pu_index] * len(patch_index_list))
+            column_index_array.extend(patch_index_list)
+
+    patch_pu_id_matrix = make_csr_matrix(len(minpatch_data_dict['pu_id_array']), row_index_array, column_index_array, None)
+
+    return patch_pu_id_matrix
+
+
+def init_patch_pu_id_worker_process(patch_pu_id_data_dict):
+    patch_pu_id_worker_data_dict['patch_pu_id_data_dict'] = patch_pu_id_data_dict
+
+
+def make_patch_pu_id_list_in_worker_process(pu_index_range):
+    patch_list = make_patch_pu_id_list(patch_pu_id_worker_data_dict['patch_pu_id_data_dict'], pu_index_range)
+
+    return patch_list
+
+
+def make_patch_pu_id_list(patch_pu_id_data_dict, pu_index_range):
+    pu_id_array = patch_pu_id_data_dict['pu_id_array']
+    pu_status_array = patch_pu_id_data_dict['pu_status_array']
+    patch_list = list()
+    for pu_index in range(pu_index_range[0], pu_index_range[1]):
+        if pu_status_does_not_equal_excluded(pu_status_array, pu_index):
+            pu_index_patch_set = make_pu_index_patch_set(patch_pu_id_data_dict, pu_index)
+            patch_index_list = sorted(pu_index_patch_set, key=pu_id_array.__getitem__)  # Sorted by PU ID, as in patchPUID.dat
+            patch_list.append((pu_index, patch_index_list))
+
+    return patch_list
+
+
+def make_pu_index_patch_set(patch_pu_id_data_dict, pu_index):
+    # Flood fills out from the PU through its neighbours, keeping those with centroids within the patch radius
+    pu_status_array = patch_pu_id_data_dict['pu_status_array']
+    pu_x_array = patch_pu_id_data_dict['pu_x_array']
+    pu_y_array = patch_pu_id_data_dict['pu_y_array']
+    bound_matrix = patch_pu_id_data_dict['bound_matrix']
+    pu_x_value = pu_x_array[pu_index]
+    pu_y_value = pu_y_array[pu_index]
+    zone_patch_radius_value = patch_pu_id_data_dict['pu_radius_array'][pu_index]
+
+    pu_index_patch_set = set()
+    candidate_pu_index_list = list(set(bound_matrix.row_index_list(pu_index)))
+    found_pu_index_set = set(candidate_pu_index_list)
+    found_pu_index_set.add(pu_index)
+    while len(candidate_pu_index_list) > 0:
+        test_candidate_pu_index = candidate_pu_index_list.pop()
+        if pu_status_does_not_equal_excluded(pu_status_array, test_candidate_pu_index):
+            if is_pu_centroid_within_patch_radius(pu_x_value, pu_y_value, pu_x_array[test_candidate_pu_index], pu_y_array[test_candidate_pu_index], zone_patch_radius_value):
+                pu_index_patch_set.add(test_candidate_pu_index)
+                for neighb_pu_index in bound_matrix.row_index_list(test_candidate_pu_index):
+                    if neighb_pu_index not in found_pu_index_set:
+                        found_pu_index_set.add(neighb_pu_index)
+                        candidate_pu_index_list.append(neighb_pu_index)
 
-    progress_bar = make_progress_bar('Making patchPUID.dat file in input folder')
-    row_total_count = len(unit_dict)
-    row_count = 1
-
-    for pu_id in unit_dict:
-        set_progress_bar_value(progress_bar, row_count, row_total_count)
-        row_count += 1
-
-        pu_status, pu_x_value, pu_y_value = xy_loc_dict[pu_id]
-        zone_id, zone_patch_area_value, zone_patch_radius_value = zone_dict[pu_id]
-        pu_id_patch_set = set()
-        if pu_status_does_not_equal_excluded(unit_dict, pu_id):
-            candidate_pu_id_patch_set = set(bound_matrix_dict[pu_id].keys())
-            already_tested_pu_id_patch_set = set()
-            already_tested_pu_id_patch_set.add(pu_id)
-            while len(candidate_pu_id_patch_set) > 0:
-                test_candidate_pu_id = candidate_pu_id_patch_set.pop()
-                test_candidate_pu_status, test_candidate_pu_x_value, test_candidate_pu_y_value = xy_loc_dict[test_candidate_pu_id]
-                if pu_status_does_not_equal_excluded(unit_dict, test_candidate_pu_id):
-                    if is_pu_centroid_within_patch_radius(pu_x_value, pu_y_value, test_candidate_pu_x_value, test_candidate_pu_y_value, zone_patch_radius_value):
-                        pu_id_patch_set.add(test_candidate_pu_id)
-                        test_candidate_pu_id_patch_set = set(bound_matrix_dict[test_candidate_pu_id].keys())
-                        new_candidate_pu_id_patch_set = test_candidate_pu_id_patch_set.difference(already_tested_pu_id_patch_set)
-                        candidate_pu_id_patch_set = candidate_pu_id_patch_set.union(new_candidate_pu_id_patch_set)
-                    already_tested_pu_id_patch_set.add(test_candidate_pu_id)
-
-            pu_id_patch_list = list(pu_id_patch_set)
-            pu_id_patch_list.sort()
-            patch_list_dict[pu_id] = pu_id_patch_list
-
-    clear_progress_bar()
-    print_mp_patch_list_dict(patch_list_dict, zone_type_dict, setup_object.input_path + sep + 'patchPUID.dat')
+    return pu_index_patch_set
 
 
 def is_pu_centroid_within_patch_radius(a_x_value, a_y_value, b_x_value, b_y_value, patch_radius_value):
     centroid_within_patch_radius = False
     x_diff = a_x_value - b_x_value
     y_diff = a_y_value - b_y_value
-    x_diff_square = pow(x_diff, 2)
-    y_diff_square = pow(y_diff, 2)
-    centr_dist = sqrt(x_diff_square + y_diff_square)
+    centr_dist = sqrt(x_diff * x_diff + y_diff * y_diff)
     if centr_dist <= patch_radius_value:
         centroid_within_patch_radius = True
 
@@ -440,22 +664,9 @@ def radius_values_very_high(minpatch_data_dict):
 
 
 def return_min_max_xy_list(minpatch_data_dict):
-    xy_loc_dictionary = minpatch_data_dict['xy_loc_dict']
-    min_x, max_x, min_y, max_y = ['blank', 'blank', 'blank', 'blank']
-    for pu_id in xy_loc_dictionary:
-        pu_status, x_loc_string, y_loc_string = xy_loc_dictionary[pu_id]
-        x_loc = float(x_loc_string)
-        y_loc = float(y_loc_string)
-        if min_x == 'blank' or x_loc < min_x:
-            min_x = x_loc
-        if max_x == 'blank' or x_loc > max_x:
-            max_x = x_loc
-        if min_y == 'blank' or y_loc < min_y:
-            min_y = y_loc
-        if max_y == 'blank' or y_loc > max_y:
-            max_y = y_loc
-
-    min_max_xy_list = [min_x, max_x, min_y, max_y]
+    pu_x_array = minpatch_data_dict['pu_x_array']
+    pu_y_array = minpatch_data_dict['pu_y_array']
+    min_max_xy_list = [min(pu_x_array), max(pu_x_array), min(pu_y_array), max(pu_y_array)]
 
     return min_max_xy_list
 
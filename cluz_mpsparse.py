@@ -0,0 +1,115 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+import numpy
+
+from .cluz_costs import sum_values_by_key_in_order
+
+
+sparse_chunk_member_count = 250000  # Largest number of patch members expanded at once, which limits the memory used for each block of candidates
+
+
+def make_patch_membership_dict(minpatch_data_dict, pu_selection_set, pu_patch_set_dict):
+    # Patch membership matrix, with the members of each candidate patch held in the same order as its patch set is looped through,
+    # so the summed amounts are the same as those made by make_single_pu_patch_abund_dict
+    pu_count = len(minpatch_data_dict['pu_id_array'])
+    member_count_values = numpy.zeros(pu_count + 1, dtype=numpy.int64)
+    for candidate_pu_index in pu_selection_set:
+        member_count_values[candidate_pu_index + 1] = len(pu_patch_set_dict[candidate_pu_index])
+
+    member_indptr_values = numpy.cumsum(member_count_values)
+    member_pu_index_values = numpy.zeros(member_indptr_values[-1], dtype=numpy.int64)
+    for candidate_pu_index in pu_selection_set:
+        member_start = member_indptr_values[candidate_pu_index]
+        member_pu_index_values[member_start:member_start + len(pu_patch_set_dict[candidate_pu_index])] = list(pu_patch_set_dict[candidate_pu_index])
+
+    abund_matrix = minpatch_data_dict['abund_matrix']
+    patch_membership_dict = dict()
+    patch_membership_dict['member_indptr_values'] = member_indptr_values
+    patch_membership_dict['member_pu_index_values'] = member_pu_index_values
+    patch_membership_dict['abund_indptr_values'] = numpy.asarray(abund_matrix.indptr_array)
+    patch_membership_dict['abund_feat_index_values'] = numpy.asarray(abund_matrix.index_array, dtype=numpy.int64)
+    patch_membership_dict['abund_amount_values'] = numpy.asarray(abund_matrix.value_array)
+    patch_membership_dict['pu_cost_values'] = numpy.asarray(minpatch_data_dict['pu_cost_array'])
+
+    return patch_membership_dict
+
+
+def update_sparse_pu_patch_abund_dict(all_pu_patch_abund_dict, minpatch_data_dict, patch_membership_dict, status_array, unmet_target_index_set, candidate_pu_index_list):
+    # Recalculates the rows of the candidate patch abundance matrix for the listed candidates, ie (patch membership matrix masked to
+    # available PUs) x (abundance matrix masked to unmet features), one block of candidates at a time
+    status_values = numpy.asarray(status_array)  # Shares memory with the status array, so it doesn't need updating as PUs are added
+    unmet_feat_values = numpy.zeros(len(minpatch_data_dict['feat_id_array']), dtype=bool)
+    unmet_feat_values[list(unmet_target_index_set)] = True
+
+    member_indptr_values = patch_membership_dict['member_indptr_values']
+    candidate_values = numpy.array(sorted(candidate_pu_index_list), dtype=numpy.int64)
+    member_end_values = numpy.cumsum(member_indptr_values[candidate_values + 1] - member_indptr_values[candidate_values])
+    chunk_start = 0
+    while chunk_start < len(candidate_values):
+        chunk_end = int(numpy.searchsorted(member_end_values, member_end_values[chunk_start] + sparse_chunk_member_count, side='right'))
+        chunk_end = max(chunk_end, chunk_start + 1)
+        add_sparse_chunk_to_pu_patch_abund_dict(all_pu_patch_abund_dict, patch_membership_dict, status_values, unmet_feat_values, candidate_values[chunk_start:chunk_end])
+        chunk_start = chunk_end
+
+    return all_pu_patch_abund_dict
+
+
+def add_sparse_chunk_to_pu_patch_abund_dict(all_pu_patch_abund_dict, patch_membership_dict, status_values, unmet_feat_values, candidate_values):
+    feat_count = len(unmet_feat_values)
+    member_indptr_values = patch_membership_dict['member_indptr_values']
+    member_row_values, member_pos_values = expand_csr_rows(member_indptr_values[candidate_values], member_indptr_values[candidate_values + 1])
+    member_pu_index_values = patch_membership_dict['member_pu_index_values'][member_pos_values]
+
+    available_values = status_values[member_pu_index_values] == 0
+    member_row_values = member_row_values[available_values]
+    member_pu_index_values = member_pu_index_values[available_values]
+    patch_cost_list = sum_values_by_key_in_order(member_row_values, patch_membership_dict['pu_cost_values'][member_pu_index_values], len(candidate_values)).tolist()
+
+    abund_indptr_values = patch_membership_dict['abund_indptr_values']
+    entry_member_values, entry_pos_values = expand_csr_rows(abund_indptr_values[member_pu_index_values], abund_indptr_values[member_pu_index_values + 1])
+    entry_feat_index_values = patch_membership_dict['abund_feat_index_values'][entry_pos_values]
+    unmet_entry_values = unmet_feat_values[entry_feat_index_values]
+    entry_row_values = member_row_values[entry_member_values[unmet_entry_values]]
+    entry_key_values = entry_row_values * feat_count + entry_feat_index_values[unmet_entry_values]
+    key_values, key_pos_values = numpy.unique(entry_key_values, return_inverse=True)
+    key_amount_values = sum_values_by_key_in_order(key_pos_values.ravel(), patch_membership_dict['abund_amount_values'][entry_pos_values[unmet_entry_values]], len(key_values))
+
+    positive_values = key_amount_values > 0
+    key_values = key_values[positive_values]
+    key_amount_list = key_amount_values[positive_values].tolist()
+    key_feat_index_list = (key_values % feat_count).tolist()
+    row_end_list = numpy.searchsorted(key_values // feat_count, numpy.arange(len(candidate_values)), side='right').tolist()
+    row_start = 0
+    for row_index, candidate_pu_index in enumerate(candidate_values.tolist()):
+        row_end = row_end_list[row_index]
+        pu_patch_abund_dict = dict(zip(key_feat_index_list[row_start:row_end], key_amount_list[row_start:row_end]))
+        all_pu_patch_abund_dict[candidate_pu_index] = [pu_patch_abund_dict, patch_cost_list[row_index]]
+        row_start = row_end
+
+
+def expand_csr_rows(row_start_values, row_end_values):
+    # Returns the row number and matrix position of every entry in the given rows, in row order
+    row_length_values = row_end_values - row_start_values
+    row_number_values = numpy.repeat(numpy.arange(len(row_length_values), dtype=numpy.int64), row_length_values)
+    entry_offset_values = numpy.arange(len(row_number_values), dtype=numpy.int64) - numpy.repeat(numpy.cumsum(row_length_values) - row_length_values, row_length_values)
+    entry_pos_values = numpy.repeat(row_start_values, row_length_values) + entry_offset_values
+
+    return row_number_values, entry_pos_values
@@ -0,0 +1,303 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+# Runs MinPatch with every combination of the specified minimum patch areas, patch radii and BLM values, without QGIS,
+# loading the Marxan input files once and saving the results of every combination in one table:
+# python -m cluz.cluz_mpsweep input_folder output_folder marxan_output_prefix --blm 0 0.5 1 --min-area 1=50,100 --radius 1=20,40 --processes 4
+
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from array import array
+from itertools import product
+from os import path, sep
+from sys import exit, stderr
+
+from .cluz_mpcache import load_patch_pu_id_cache, make_patch_pu_id_fingerprint, patch_pu_id_cache_is_valid
+from .cluz_mpcli import make_mp_command_line_objects
+from .cluz_mpdata import MinPatchArrayDictView
+from .cluz_mpfunctions import clear_mp_progress_bar, make_mp_progress_bar, run_mp_yes_cancel_warning, set_mp_progress_bar_value
+from .cluz_mpoutputs import print_mp_sweep_results
+from .cluz_mprun import run_mp_marxan_file
+from .cluz_mpsetup import add_mp_input_data, check_mp_files_can_be_saved, check_mp_overwrite_existing_files, check_mp_pu_id_values_match
+from .cluz_mpsetup import make_add_patch_matrix_from_patch_pu_id_matrix, make_mp_marxan_file_list, make_patch_pu_id_matrix
+from .cluz_mpsetup import radius_values_very_high, update_minpatch_data_dict_with_parameters
+from .cluz_processes import return_process_pool_results
+
+
+mp_sweep_worker_data_dict = dict()  # Holds the MinPatch data and patch lists in each worker process, so they are only passed once to each process
+
+
+def make_mp_sweep_file_path(setup_object, minpatch_object):
+    sweep_file_path = setup_object.output_path + sep + 'mp_' + minpatch_object.marxanFileName + '_sweep.csv'
+
+    return sweep_file_path
+
+
+def make_mp_sweep_input_data_dict(setup_object, minpatch_object):
+    # The input files are only read once, as only the zone settings and the BLM change between combinations
+    minpatch_data_dict = dict()
+    setup_ok_bool = True
+    minpatch_data_dict['decimal_places'] = setup_object.decimal_places
+    minpatch_data_dict['progress_type'] = minpatch_object.progressType
+    minpatch_data_dict['accept_warnings'] = minpatch_object.acceptWarningsBool
+
+    minpatch_data_dict, zone_type_dict, pu_id_values_match_bool = add_mp_input_data(minpatch_data_dict, setup_object.input_path)
+    minpatch_object.zonestats_bool = False  # Zone stats are not compared between combinations
+
+    sweep_file_path_list = [make_mp_sweep_file_path(setup_object, minpatch_object)]
+    setup_ok_bool = check_mp_pu_id_values_match(minpatch_data_dict, pu_id_values_match_bool, setup_ok_bool)
+    setup_ok_bool = check_mp_overwrite_existing_files(minpatch_data_dict, sweep_file_path_list, setup_ok_bool)
+    setup_ok_bool = check_mp_files_can_be_saved(minpatch_data_dict, sweep_file_path_list, setup_ok_bool)
+    if setup_ok_bool:
+        minpatch_data_dict = update_minpatch_data_dict_with_parameters(minpatch_object, minpatch_data_dict)
+        minpatch_data_dict['profile_runs'] = False
+
+    return minpatch_data_dict, setup_ok_bool
+
+
+def make_mp_sweep_combination_list(zone_type_dict, min_area_value_dict, radius_value_dict, blm_value_list):
+    # Zones without specified values keep the minimum patch area and radius from the MinPatch details file
+    zone_id_list = sorted(zone_type_dict)
+    zone_setting_list_list = list()
+    for zoneID in zone_id_list:
+        min_area_value_list = min_area_value_dict.get(zoneID, [zone_type_dict[zoneID][0]])
+        radius_value_list = radius_value_dict.get(zoneID, [zone_type_dict[zoneID][1]])
+        zone_setting_list_list.append([[minAreaValue, radiusValue] for radiusValue in radius_value_list for minAreaValue in min_area_value_list])
+
+    combination_list = list()
+    for zoneSettingList in product(*zone_setting_list_list):
+        for blmValue in blm_value_list:
+            combination_dict = dict()
+            combination_dict['combination_id'] = len(combination_list) + 1
+            combination_dict['blm'] = blmValue
+            combination_dict['zone_type_dict'] = dict(zip(zone_id_list, zoneSettingList))
+            combination_list.append(combination_dict)
+
+    return combination_list
+
+
+def make_mp_sweep_radius_key(zone_type_dict):
+    radius_key = tuple((zoneID, zone_type_dict[zoneID][1]) for zoneID in sorted(zone_type_dict))
+
+    return radius_key
+
+
+def make_mp_sweep_zone_data_dict(minpatch_data_dict, zone_type_dict):
+    # Shares the input data with the loaded data dict and only replaces the zone settings
+    pu_zone_array = minpatch_data_dict['pu_zone_array']
+    pu_patch_area_array = array('d', [0]) * len(pu_zone_array)
+    pu_radius_array = array('d', [0]) * len(pu_zone_array)
+    for pu_index in range(len(pu_zone_array)):
+        pu_patch_area_array[pu_index] = zone_type_dict[pu_zone_array[pu_index]][0]
+        pu_radius_array[pu_index] = zone_type_dict[pu_zone_array[pu_index]][1]
+
+    zone_data_dict = dict(minpatch_data_dict)
+    zone_data_dict['zone_type_dict'] = zone_type_dict
+    zone_data_dict['pu_patch_area_array'] = pu_patch_area_array
+    zone_data_dict['pu_radius_array'] = pu_radius_array
+    zone_data_dict['zone_dict'] = MinPatchArrayDictView(minpatch_data_dict['pu_id_array'], minpatch_data_dict['pu_index_dict'], [pu_zone_array, pu_patch_area_array, pu_radius_array])
+
+    return zone_data_dict
+
+
+def make_mp_sweep_patch_pu_id_matrix_dict(setup_object, minpatch_object, minpatch_data_dict, combination_list):
+    # Patch lists only depend on the radii, so each set of radii is searched once and shared by the combinations that use it
+    patch_pu_id_matrix_dict = dict()
+    continue_bool = True
+    for combinationDict in combination_list:
+        radius_key = make_mp_sweep_radius_key(combinationDict['zone_type_dict'])
+        if continue_bool and radius_key not in patch_pu_id_matrix_dict:
+            zone_data_dict = make_mp_sweep_zone_data_dict(minpatch_data_dict, combinationDict['zone_type_dict'])
+            if radius_values_very_high(zone_data_dict):
+                continue_bool = run_mp_yes_cancel_warning(minpatch_data_dict, 'Radius values very high', 'At least one of the radius values in the parameter sweep is more than 25% of the approximate height and/or width of the planning region. This could produce very large patches and make MinPatch run very slowly. Is that OK?')
+            if continue_bool:
+                patch_pu_id_matrix_dict[radius_key] = make_mp_sweep_patch_pu_id_matrix(setup_object, minpatch_object, zone_data_dict)
+
+    return patch_pu_id_matrix_dict, continue_bool
+
+
+def make_mp_sweep_patch_pu_id_matrix(setup_object, minpatch_object, zone_data_dict):
+    # patchPUID.bin is used when it was made with the same radii, but is not replaced, as it belongs to the settings in the MinPatch details file
+    patch_pu_id_cache_path = setup_object.input_path + sep + 'patchPUID.bin'
+    patch_pu_id_fingerprint = make_patch_pu_id_fingerprint(setup_object.input_path, zone_data_dict['zone_type_dict'])
+    if minpatch_object.usePatchPuIdCacheBool and patch_pu_id_cache_is_valid(patch_pu_id_cache_path, patch_pu_id_fingerprint, len(zone_data_dict['pu_id_array'])):
+        patch_pu_id_matrix = load_patch_pu_id_cache(patch_pu_id_cache_path)
+    else:
+        patch_pu_id_matrix = make_patch_pu_id_matrix(zone_data_dict, minpatch_object.processCount)
+
+    return patch_pu_id_matrix
+
+
+def make_mp_sweep_data_dict(minpatch_data_dict, patch_pu_id_matrix_dict, combination_dict):
+    sweep_data_dict = make_mp_sweep_zone_data_dict(minpatch_data_dict, combination_dict['zone_type_dict'])
+    patch_pu_id_matrix = patch_pu_id_matrix_dict[make_mp_sweep_radius_key(combination_dict['zone_type_dict'])]
+    sweep_data_dict['add_patch_matrix'] = make_add_patch_matrix_from_patch_pu_id_matrix(sweep_data_dict, patch_pu_id_matrix)
+    sweep_data_dict['bound_cost'] = combination_dict['blm']
+    sweep_data_dict['progress_type'] = 'none'
+
+    return sweep_data_dict
+
+
+def run_mp_sweep(setup_object, minpatch_object, minpatch_data_dict, combination_list, patch_pu_id_matrix_dict):
+    marxan_sol_file_list = make_mp_marxan_file_list(setup_object, minpatch_object.marxanFileName + '_r')
+    progress_bar = make_mp_progress_bar(minpatch_data_dict, 'Running MinPatch with ' + str(len(combination_list)) + ' combinations of settings')
+    if minpatch_data_dict['process_count'] > 1:
+        sweep_results_list = return_process_pool_results(minpatch_data_dict['process_count'], init_mp_sweep_worker_process, (minpatch_data_dict, patch_pu_id_matrix_dict, marxan_sol_file_list), run_mp_sweep_combination_in_worker_process, combination_list, lambda sweep_results_iterator: make_mp_sweep_results_list(combination_list, sweep_results_iterator, progress_bar))
+    else:
+        sweep_results_iterator = (run_mp_sweep_combination(minpatch_data_dict, patch_pu_id_matrix_dict, combinationDict, marxan_sol_file_list) for combinationDict in combination_list)
+        sweep_results_list = make_mp_sweep_results_list(combination_list, sweep_results_iterator, progress_bar)
+    clear_mp_progress_bar(progress_bar)
+
+    return sweep_results_list
+
+
+def make_mp_sweep_results_list(combination_list, sweep_results_iterator, progress_bar):
+    sweep_results_list = list()
+    combination_count = 1
+    for combination_results_list in sweep_results_iterator:
+        set_mp_progress_bar_value(progress_bar, combination_count, len(combination_list))
+        combination_count += 1
+        sweep_results_list.extend(combination_results_list)
+
+    return sweep_results_list
+
+
+def init_mp_sweep_worker_process(minpatch_data_dict, patch_pu_id_matrix_dict, marxan_sol_file_list):
+    mp_sweep_worker_data_dict['minpatch_data_dict'] = minpatch_data_dict
+    mp_sweep_worker_data_dict['patch_pu_id_matrix_dict'] = patch_pu_id_matrix_dict
+    mp_sweep_worker_data_dict['marxan_sol_file_list'] = marxan_sol_file_list
+
+
+def run_mp_sweep_combination_in_worker_process(combination_dict):
+    combination_results_list = run_mp_sweep_combination(mp_sweep_worker_data_dict['minpatch_data_dict'], mp_sweep_worker_data_dict['patch_pu_id_matrix_dict'], combination_dict, mp_sweep_worker_data_dict['marxan_sol_file_list'])
+
+    return combination_results_list
+
+
+def run_mp_sweep_combination(minpatch_data_dict, patch_pu_id_matrix_dict, combination_dict, marxan_sol_file_list):
+    sweep_data_dict = make_mp_sweep_data_dict(minpatch_data_dict, patch_pu_id_matrix_dict, combination_dict)
+    combination_results_list = list()
+    for marxanSolFilePath in marxan_sol_file_list:
+        run_results_dict = run_mp_marxan_file(sweep_data_dict, marxanSolFilePath)
+        combination_results_list.append(make_mp_sweep_run_results_row(combination_dict, marxanSolFilePath, run_results_dict))
+
+    return combination_results_list
+
+
+def make_mp_sweep_run_results_row(combination_dict, marxan_sol_file_path, run_results_dict):
+    # Runs where the targets could not be met have no portfolio, so their cost and patch values are left empty
+    zone_type_dict = combination_dict['zone_type_dict']
+    results_row = [combination_dict['combination_id'], combination_dict['blm']]
+    for zoneID in sorted(zone_type_dict):
+        results_row += [zone_type_dict[zoneID][0], zone_type_dict[zoneID][1]]
+    results_row.append(path.basename(marxan_sol_file_path))
+
+    if run_results_dict['continue_bool']:
+        cost_dict = run_results_dict['cost_dict']
+        after_patch_stats_dict = run_results_dict['after_patch_stats_dict']
+        results_row.append('Yes')
+        results_row += [cost_dict['total_unit_cost'], cost_dict['total_boundary_length'], cost_dict['total_boundary_cost'], cost_dict['total_unit_cost'] + cost_dict['total_boundary_cost']]
+        results_row += [after_patch_stats_dict['all_patch_count'], after_patch_stats_dict['valid_patch_count'], after_patch_stats_dict['valid_patch_area'], after_patch_stats_dict['median_valid_patch']]
+    else:
+        results_row.append('No')
+        results_row += [''] * 8
+
+    return results_row
+
+
+def make_mp_sweep_zone_values(zone_values_text):
+    # Reads text such as 1=50,100, which gives the values for zone 1
+    try:
+        zone_text, values_text = zone_values_text.split('=')
+        zone_values = (int(zone_text), [float(aString) for aString in values_text.split(',')])
+    except ValueError:
+        raise ArgumentTypeError('zone values should be written as ZONE=VALUE,VALUE, eg 1=50,100')
+
+    return zone_values
+
+
+def make_mp_sweep_argument_parser():
+    argument_parser = ArgumentParser(prog='python -m cluz.cluz_mpsweep', description='Run MinPatch with every combination of the specified settings and compare the results, without QGIS.')
+    argument_parser.add_argument('input_path', help='Marxan input folder, containing pu.dat, spec.dat, puvspr2.dat, bound.dat and minpatch.dat')
+    argument_parser.add_argument('output_path', help='Marxan output folder, containing the portfolio files for each run')
+    argument_parser.add_argument('marxan_file_name', help='Marxan output file name, so the run files are called [name]_r00001.txt etc')
+    argument_parser.add_argument('--blm', type=float, nargs='+', default=[0], help='boundary length modifier values (default 0)')
+    argument_parser.add_argument('--min-area', dest='min_area_list', type=make_mp_sweep_zone_values, action='append', default=list(), help='minimum patch areas for a zone, eg 1=50,100. Can be repeated for each zone')
+    argument_parser.add_argument('--radius', dest='radius_list', type=make_mp_sweep_zone_values, action='append', default=list(), help='patch radii for a zone, eg 1=20,40. Can be repeated for each zone')
+    argument_parser.add_argument('--no-remove', dest='remove_bool', action='store_false', help='skip the remove small patches stage')
+    argument_parser.add_argument('--no-add', dest='add_bool', action='store_false', help='skip the add patches stage')
+    argument_parser.add_argument('--no-whittle', dest='whittle_bool', action='store_false', help='skip the simulated whittling stage')
+    argument_parser.add_argument('--no-patch-cache', dest='patch_cache_bool', action='store_false', help='make the patch lists again, rather than reusing those stored in patchPUID.bin when they were made with the same radii')
+    argument_parser.add_argument('--processes', type=int, default=1, help='number of processes to use (default 1)')
+    argument_parser.add_argument('--decimal-places', type=int, default=3, help='decimal places used when summing feature amounts (default 3)')
+    argument_parser.add_argument('--yes', dest='accept_warnings_bool', action='store_true', help='continue after warnings, eg when an existing sweep results file will be overwritten')
+
+    return argument_parser
+
+
+def make_mp_sweep_command_line_objects(argument_values):
+    # Sets the options of the MinPatch command line that the sweep doesn't have, so the objects are made in the same way
+    sweep_argument_values = Namespace(**vars(argument_values))
+    sweep_argument_values.blm = argument_values.blm[0]
+    sweep_argument_values.patch_text_bool = False  # The sweep never saves patchPUID.dat
+    sweep_argument_values.profile_bool = False
+    sweep_argument_values.resume_bool = False
+
+    return make_mp_command_line_objects(sweep_argument_values)
+
+
+def main(argument_list=None):
+    # Exit codes are 0 when the sweep finishes and 2 when the input files or options are not valid
+    argument_values = make_mp_sweep_argument_parser().parse_args(argument_list)
+    blm_value_list = argument_values.blm
+    setup_object, minpatch_object = make_mp_sweep_command_line_objects(argument_values)
+    if not path.isdir(setup_object.input_path) or not path.isdir(setup_object.output_path):
+        print('Folder error: the specified Marxan input or output folder does not exist.', file=stderr)
+        return 2
+    if len(make_mp_marxan_file_list(setup_object, minpatch_object.marxanFileName + '_r')) == 0:
+        print('No files found: the Marxan output folder does not contain any portfolio files called ' + minpatch_object.marxanFileName + '_r*.', file=stderr)
+        return 2
+
+    minpatch_data_dict, setup_ok_bool = make_mp_sweep_input_data_dict(setup_object, minpatch_object)
+    if setup_ok_bool is False:
+        return 2
+
+    min_area_value_dict = dict(argument_values.min_area_list)
+    radius_value_dict = dict(argument_values.radius_list)
+    zone_type_dict = minpatch_data_dict['zone_type_dict']
+    for zoneID in list(min_area_value_dict) + list(radius_value_dict):
+        if zoneID not in zone_type_dict:
+            print('Zone error: zone ' + str(zoneID) + ' is not in the MinPatch details file.', file=stderr)
+            return 2
+
+    combination_list = make_mp_sweep_combination_list(zone_type_dict, min_area_value_dict, radius_value_dict, blm_value_list)
+    patch_pu_id_matrix_dict, continue_bool = make_mp_sweep_patch_pu_id_matrix_dict(setup_object, minpatch_object, minpatch_data_dict, combination_list)
+    if continue_bool is False:
+        return 2
+
+    sweep_results_list = run_mp_sweep(setup_object, minpatch_object, minpatch_data_dict, combination_list, patch_pu_id_matrix_dict)
+    sweep_file_path = make_mp_sweep_file_path(setup_object, minpatch_object)
+    print_mp_sweep_results(sorted(zone_type_dict), sweep_results_list, sweep_file_path)
+    print('MinPatch has completed the parameter sweep of ' + str(len(combination_list)) + ' combinations of settings. The results are in ' + sweep_file_path + '.', file=stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
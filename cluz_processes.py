@@ -0,0 +1,155 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count, get_context, set_executable
+from os import path
+from queue import Empty, Queue
+from re import compile as compile_regex
+import subprocess
+from sys import exec_prefix, platform
+from threading import Thread
+from time import monotonic
+
+
+solver_run_finished_regex = compile_regex(r'Run\s+(\d+)\s+is\s+finished')  # Marxan and Marxan with Zones print this line after each run
+solver_output_poll_seconds = 0.2
+
+
+def return_max_process_count():
+    try:
+        max_process_count = cpu_count()
+    except NotImplementedError:
+        max_process_count = 1
+
+    return max_process_count
+
+
+def return_process_pool_results(process_count, initializer_function, initializer_args, worker_function, arg_list, results_function):
+    # Passes the results of worker_function for each item in arg_list to results_function and returns what it returns.
+    # The results arrive in the same order as arg_list, whichever process finishes first, so they are the same as those made one after another.
+    # Everything runs in this process if only one process is needed or if worker processes can't be started
+    if min(return_worker_process_count(process_count), len(arg_list)) > 1:
+        executor = make_process_pool_executor(min(process_count, len(arg_list)), initializer_function, initializer_args)
+        try:
+            process_pool_results = results_function(executor.map(worker_function, arg_list))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    else:
+        if initializer_function is not None:
+            initializer_function(*initializer_args)
+        process_pool_results = results_function(map(worker_function, arg_list))
+
+    return process_pool_results
+
+
+def return_worker_process_count(process_count):
+    # Without a Python interpreter to start, spawned workers would each open a new copy of QGIS, so only one process is used
+    if platform.startswith('linux') is False and return_worker_python_path() == 'blank':
+        process_count = 1
+
+    return process_count
+
+
+def make_process_pool_executor(process_count, initializer_function, initializer_args):
+    if platform.startswith('linux'):
+        mp_context = get_context('fork')  # Worker processes share the read-only input data with QGIS without copying it
+    else:
+        set_executable(return_worker_python_path())
+        mp_context = get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=process_count, mp_context=mp_context, initializer=initializer_function, initargs=initializer_args)
+
+    return executor
+
+
+def return_worker_python_path():
+    # Inside QGIS sys.executable points to the QGIS application rather than to Python, so it would open new copies of QGIS
+    if platform == 'win32':
+        python_path = path.join(exec_prefix, 'pythonw.exe')
+    else:
+        python_path = path.join(exec_prefix, 'bin', 'python3')
+    if path.isfile(python_path) is False:
+        python_path = 'blank'
+
+    return python_path
+
+
+def run_solver_process(command_list, working_path, run_count, timeout_seconds, progress_function):
+    # Runs Marxan or R and waits for it to exit, reading its output so the finished runs can be shown by progress_function.
+    # Returns 'finished' if it exited without an error, 'failed' if it returned an error code or 'timed_out'
+    solver_process = subprocess.Popen(command_list, cwd=working_path, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, errors='replace', creationflags=return_solver_creation_flags())
+    line_queue = Queue()
+    reader_thread = Thread(target=add_solver_output_lines_to_queue, args=(solver_process.stdout, line_queue), daemon=True)
+    reader_thread.start()
+
+    start_time = monotonic()
+    finished_run_set = set()
+    output_closed_bool = False
+    timed_out_bool = False
+    while output_closed_bool is False and timed_out_bool is False:
+        try:
+            output_line = line_queue.get(timeout=solver_output_poll_seconds)
+        except Empty:
+            output_line = ''
+        if output_line is None:
+            output_closed_bool = True
+        else:
+            run_finished_match = solver_run_finished_regex.search(output_line)
+            if run_finished_match is not None and progress_function != 'blank':
+                finished_run_set.add(int(run_finished_match.group(1)))
+                progress_function(min(len(finished_run_set), run_count), run_count)
+        timed_out_bool = timeout_seconds != 'blank' and monotonic() - start_time > timeout_seconds
+
+    if timed_out_bool is False:
+        try:
+            if timeout_seconds == 'blank':
+                solver_process.wait()
+            else:
+                solver_process.wait(timeout=max(timeout_seconds - (monotonic() - start_time), 0))
+        except subprocess.TimeoutExpired:
+            timed_out_bool = True
+
+    if timed_out_bool:
+        solver_process.kill()
+        solver_process.wait()
+        solver_status_text = 'timed_out'
+    elif solver_process.returncode == 0:
+        solver_status_text = 'finished'
+    else:
+        solver_status_text = 'failed'
+
+    return solver_status_text
+
+
+def add_solver_output_lines_to_queue(solver_output, line_queue):
+    for aLine in solver_output:
+        line_queue.put(aLine)
+    solver_output.close()
+    line_queue.put(None)  # Shows that the solver has closed its output
+
+
+def return_solver_creation_flags():
+    # Stops Windows opening an empty console window, as the solver output is read by CLUZ
+    if platform == 'win32':
+        creation_flags = subprocess.CREATE_NO_WINDOW
+    else:
+        creation_flags = 0
+
+    return creation_flags
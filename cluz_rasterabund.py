@@ -0,0 +1,283 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from hashlib import sha256
+from math import ceil, floor
+from os import path, stat
+from zipfile import BadZipFile
+
+import numpy
+
+from qgis.core import QgsCoordinateTransform, QgsProject, QgsRectangle
+
+from .cluz_bounddat import make_ring_point_array_list_from_wkb
+from .cluz_savefile import save_npz_file_by_replacing, write_file_by_replacing
+
+
+pu_grid_cache_version = 2
+raster_strip_pixel_count = 4194304  # Approximate number of pixels read from the value raster at a time
+raster_block_dtype_dict = {1: 'u1', 2: '=u2', 3: '=i2', 4: '=u4', 5: '=i4', 6: '=f4', 7: '=f8', 14: 'i1'}  # Qgis.DataType values
+
+
+def return_raster_grid_dict(a_layer):
+    layer_extent = a_layer.extent()
+    grid_dict = dict()
+    grid_dict['crs_text'] = a_layer.crs().toWkt()
+    grid_dict['x_origin'] = layer_extent.xMinimum()
+    grid_dict['y_origin'] = layer_extent.yMaximum()
+    grid_dict['pixel_width'] = a_layer.rasterUnitsPerPixelX()
+    grid_dict['pixel_height'] = a_layer.rasterUnitsPerPixelY()
+    grid_dict['col_count'] = a_layer.width()
+    grid_dict['row_count'] = a_layer.height()
+
+    return grid_dict
+
+
+def return_pu_grid_cache_path(input_path, grid_dict):
+    # Each raster grid has one cache, which is overwritten when the planning unit shapefile changes
+    cache_hash = sha256()
+    for keyName in sorted(grid_dict):
+        cache_hash.update((keyName + ' ' + repr(grid_dict[keyName]) + '\n').encode('utf-8'))
+
+    return path.join(input_path, 'pu_grid_cache_' + cache_hash.hexdigest()[0:16])
+
+
+def return_pu_grid_fingerprint(pu_path):
+    # Stored in the cache and changes whenever the planning unit shapefile is edited
+    fingerprint_hash = sha256()
+    for filePath in [pu_path, path.splitext(pu_path)[0] + '.dbf']:
+        try:
+            file_stat = stat(filePath)
+            fingerprint_hash.update((filePath + ' ' + str(file_stat.st_size) + ' ' + str(file_stat.st_mtime_ns) + '\n').encode('utf-8'))
+        except OSError:
+            fingerprint_hash.update(filePath.encode('utf-8'))
+
+    return fingerprint_hash.hexdigest()
+
+
+def load_pu_grid_cache(cache_path, pu_fingerprint):
+    # Returns 'blank' if there is no cache for this grid, it was made from a different version of the planning unit shapefile or it cannot be read
+    pu_grid_tuple = 'blank'
+    if path.exists(cache_path + '.npz') and path.exists(cache_path + '.npy'):
+        try:
+            with numpy.load(cache_path + '.npz', allow_pickle=False) as cache_file:
+                version_value = int(cache_file['version_value'])
+                fingerprint_value = str(cache_file['pu_fingerprint_value'])
+                window_tuple = tuple(cache_file['window_values'].tolist())
+                pu_id_values = cache_file['pu_id_values']
+            if version_value == pu_grid_cache_version and fingerprint_value == pu_fingerprint:
+                pu_index_grid = numpy.load(cache_path + '.npy', mmap_mode='r', allow_pickle=False)
+                if pu_index_grid.shape == (window_tuple[3], window_tuple[2]):
+                    pu_grid_tuple = window_tuple, pu_index_grid, pu_id_values
+        except (IOError, ValueError, KeyError, IndexError, EOFError, BadZipFile):
+            pu_grid_tuple = 'blank'
+
+    return pu_grid_tuple
+
+
+def make_pu_grid_using_cache(pu_layer, pu_id_field_index, a_layer, cache_path, pu_fingerprint, progress_bar_function):
+    # Returns (window tuple, PU index grid, PU ID array), where the window is (first column, first row, column count, row count)
+    # of the part of the raster grid that covers the planning units and the grid holds the position of each PU in the
+    # ID array, or -1 where no PU covers the centre of the pixel
+    pu_grid_tuple = load_pu_grid_cache(cache_path, pu_fingerprint)
+    if pu_grid_tuple == 'blank':
+        grid_dict = return_raster_grid_dict(a_layer)
+        pu_wkb_list = make_pu_wkb_list_in_raster_crs(pu_layer, pu_id_field_index, a_layer)
+        pu_grid_tuple = make_pu_grid(pu_wkb_list, grid_dict, cache_path, pu_fingerprint, progress_bar_function)
+
+    return pu_grid_tuple
+
+
+def make_pu_wkb_list_in_raster_crs(pu_layer, pu_id_field_index, a_layer):
+    # As with native:zonalhistogram, the planning units are reprojected if the raster uses a different projection
+    coord_transform = 'blank'
+    if pu_layer.crs() != a_layer.crs():
+        coord_transform = QgsCoordinateTransform(pu_layer.crs(), a_layer.crs(), QgsProject.instance())
+    pu_wkb_list = list()
+    for puFeature in pu_layer.getFeatures():
+        pu_geom = puFeature.geometry()
+        if coord_transform != 'blank':
+            pu_geom.transform(coord_transform)
+        pu_wkb_list.append((puFeature.attributes()[pu_id_field_index], bytes(pu_geom.asWkb())))
+
+    return pu_wkb_list
+
+
+def make_pu_grid(pu_wkb_list, grid_dict, cache_path, pu_fingerprint, progress_bar_function):
+    pu_ring_list = [(pu_id, make_ring_point_array_list_from_wkb(pu_wkb)) for pu_id, pu_wkb in pu_wkb_list]
+    pu_ring_list = [(pu_id, ring_point_array_list) for pu_id, ring_point_array_list in pu_ring_list if len(ring_point_array_list) > 0]
+    pu_id_values = numpy.array([puRingTuple[0] for puRingTuple in pu_ring_list], dtype=numpy.int64)
+    window_tuple = return_pu_grid_window_tuple(pu_ring_list, grid_dict)
+
+    try:
+        write_file_by_replacing(cache_path + '.npy', lambda grid_file_path: write_pu_index_grid_file(grid_file_path, pu_ring_list, window_tuple, grid_dict, progress_bar_function))
+        save_npz_file_by_replacing(cache_path + '.npz', {'version_value': numpy.int64(pu_grid_cache_version), 'pu_fingerprint_value': numpy.array(pu_fingerprint), 'window_values': numpy.array(window_tuple, dtype=numpy.int64), 'pu_id_values': pu_id_values})
+        pu_index_grid = numpy.load(cache_path + '.npy', mmap_mode='r', allow_pickle=False)
+    except IOError:
+        pu_index_grid = numpy.empty((window_tuple[3], window_tuple[2]), dtype='<i4')  # The grid is still made in memory if the cache can't be written
+        fill_pu_index_grid(pu_index_grid, pu_ring_list, window_tuple, grid_dict, progress_bar_function)
+
+    return window_tuple, pu_index_grid, pu_id_values
+
+
+def write_pu_index_grid_file(grid_file_path, pu_ring_list, window_tuple, grid_dict, progress_bar_function):
+    # The grid is filled in a memory-mapped file, so a large raster window isn't held in memory
+    pu_index_grid = numpy.lib.format.open_memmap(grid_file_path, mode='w+', dtype='<i4', shape=(window_tuple[3], window_tuple[2]))
+    fill_pu_index_grid(pu_index_grid, pu_ring_list, window_tuple, grid_dict, progress_bar_function)
+    pu_index_grid.flush()
+    del pu_index_grid  # Closes the file, so it can be renamed on Windows
+
+
+def fill_pu_index_grid(pu_index_grid, pu_ring_list, window_tuple, grid_dict, progress_bar_function):
+    pu_index_grid[:] = -1
+    for pu_index, (pu_id, ring_point_array_list) in enumerate(pu_ring_list):
+        add_pu_to_pu_index_grid(pu_index_grid, window_tuple, grid_dict, pu_index, ring_point_array_list)
+        progress_bar_function(pu_index + 1, len(pu_ring_list))
+
+
+def return_pu_grid_window_tuple(pu_ring_list, grid_dict):
+    if len(pu_ring_list) == 0:
+        return 0, 0, 0, 0
+    x_min = min(ringPointArray[:, 0].min() for pu_id, ring_point_array_list in pu_ring_list for ringPointArray in ring_point_array_list)
+    x_max = max(ringPointArray[:, 0].max() for pu_id, ring_point_array_list in pu_ring_list for ringPointArray in ring_point_array_list)
+    y_min = min(ringPointArray[:, 1].min() for pu_id, ring_point_array_list in pu_ring_list for ringPointArray in ring_point_array_list)
+    y_max = max(ringPointArray[:, 1].max() for pu_id, ring_point_array_list in pu_ring_list for ringPointArray in ring_point_array_list)
+
+    first_col = min(max(int(floor((x_min - grid_dict['x_origin']) / grid_dict['pixel_width'])), 0), grid_dict['col_count'])
+    last_col = min(max(int(ceil((x_max - grid_dict['x_origin']) / grid_dict['pixel_width'])), 0), grid_dict['col_count'])
+    first_row = min(max(int(floor((grid_dict['y_origin'] - y_max) / grid_dict['pixel_height'])), 0), grid_dict['row_count'])
+    last_row = min(max(int(ceil((grid_dict['y_origin'] - y_min) / grid_dict['pixel_height'])), 0), grid_dict['row_count'])
+
+    return first_col, first_row, last_col - first_col, last_row - first_row
+
+
+def add_pu_to_pu_index_grid(pu_index_grid, window_tuple, grid_dict, pu_index, ring_point_array_list):
+    # Marks the pixels whose centres are inside the PU, using the even-odd rule so holes are left out, as the middle point
+    # test used by native:zonalhistogram. Each row of pixel centres is crossed with the PU edges and the pixels between
+    # alternate crossings are filled
+    x1_values = numpy.concatenate([ringPointArray[:-1, 0] for ringPointArray in ring_point_array_list])
+    y1_values = numpy.concatenate([ringPointArray[:-1, 1] for ringPointArray in ring_point_array_list])
+    x2_values = numpy.concatenate([ringPointArray[1:, 0] for ringPointArray in ring_point_array_list])
+    y2_values = numpy.concatenate([ringPointArray[1:, 1] for ringPointArray in ring_point_array_list])
+    first_col, first_row, col_count, row_count = window_tuple
+
+    # Rows and columns, within the window, of the pixel centres inside the PU bounding box
+    row_start = max(int(ceil((grid_dict['y_origin'] - y1_values.max()) / grid_dict['pixel_height'] - 0.5)) - first_row, 0)
+    row_end = min(int(floor((grid_dict['y_origin'] - y1_values.min()) / grid_dict['pixel_height'] - 0.5)) - first_row + 1, row_count)
+    if row_start >= row_end or col_count == 0:
+        return
+    centre_y_values = grid_dict['y_origin'] - (numpy.arange(row_start, row_end) + first_row + 0.5) * grid_dict['pixel_height']
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        crossing_bool_values = (y1_values[numpy.newaxis, :] <= centre_y_values[:, numpy.newaxis]) != (y2_values[numpy.newaxis, :] <= centre_y_values[:, numpy.newaxis])
+        crossing_x_values = x1_values + (centre_y_values[:, numpy.newaxis] - y1_values) * (x2_values - x1_values) / (y2_values - y1_values)
+    crossing_x_values = numpy.sort(numpy.where(crossing_bool_values, crossing_x_values, numpy.inf), axis=1)
+    if crossing_x_values.shape[1] % 2 == 1:
+        crossing_x_values = numpy.hstack([crossing_x_values, numpy.full((crossing_x_values.shape[0], 1), numpy.inf)])
+
+    # A pixel is inside if its centre is after an odd numbered crossing and no further than the next one
+    start_x_values = crossing_x_values[:, 0::2]
+    end_x_values = crossing_x_values[:, 1::2]
+    interval_row_values, interval_pos_values = numpy.nonzero(numpy.isfinite(end_x_values))
+    start_col_values = numpy.floor((start_x_values[interval_row_values, interval_pos_values] - grid_dict['x_origin']) / grid_dict['pixel_width'] - 0.5).astype(numpy.int64) + 1 - first_col
+    end_col_values = numpy.floor((end_x_values[interval_row_values, interval_pos_values] - grid_dict['x_origin']) / grid_dict['pixel_width'] - 0.5).astype(numpy.int64) + 1 - first_col
+    start_col_values = numpy.clip(start_col_values, 0, col_count)
+    end_col_values = numpy.clip(end_col_values, 0, col_count)
+    filled_bool_values = start_col_values < end_col_values
+    if not filled_bool_values.any():
+        return
+
+    # Each interval adds 1 at its first column and takes 1 away after its last, so a cumulative sum along the rows marks the inside pixels
+    interval_row_values = interval_row_values[filled_bool_values]
+    start_col_values = start_col_values[filled_bool_values]
+    end_col_values = end_col_values[filled_bool_values]
+    col_start = int(start_col_values.min())
+    col_end = int(end_col_values.max())
+    change_values = numpy.zeros((row_end - row_start, col_end - col_start + 1), dtype=numpy.int32)
+    numpy.add.at(change_values, (interval_row_values, start_col_values - col_start), 1)
+    numpy.add.at(change_values, (interval_row_values, end_col_values - col_start), -1)
+    inside_bool_values = numpy.cumsum(change_values[:, :-1], axis=1) > 0
+    pu_grid_part = pu_index_grid[row_start:row_end, col_start:col_end]
+    pu_grid_part[inside_bool_values] = pu_index
+
+
+def make_raster_class_count_dict(a_layer, pu_grid_tuple, progress_bar_function):
+    # Reads the raster in strips of rows that match the PU grid and counts the pixels of each value in each PU.
+    # Returns {class value: (PU index array, pixel count array)}, or 'blank' if the raster can't be read or a value
+    # inside the planning units isn't a non-negative whole number. Zero and no data pixels are ignored
+    window_tuple, pu_index_grid, pu_id_values = pu_grid_tuple
+    first_col, first_row, col_count, row_count = window_tuple
+    grid_dict = return_raster_grid_dict(a_layer)
+    provider = a_layer.dataProvider()
+    strip_row_count = max(1, raster_strip_pixel_count // max(col_count, 1))
+
+    code_values_list = list()
+    count_values_list = list()
+    pu_count = len(pu_id_values)
+    for strip_start_row in range(0, row_count, strip_row_count):
+        strip_end_row = min(strip_start_row + strip_row_count, row_count)
+        value_array = read_raster_strip(provider, grid_dict, first_col, first_row + strip_start_row, col_count, strip_end_row - strip_start_row)
+        if value_array is None:
+            return 'blank'
+        pu_index_values = numpy.asarray(pu_index_grid[strip_start_row:strip_end_row])
+        used_bool_values = (pu_index_values >= 0) & ~numpy.ma.getmaskarray(value_array)
+        class_values = numpy.ma.getdata(value_array)[used_bool_values]
+        strip_pu_index_values = pu_index_values[used_bool_values]
+        used_value_bool_values = class_values != 0
+        class_values = class_values[used_value_bool_values]
+        strip_pu_index_values = strip_pu_index_values[used_value_bool_values]
+        if len(class_values) > 0:
+            if not numpy.all((class_values >= 0) & (class_values == numpy.floor(class_values))):
+                return 'blank'
+            # Each PU and value pair is given one code, so the pixels can be counted with a single sort
+            strip_code_values, strip_count_values = numpy.unique(class_values.astype(numpy.int64) * pu_count + strip_pu_index_values, return_counts=True)
+            code_values_list.append(strip_code_values)
+            count_values_list.append(strip_count_values)
+        progress_bar_function(strip_end_row, row_count)
+
+    class_count_dict = dict()
+    if len(code_values_list) > 0:
+        code_values, code_index_values = numpy.unique(numpy.concatenate(code_values_list), return_inverse=True)
+        count_values = numpy.bincount(code_index_values, weights=numpy.concatenate(count_values_list)).astype(numpy.int64)
+        class_values = code_values // pu_count
+        for class_value in numpy.unique(class_values).tolist():
+            class_bool_values = class_values == class_value
+            class_count_dict[class_value] = (code_values[class_bool_values] % pu_count, count_values[class_bool_values])
+
+    return class_count_dict
+
+
+def read_raster_strip(provider, grid_dict, first_col, first_row, col_count, row_count):
+    # Returns a masked array of the first band, with no data pixels masked, or None if the data type can't be read
+    strip_rect = QgsRectangle(grid_dict['x_origin'] + first_col * grid_dict['pixel_width'], grid_dict['y_origin'] - (first_row + row_count) * grid_dict['pixel_height'], grid_dict['x_origin'] + (first_col + col_count) * grid_dict['pixel_width'], grid_dict['y_origin'] - first_row * grid_dict['pixel_height'])
+    raster_block = provider.block(1, strip_rect, col_count, row_count)
+    try:
+        block_dtype = numpy.dtype(raster_block_dtype_dict[int(raster_block.dataType())])
+    except KeyError:
+        return None
+    value_array = numpy.frombuffer(bytes(raster_block.data()), dtype=block_dtype, count=col_count * row_count).reshape(row_count, col_count)
+
+    no_data_bool_values = numpy.zeros(value_array.shape, dtype=bool)
+    if raster_block.hasNoDataValue():
+        no_data_bool_values |= value_array == raster_block.noDataValue()
+    if block_dtype.kind == 'f':
+        no_data_bool_values |= numpy.isnan(value_array)
+
+    return numpy.ma.masked_array(value_array, mask=no_data_bool_values)
@@ -0,0 +1,58 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from os import path, remove, replace
+
+import numpy
+
+
+def write_file_by_replacing(file_path, write_function):
+    # write_function writes the whole file to the temporary path it is given, which then replaces file_path, so a save that
+    # fails or is interrupted leaves the earlier file in place rather than a damaged one. Raises IOError if the file can't be written
+    temp_file_path = file_path + '.tmp'
+    try:
+        write_function(temp_file_path)
+        replace(temp_file_path, file_path)
+    finally:
+        if path.exists(temp_file_path):
+            try:
+                remove(temp_file_path)
+            except OSError:
+                pass
+
+
+def write_binary_file_by_replacing(file_path, header_bytes, array_list):
+    write_file_by_replacing(file_path, lambda temp_file_path: write_binary_file(temp_file_path, header_bytes, array_list))
+
+
+def write_binary_file(binary_file_path, header_bytes, array_list):
+    with open(binary_file_path, 'wb') as f:
+        f.write(header_bytes)
+        for anArray in array_list:
+            anArray.tofile(f)
+
+
+def save_npz_file_by_replacing(file_path, array_dict):
+    write_file_by_replacing(file_path, lambda temp_file_path: save_npz_file(temp_file_path, array_dict))
+
+
+def save_npz_file(npz_file_path, array_dict):
+    with open(npz_file_path, 'wb') as f:  # Opened here, as numpy.savez adds .npz to a file name that doesn't end with it
+        numpy.savez(f, **array_dict)
@@ -135,11 +135,6 @@ def update_cluz_menu_buttons_based_on_software_type(setup_object):
         setup_object.MinPatchAction.setEnabled(True)
 
 
-class MinPatchObject:
-    def __init__(self):
-        self.setupStatus = 'blank'  # Can be 'values_set', 'values_checked' or 'files_checked'
-
-
 def make_setup_dict_from_setup_file(setup_file_path):
     setup_dict = dict()
     with open(setup_file_path, 'rt') as f:
@@ -0,0 +1,189 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from math import ceil, sqrt
+
+from qgis.core import QgsFeatureRequest, QgsGeometry, QgsRectangle, QgsSpatialIndex
+
+
+vec_abund_tile_pu_count = 2000  # Approximate number of planning units in each tile that is sent to a worker thread
+vec_abund_tile_buffer_proportion = 0.01  # Tiles are enlarged slightly, so feature edges that lie on a planning unit edge aren't cut when a feature is clipped to its tile
+line_geometry_type_value = 1
+polygon_geometry_type_value = 2
+
+
+def make_pu_tile_list(pu_layer, pu_id_field_index):
+    # Each PU is put in the tile that contains the centre of its bounding box, so it is only intersected once.
+    # A tile is held as [tile rectangle tuple, list of (pu_id, WKB)]
+    pu_entry_list = list()
+    for puFeature in pu_layer.getFeatures():
+        pu_geom = puFeature.geometry()
+        pu_bbox = pu_geom.boundingBox()
+        pu_entry_list.append((puFeature.attributes()[pu_id_field_index], bytes(pu_geom.asWkb()), (pu_bbox.xMinimum(), pu_bbox.yMinimum(), pu_bbox.xMaximum(), pu_bbox.yMaximum())))
+    if len(pu_entry_list) == 0:
+        return list()
+
+    x_min = min(puEntry[2][0] for puEntry in pu_entry_list)
+    y_min = min(puEntry[2][1] for puEntry in pu_entry_list)
+    x_max = max(puEntry[2][2] for puEntry in pu_entry_list)
+    y_max = max(puEntry[2][3] for puEntry in pu_entry_list)
+    tile_side_count = max(1, int(ceil(sqrt(len(pu_entry_list) / vec_abund_tile_pu_count))))
+    tile_width = max((x_max - x_min) / tile_side_count, 1e-12)
+    tile_height = max((y_max - y_min) / tile_side_count, 1e-12)
+
+    tile_dict = dict()
+    for pu_id, pu_wkb, pu_bbox_tuple in pu_entry_list:
+        tile_column = min(int((((pu_bbox_tuple[0] + pu_bbox_tuple[2]) / 2) - x_min) / tile_width), tile_side_count - 1)
+        tile_row = min(int((((pu_bbox_tuple[1] + pu_bbox_tuple[3]) / 2) - y_min) / tile_height), tile_side_count - 1)
+        try:
+            tile_bbox_list, tile_pu_entry_list = tile_dict[(tile_column, tile_row)]
+            tile_bbox_list[0:4] = [min(tile_bbox_list[0], pu_bbox_tuple[0]), min(tile_bbox_list[1], pu_bbox_tuple[1]), max(tile_bbox_list[2], pu_bbox_tuple[2]), max(tile_bbox_list[3], pu_bbox_tuple[3])]
+        except KeyError:
+            tile_bbox_list, tile_pu_entry_list = list(pu_bbox_tuple), list()
+            tile_dict[(tile_column, tile_row)] = [tile_bbox_list, tile_pu_entry_list]
+        tile_pu_entry_list.append((pu_id, pu_wkb))
+
+    pu_tile_list = list()
+    for tileKey in sorted(tile_dict):
+        tile_bbox_list, tile_pu_entry_list = tile_dict[tileKey]
+        x_buffer = (tile_bbox_list[2] - tile_bbox_list[0]) * vec_abund_tile_buffer_proportion + 1e-9
+        y_buffer = (tile_bbox_list[3] - tile_bbox_list[1]) * vec_abund_tile_buffer_proportion + 1e-9
+        tile_rect_tuple = (tile_bbox_list[0] - x_buffer, tile_bbox_list[1] - y_buffer, tile_bbox_list[2] + x_buffer, tile_bbox_list[3] + y_buffer)
+        pu_tile_list.append([tile_rect_tuple, tile_pu_entry_list])
+
+    return pu_tile_list
+
+
+def make_tile_job_iterator(pu_tile_list, a_layer, feat_id_field_index):
+    # Generator, so the features of a tile are only read from the layer when the tile is about to be processed. Tiles with no features are skipped
+    spatial_index = QgsSpatialIndex(a_layer.getFeatures(QgsFeatureRequest().setNoAttributes()))
+    for tile_count, (tile_rect_tuple, tile_pu_entry_list) in enumerate(pu_tile_list, 1):
+        tile_fid_list = spatial_index.intersects(QgsRectangle(*tile_rect_tuple))
+        if len(tile_fid_list) > 0:
+            feat_request = QgsFeatureRequest().setFilterFids(tile_fid_list).setSubsetOfAttributes([feat_id_field_index])
+            tile_feat_entry_list = [(aFeature.attributes()[feat_id_field_index], bytes(aFeature.geometry().asWkb())) for aFeature in a_layer.getFeatures(feat_request) if aFeature.hasGeometry()]
+            yield tile_count, (tile_rect_tuple, tile_pu_entry_list, tile_feat_entry_list)
+
+
+def make_vec_abund_list_from_tile(tile_rect_tuple, tile_pu_entry_list, tile_feat_entry_list, layer_geom_type, conv_factor, decimal_places):
+    # Returns a list of (pu_id, feat_id, amount) for each PU and layer feature that overlap, with the amounts rounded as
+    # in the Target table, and whether the tile contains an invalid feature geometry
+    tile_rect = QgsRectangle(*tile_rect_tuple)
+    feat_geom_list = list()
+    feat_spatial_index = QgsSpatialIndex()
+    invalid_geom_bool = False
+    for feat_id, feat_wkb in tile_feat_entry_list:
+        feat_geom = QgsGeometry()
+        feat_geom.fromWkb(feat_wkb)
+        if feat_geom.isGeosValid() is False:
+            invalid_geom_bool = True
+        elif tile_rect.contains(feat_geom.boundingBox()) is False:
+            feat_geom = feat_geom.clipped(tile_rect)  # Large features are cut down to the tile, so each PU is intersected with a small geometry
+        if feat_geom.isEmpty() is False:
+            feat_spatial_index.addFeature(len(feat_geom_list), feat_geom.boundingBox())
+            feat_geom_list.append((feat_id, feat_geom))
+    if invalid_geom_bool:
+        return list(), invalid_geom_bool
+
+    vec_abund_list = list()
+    for pu_id, pu_wkb in tile_pu_entry_list:
+        pu_geom = QgsGeometry()
+        pu_geom.fromWkb(pu_wkb)
+        pu_engine = QgsGeometry.createGeometryEngine(pu_geom.constGet())
+        pu_engine.prepareGeometry()
+        for feat_index in sorted(feat_spatial_index.intersects(pu_geom.boundingBox())):
+            feat_id, feat_geom = feat_geom_list[feat_index]
+            if pu_engine.intersects(feat_geom.constGet()):
+                intersect_amount = return_intersect_amount(feat_geom.intersection(pu_geom), layer_geom_type)
+                if intersect_amount != 'blank':
+                    vec_abund_list.append((pu_id, feat_id, round(intersect_amount / conv_factor, decimal_places)))
+
+    return vec_abund_list, invalid_geom_bool
+
+
+def return_intersect_amount(intersect_geom, layer_geom_type):
+    # Returns 'blank' if the PU and feature only touch, as native:intersection doesn't make a fragment for them
+    intersect_amount = 'blank'
+    if intersect_geom.isEmpty() is False:
+        if intersect_geom.type() == layer_geom_type:
+            part_type_match_bool = True
+        else:
+            part_type_match_bool = any(aPart.type() == layer_geom_type for aPart in intersect_geom.asGeometryCollection())
+        if part_type_match_bool and layer_geom_type == polygon_geometry_type_value:
+            intersect_amount = intersect_geom.area()
+        elif part_type_match_bool and layer_geom_type == line_geometry_type_value:
+            intersect_amount = intersect_geom.length()
+
+    return intersect_amount
+
+
+def make_vec_layer_add_abund_dict(pu_tile_list, a_layer, feat_id_field_index, conv_factor, decimal_places, thread_count, progress_bar_function):
+    # Amounts are added to the layer dictionary as each tile is finished, rather than being kept as an intersection layer.
+    # Returns the PU and feature amounts, the feature IDs, whether a fragment had no spatial characteristics and whether the layer has an invalid geometry
+    layer_geom_type = a_layer.geometryType()
+    tile_job_iterator = make_tile_job_iterator(pu_tile_list, a_layer, feat_id_field_index)
+    layer_add_abund_dict = dict()
+    layer_feat_id_set = set()
+    layer_status_list = [False, False]
+    if thread_count > 1 and len(pu_tile_list) > 1:
+        # Threads rather than processes, as QGIS geometry objects can't be used in forked or spawned processes. The GEOS calls
+        # release the GIL, so the tiles are still intersected in parallel, while the layer is only read from this thread
+        executor = ThreadPoolExecutor(max_workers=min(thread_count, len(pu_tile_list)))
+        try:
+            pending_future_set = set()
+            for tile_count, tileJob in tile_job_iterator:
+                pending_future_set.add(executor.submit(make_vec_abund_list_from_tile, *tileJob, layer_geom_type, conv_factor, decimal_places))
+                if len(pending_future_set) >= thread_count * 2:  # Limits the number of tiles held in memory at once
+                    done_future_set, pending_future_set = wait(pending_future_set, return_when=FIRST_COMPLETED)
+                    for aFuture in done_future_set:
+                        add_vec_abund_list_to_add_abund_dict(aFuture.result(), layer_add_abund_dict, layer_feat_id_set, layer_status_list)
+                progress_bar_function(tile_count, len(pu_tile_list))
+            for aFuture in wait(pending_future_set).done:
+                add_vec_abund_list_to_add_abund_dict(aFuture.result(), layer_add_abund_dict, layer_feat_id_set, layer_status_list)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    else:
+        for tile_count, tileJob in tile_job_iterator:
+            add_vec_abund_list_to_add_abund_dict(make_vec_abund_list_from_tile(*tileJob, layer_geom_type, conv_factor, decimal_places), layer_add_abund_dict, layer_feat_id_set, layer_status_list)
+            progress_bar_function(tile_count, len(pu_tile_list))
+    attribute_feature_error, invalid_geom_bool = layer_status_list
+
+    return layer_add_abund_dict, layer_feat_id_set, attribute_feature_error, invalid_geom_bool
+
+
+def add_vec_abund_list_to_add_abund_dict(tile_result_tuple, add_abund_dict, add_feat_id_set, layer_status_list):
+    vec_abund_list, invalid_geom_bool = tile_result_tuple
+    if invalid_geom_bool:
+        layer_status_list[1] = True
+    for pu_id, feat_id, final_shape_amount in vec_abund_list:
+        add_feat_id_set.add(feat_id)
+        if final_shape_amount > 0:
+            try:
+                pu_add_abund_dict = add_abund_dict[pu_id]
+            except KeyError:
+                pu_add_abund_dict = dict()
+                add_abund_dict[pu_id] = pu_add_abund_dict
+            try:
+                pu_add_abund_dict[feat_id] += final_shape_amount
+            except KeyError:
+                pu_add_abund_dict[feat_id] = final_shape_amount
+        else:
+            layer_status_list[0] = True
@@ -108,6 +108,15 @@ class Ui_marxanDialog(object):
         self.formLayout_2.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.missingLineEdit)
         spacerItem4 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.formLayout_2.setItem(3, QtWidgets.QFormLayout.LabelRole, spacerItem4)
+        self.processesLabel = QtWidgets.QLabel(self.extraTab)
+        self.processesLabel.setMinimumSize(QtCore.QSize(0, 24))
+        self.processesLabel.setObjectName("processesLabel")
+        self.formLayout_2.setWidget(4, QtWidgets.QFormLayout.LabelRole, self.processesLabel)
+        self.processesSpinBox = QtWidgets.QSpinBox(self.extraTab)
+        self.processesSpinBox.setMinimumSize(QtCore.QSize(0, 24))
+        self.processesSpinBox.setMinimum(1)
+        self.processesSpinBox.setObjectName("processesSpinBox")
+        self.formLayout_2.setWidget(4, QtWidgets.QFormLayout.FieldRole, self.processesSpinBox)
         self.gridLayout_4.addLayout(self.formLayout_2, 0, 0, 1, 1)
         self.tabWidget.addTab(self.extraTab, "")
         self.verticalLayout.addWidget(self.tabWidget)
@@ -150,6 +159,7 @@ class Ui_marxanDialog(object):
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab1), _translate("marxanDialog", "Standard options"))
         self.propLabel.setText(_translate("marxanDialog", "Starting proportion"))
         self.missingLabel.setText(_translate("marxanDialog", "Species missing if target proportion is lower than"))
+        self.processesLabel.setText(_translate("marxanDialog", "Number of Marxan processes to share the runs"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.extraTab), _translate("marxanDialog", "Advanced options"))
         self.startButton.setText(_translate("marxanDialog", "Start Marxan"))
         self.closeButton.setText(_translate("marxanDialog", "Close"))
@@ -115,12 +115,45 @@ class Ui_minpatchDialog(object):
         self.whittleCheckBox.setChecked(True)
         self.whittleCheckBox.setObjectName("whittleCheckBox")
         self.verticalLayout.addWidget(self.whittleCheckBox)
+        self.patchCacheCheckBox = QtWidgets.QCheckBox(self.tab2)
+        self.patchCacheCheckBox.setMinimumSize(QtCore.QSize(0, 30))
+        self.patchCacheCheckBox.setChecked(True)
+        self.patchCacheCheckBox.setObjectName("patchCacheCheckBox")
+        self.verticalLayout.addWidget(self.patchCacheCheckBox)
+        self.patchTextCheckBox = QtWidgets.QCheckBox(self.tab2)
+        self.patchTextCheckBox.setMinimumSize(QtCore.QSize(0, 30))
+        self.patchTextCheckBox.setChecked(True)
+        self.patchTextCheckBox.setObjectName("patchTextCheckBox")
+        self.verticalLayout.addWidget(self.patchTextCheckBox)
+        self.resumeCheckBox = QtWidgets.QCheckBox(self.tab2)
+        self.resumeCheckBox.setMinimumSize(QtCore.QSize(0, 30))
+        self.resumeCheckBox.setChecked(True)
+        self.resumeCheckBox.setObjectName("resumeCheckBox")
+        self.verticalLayout.addWidget(self.resumeCheckBox)
+        self.horizontalLayout_5 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_5.setObjectName("horizontalLayout_5")
+        self.processesLabel = QtWidgets.QLabel(self.tab2)
+        self.processesLabel.setMinimumSize(QtCore.QSize(0, 30))
+        self.processesLabel.setObjectName("processesLabel")
+        self.horizontalLayout_5.addWidget(self.processesLabel)
+        self.processesSpinBox = QtWidgets.QSpinBox(self.tab2)
+        self.processesSpinBox.setMinimumSize(QtCore.QSize(0, 24))
+        self.processesSpinBox.setMinimum(1)
+        self.processesSpinBox.setObjectName("processesSpinBox")
+        self.horizontalLayout_5.addWidget(self.processesSpinBox)
+        spacerItem6 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_5.addItem(spacerItem6)
+        self.verticalLayout.addLayout(self.horizontalLayout_5)
         spacerItem5 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.verticalLayout.addItem(spacerItem5)
         self.verticalLayout.setStretch(0, 1)
         self.verticalLayout.setStretch(1, 1)
         self.verticalLayout.setStretch(2, 1)
-        self.verticalLayout.setStretch(3, 4)
+        self.verticalLayout.setStretch(3, 1)
+        self.verticalLayout.setStretch(4, 1)
+        self.verticalLayout.setStretch(5, 1)
+        self.verticalLayout.setStretch(6, 1)
+        self.verticalLayout.setStretch(7, 4)
         self.verticalLayout_2.addLayout(self.verticalLayout)
         self.gridLayout_2.addLayout(self.verticalLayout_2, 0, 0, 1, 1)
         self.tabWidget.addTab(self.tab2, "")
@@ -146,6 +179,10 @@ class Ui_minpatchDialog(object):
         self.removeCheckBox.setText(_translate("minpatchDialog", "Remove small patches"))
         self.addCheckBox.setText(_translate("minpatchDialog", "Add patches"))
         self.whittleCheckBox.setText(_translate("minpatchDialog", "Simulated whittling"))
+        self.patchCacheCheckBox.setText(_translate("minpatchDialog", "Reuse the patch lists stored in patchPUID.bin"))
+        self.patchTextCheckBox.setText(_translate("minpatchDialog", "Save the patch lists as patchPUID.dat"))
+        self.resumeCheckBox.setText(_translate("minpatchDialog", "Resume an interrupted analysis of the same Marxan files"))
+        self.processesLabel.setText(_translate("minpatchDialog", "Number of processes to use"))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab2), _translate("minpatchDialog", "Advanced options"))
 
 import resources_rc
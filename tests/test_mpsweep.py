@@ -0,0 +1,72 @@
+"""
+/***************************************************************************
+                                 A QGIS plugin
+ CLUZ for QGIS
+                             -------------------
+        begin                : 2025-10-22
+        copyright            : (C) 2025 by Bob Smith, DICE
+        email                : r.j.smith@kent.ac.uk
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+
+# Checks that the MinPatch sweep still sets every option that the MinPatch command line objects are made from:
+# python -m unittest discover -s tests
+
+from importlib.util import module_from_spec, spec_from_file_location
+from os import path
+from sys import modules
+import unittest
+
+
+def import_cluz_module(module_name):
+    # The plugin folder is loaded as the cluz package, as when it is installed in QGIS, so its relative imports work
+    if 'cluz' not in modules:
+        plugin_path = path.dirname(path.dirname(path.abspath(__file__)))
+        package_spec = spec_from_file_location('cluz', path.join(plugin_path, '__init__.py'), submodule_search_locations=[plugin_path])
+        modules['cluz'] = module_from_spec(package_spec)
+        package_spec.loader.exec_module(modules['cluz'])
+
+    return __import__('cluz.' + module_name, fromlist=[module_name])
+
+
+class MinPatchSweepArgumentTest(unittest.TestCase):
+    def test_sweep_defaults_make_command_line_objects(self):
+        cluz_mpsweep = import_cluz_module('cluz_mpsweep')
+        argument_values = cluz_mpsweep.make_mp_sweep_argument_parser().parse_args(['input', 'output', 'scen', '--blm', '0.5', '1'])
+        setup_object, minpatch_object = cluz_mpsweep.make_mp_sweep_command_line_objects(argument_values)
+        self.assertEqual(minpatch_object.blm, 0.5)
+        self.assertTrue(minpatch_object.usePatchPuIdCacheBool)
+        self.assertFalse(minpatch_object.exportPatchPuIdTextBool)
+        self.assertFalse(minpatch_object.resumeBool)
+        self.assertFalse(minpatch_object.profileBool)
+        self.assertEqual(argument_values.blm, [0.5, 1])
+
+    def test_sweep_options_make_command_line_objects(self):
+        cluz_mpsweep = import_cluz_module('cluz_mpsweep')
+        argument_values = cluz_mpsweep.make_mp_sweep_argument_parser().parse_args(['input', 'output', 'scen', '--no-remove', '--no-add', '--no-whittle', '--no-patch-cache', '--processes', '2', '--yes'])
+        setup_object, minpatch_object = cluz_mpsweep.make_mp_sweep_command_line_objects(argument_values)
+        self.assertFalse(minpatch_object.removeBool or minpatch_object.addBool or minpatch_object.whittleBool)
+        self.assertFalse(minpatch_object.usePatchPuIdCacheBool)
+        self.assertEqual(minpatch_object.processCount, 2)
+        self.assertTrue(minpatch_object.acceptWarningsBool)
+
+    def test_command_line_defaults_make_command_line_objects(self):
+        cluz_mpcli = import_cluz_module('cluz_mpcli')
+        argument_values = cluz_mpcli.make_mp_argument_parser().parse_args(['input', 'output', 'scen'])
+        setup_object, minpatch_object = cluz_mpcli.make_mp_command_line_objects(argument_values)
+        self.assertTrue(minpatch_object.usePatchPuIdCacheBool)
+        self.assertTrue(minpatch_object.exportPatchPuIdTextBool)
+        self.assertTrue(minpatch_object.resumeBool)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -134,17 +134,17 @@ class ZonesMarxanDialog(QDialog, Ui_zonesMarxanDialog):
             update_clz_setup_file(setup_object, True)  # saveSuccessfulBool = True
             self.close()
 
-            best_output_file, summed_output_file = launch_zones_marxan_analysis(setup_object, zones_marxan_parameter_dict)
+            best_output_file, summed_output_file, marxan_finished_bool = launch_zones_marxan_analysis(setup_object, zones_marxan_parameter_dict)
+            if marxan_finished_bool:
+                add_best_zones_marxan_output_to_pu_shapefile(setup_object, best_output_file, 'Best')
+                add_summed_zones_marxan_output_to_pu_shapefile(setup_object, summed_output_file)
 
-            add_best_zones_marxan_output_to_pu_shapefile(setup_object, best_output_file, 'Best')
-            add_summed_zones_marxan_output_to_pu_shapefile(setup_object, summed_output_file)
+                remove_previous_marxan_layers()
+                reload_zones_pu_layer(setup_object)
+                display_zones_sf_layer(setup_object, zones_marxan_parameter_dict['num_run'], zones_marxan_parameter_dict['output_name'], 'Z', '_' + 'SFreq')
+                display_zones_best_output(setup_object, 'Best (' + zones_marxan_parameter_dict['output_name'] + ')', 'Best')
 
-            remove_previous_marxan_layers()
-            reload_zones_pu_layer(setup_object)
-            display_zones_sf_layer(setup_object, zones_marxan_parameter_dict['num_run'], zones_marxan_parameter_dict['output_name'], 'Z', '_' + 'SFreq')
-            display_zones_best_output(setup_object, 'Best (' + zones_marxan_parameter_dict['output_name'] + ')', 'Best')
-
-            setup_object.TargetsMetAction.setEnabled(True)
+                setup_object.TargetsMetAction.setEnabled(True)
 
 
 class ZonesLoadDialog(QDialog, Ui_zonesLoadDialog):
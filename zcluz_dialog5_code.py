@@ -23,13 +23,12 @@ from qgis.PyQt.QtCore import Qt
 
 from csv import reader
 from os import path, sep
-from subprocess import Popen
 
 from .cluz_dialog5_code import check_import_best_field_name, check_import_summed_field_name
-from .cluz_functions5 import return_output_name, make_marxan_bat_file, waiting_for_marxan
+from .cluz_functions5 import return_output_name, run_marxan_process
 from .zcluz_functions5 import make_zones_marxan_input_file, check_if_add_zone_target_dat_needed_bool
 
-from .cluz_messages import warning_message
+from .cluz_messages import clear_progress_bar, make_progress_bar, set_progress_bar_value, solver_status_error_message, warning_message
 
 
 def set_zones_dialog_parameters(zones_marxan_dialog, setup_object):
@@ -109,13 +108,15 @@ def check_zones_marxan_files_exist_bool(setup_object):
 def launch_zones_marxan_analysis(setup_object, zones_marxan_parameter_dict):
     add_zone_target_dat_bool = check_if_add_zone_target_dat_needed_bool(setup_object)
     make_zones_marxan_input_file(setup_object, zones_marxan_parameter_dict, add_zone_target_dat_bool)
-    zones_marxan_bat_file_name = make_marxan_bat_file(setup_object)
-    Popen([zones_marxan_bat_file_name])
-    waiting_for_marxan(setup_object, zones_marxan_parameter_dict['output_name'])
+    progress_bar = make_progress_bar('Running Marxan with Zones')
+    marxan_status_text = run_marxan_process(zones_marxan_parameter_dict, lambda run_count, run_total_count: set_progress_bar_value(progress_bar, run_count, run_total_count))
+    clear_progress_bar()
+    if marxan_status_text != 'finished':
+        solver_status_error_message('Marxan with Zones', marxan_status_text)
     best_output_file = setup_object.output_path + sep + zones_marxan_parameter_dict['output_name'] + '_best.csv'
     summed_output_file = setup_object.output_path + sep + zones_marxan_parameter_dict['output_name'] + '_ssoln.csv'
 
-    return best_output_file, summed_output_file
+    return best_output_file, summed_output_file, marxan_status_text == 'finished'
 
 
 # Load previous results ########################################################